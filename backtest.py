@@ -0,0 +1,250 @@
+# backtest.py
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from option_pricing import binomial_tree_american_vectorized
+from position_loader import OPTION_TYPES, format_expiry
+from yield_curve import resolve_rate
+
+# La HV live (calculate_historical_volatility, period="60d") couvre 60 jours calendaires, soit ~41 séances
+HV_WINDOW_TRADING_DAYS = 41
+TRADING_DAYS_PER_YEAR = 252
+
+
+def fetch_daily_closes(tickers, start, end=None):
+    """
+    Télécharge les clôtures ajustées quotidiennes de plusieurs tickers en une seule requête.
+
+    Retourne:
+    pd.DataFrame: Clôtures (index = dates, colonnes = tickers).
+    """
+    from market_data_provider import get_provider
+
+    tickers = sorted(set(tickers))
+    data = get_provider().history(tickers, start=start, end=end or datetime.now(), auto_adjust=True)
+    if data is None or data.empty:
+        print(f"Avertissement: Aucune clôture historique trouvée pour {', '.join(tickers)}.")
+        return pd.DataFrame(columns=tickers)
+    closes = data["Close"]
+    if isinstance(closes, pd.Series): # Un seul ticker
+        closes = closes.to_frame(tickers[0])
+    return closes.reindex(columns=tickers)
+
+
+def rolling_historical_volatility(closes, window=HV_WINDOW_TRADING_DAYS):
+    """
+    Volatilité historique annualisée glissante (écart-type des log-rendements), pour tous
+    les tickers et toutes les dates en une passe.
+
+    Les sommes glissantes de r et r^2 sont obtenues par différence de sommes cumulées :
+    chaque nouvelle date ne coûte qu'une addition et une soustraction par ticker.
+
+    Paramètres:
+    closes (pd.DataFrame): Clôtures (dates x tickers).
+    window (int): Nombre de rendements quotidiens dans la fenêtre.
+
+    Retourne:
+    pd.DataFrame: HV annualisée (dates x tickers), NaN tant que la fenêtre n'est pas remplie.
+    """
+    prices = closes.to_numpy(dtype=float)
+    returns = np.full(prices.shape, np.nan)
+    returns[1:] = np.log(prices[1:] / prices[:-1])
+
+    valid = np.isfinite(returns)
+    filled = np.where(valid, returns, 0.0)
+    zeros = np.zeros((1, prices.shape[1]))
+    cum_count = np.vstack((zeros, np.cumsum(valid, axis=0)))
+    cum_sum = np.vstack((zeros, np.cumsum(filled, axis=0)))
+    cum_sq = np.vstack((zeros, np.cumsum(filled ** 2, axis=0)))
+
+    end = np.arange(1, prices.shape[0] + 1)
+    begin = np.maximum(end - window, 0)
+    count = cum_count[end] - cum_count[begin]
+    total = cum_sum[end] - cum_sum[begin]
+    total_sq = cum_sq[end] - cum_sq[begin]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (total_sq - total ** 2 / count) / (count - 1)
+    hv = np.sqrt(np.maximum(variance, 0.0)) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    hv[count < window] = np.nan
+    return pd.DataFrame(hv, index=closes.index, columns=closes.columns)
+
+
+def _position_label(pos):
+    if pos["type"] in OPTION_TYPES:
+        return f"{pos['ticker']} {float(pos['strike']):g} {format_expiry(pos['expiry'])} {pos['type']}"
+    return f"{pos['ticker']} {pos['type']}"
+
+
+def run_backtest(positions, closes, risk_free_rate, dividend_yields_by_ticker, hv_window=HV_WINDOW_TRADING_DAYS,
+                 start=None, tree_steps=100, default_volatility=0.20):
+    """
+    Revalorise le portefeuille actuel à chaque date de l'historique, en une passe vectorisée.
+
+    L'axe du temps est une dimension des tableaux : toutes les paires (option, date) sont
+    valorisées dans un seul appel à l'arbre binomial vectorisé, avec pour chaque date le
+    spot de clôture, la HV glissante à cette date et la maturité restante. Les actions et
+    ETF sont valorisés à la clôture. Faute d'historique de cotations d'options, les options
+    sont valorisées au prix théorique (arbre binomial, HV), comme dans analyze_portfolio.
+
+    Paramètres:
+    positions (list): Positions du portefeuille (même format que analyze_portfolio).
+    closes (pd.DataFrame): Clôtures quotidiennes (dates x tickers), avec un historique de
+                           `hv_window` séances avant `start`.
+    risk_free_rate (float ou YieldCurve): Taux sans risque (courbe actuelle, appliquée à chaque date).
+    dividend_yields_by_ticker (dict): Rendements de dividende par ticker.
+    hv_window (int): Fenêtre de la HV glissante en séances.
+    start (date): Première date de la période valorisée (par défaut : dès que la HV est disponible).
+    tree_steps (int): Nombre de pas de l'arbre binomial.
+    default_volatility (float): Volatilité utilisée si la HV n'est pas disponible.
+
+    Retourne:
+    dict: 'valuations' (DataFrame positions x dates, en €), 'total_value' (Series),
+          'daily_pnl' (Series) et 'cumulative_pnl' (Series, par rapport à la première date où
+          toutes les positions ont un prix).
+    """
+    hv = rolling_historical_volatility(closes, window=hv_window)
+    # Jour sans cotation pour un ticker (férié local, suspension) : dernière clôture connue, pour que la
+    # position reste dans le total au lieu de créer un faux saut de P&L
+    closes = closes.ffill()
+    if start is not None:
+        keep = closes.index >= pd.Timestamp(start)
+        closes, hv = closes.loc[keep], hv.loc[keep]
+    else:
+        first_valid = hv.notna().any(axis=1)
+        first_valid = first_valid.idxmax() if first_valid.any() else closes.index[0]
+        closes, hv = closes.loc[first_valid:], hv.loc[first_valid:]
+
+    dates = closes.index
+    day_numbers = np.array([d.toordinal() for d in dates.date])
+    ticker_column = {ticker: i for i, ticker in enumerate(closes.columns)}
+    close_values = closes.to_numpy(dtype=float)
+    hv_values = hv.to_numpy(dtype=float)
+
+    labels = []
+    tracked = np.zeros(len(positions), dtype=bool) # Positions dont le sous-jacent a un historique
+    valuations = np.full((len(positions), len(dates)), np.nan)
+    option_rows, option_columns = [], []
+    for row, pos in enumerate(positions):
+        labels.append(_position_label(pos))
+        column = ticker_column.get(pos["ticker"])
+        if column is None:
+            print(f"Avertissement: Pas d'historique pour {pos['ticker']}. Position ignorée dans le backtest.")
+            continue
+        tracked[row] = True
+        if pos["type"] in OPTION_TYPES:
+            option_rows.append(row)
+            option_columns.append(column)
+        else:
+            valuations[row] = close_values[:, column] * pos["qty"]
+
+    if option_rows:
+        # Chaque contrat unique n'est valorisé qu'une fois, quel que soit le nombre de positions
+        unique_index = {}
+        contract_of_row = []
+        for row, column in zip(option_rows, option_columns):
+            pos = positions[row]
+            key = (column, float(pos["strike"]), format_expiry(pos["expiry"]), pos["type"])
+            contract_of_row.append(unique_index.setdefault(key, len(unique_index)))
+        contracts = list(unique_index)
+
+        columns = [column for column, _, _, _ in contracts]
+        strikes = np.array([strike for _, strike, _, _ in contracts])[:, None]
+        expiry_days = np.array([datetime.strptime(expiry, "%Y-%m-%d").toordinal() for _, _, expiry, _ in contracts])[:, None]
+        types = np.array([option_type for _, _, _, option_type in contracts])[:, None]
+        q = np.array([dividend_yields_by_ticker.get(closes.columns[column], 0.0) for column in columns])[:, None]
+
+        S = close_values[:, columns].T # contrats x dates
+        sigma = hv_values[:, columns].T
+        sigma = np.where(np.isfinite(sigma) & (sigma > 0), sigma, default_volatility)
+        T = (expiry_days - day_numbers[None, :]) / 365.0
+        r = np.asarray(resolve_rate(risk_free_rate, np.maximum(T, 0.0)), dtype=float) * np.ones_like(T)
+
+        priced = np.isfinite(S)
+        prices = np.full(S.shape, np.nan)
+        prices[priced] = binomial_tree_american_vectorized(
+            S[priced], np.broadcast_to(strikes, S.shape)[priced], T[priced], r[priced], sigma[priced],
+            np.broadcast_to(q, S.shape)[priced], tree_steps, np.broadcast_to(types, S.shape)[priced]
+        )
+        qty = np.array([positions[row]["qty"] for row in option_rows], dtype=float)[:, None]
+        valuations[option_rows] = prices[contract_of_row] * qty * 100
+
+    valuations_df = pd.DataFrame(valuations, index=labels, columns=dates)
+    total_value = valuations_df.sum(axis=0, min_count=1)
+    # Une date où une position suivie n'a pas de prix (avant le début de son historique) n'a pas de total
+    total_value[np.isnan(valuations[tracked]).any(axis=0)] = np.nan
+    # Base du P&L cumulé : première date où tout le portefeuille est valorisé (ticker coté en cours de période)
+    first_priced = total_value.first_valid_index()
+    base_value = total_value.loc[first_priced] if first_priced is not None else np.nan
+    return {
+        "valuations": valuations_df,
+        "total_value": total_value,
+        "daily_pnl": total_value.diff(),
+        "cumulative_pnl": total_value - base_value,
+    }
+
+
+def backtest_portfolio(positions, days=365, hv_window=HV_WINDOW_TRADING_DAYS, tree_steps=100):
+    """
+    Backtest complet : télécharge en une requête les clôtures nécessaires (période + fenêtre HV),
+    récupère la courbe des taux et les dividendes, puis revalorise le portefeuille sur `days` jours.
+    """
+    from market_data_fetcher import fetch_live_data
+    from yield_curve import fetch_treasury_curve
+
+    tickers = sorted({pos["ticker"] for pos in positions})
+    start = date.today() - timedelta(days=days)
+    # Marge pour remplir la fenêtre HV avant la première date (séances -> jours calendaires)
+    history_start = start - timedelta(days=int(hv_window * 365 / TRADING_DAYS_PER_YEAR) + 10)
+
+    closes = fetch_daily_closes(tickers, history_start)
+    curve = fetch_treasury_curve()
+    if curve is None:
+        print("Erreur critique: Impossible de récupérer le taux sans risque. Arrêt du backtest.")
+        return None
+    dividend_yields_by_ticker = {ticker: data["dividend_yield"] for ticker, data in fetch_live_data(tickers).items()}
+
+    return run_backtest(positions, closes, curve, dividend_yields_by_ticker, hv_window=hv_window,
+                        start=start, tree_steps=tree_steps)
+
+
+# Pour tester ce module indépendamment (données synthétiques, sans réseau)
+if __name__ == "__main__":
+    print("--- Test de backtest.py (données synthétiques) ---")
+    rng = np.random.default_rng(42)
+    test_dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252 + HV_WINDOW_TRADING_DAYS + 1)
+    test_tickers = ["LDOS", "BAH", "KTOS", "DFEN"]
+    paths = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (len(test_dates), len(test_tickers))), axis=0))
+    test_closes = pd.DataFrame(paths, index=test_dates, columns=test_tickers)
+
+    expiry = (date.today() + timedelta(days=90)).strftime("%Y-%m-%d")
+    test_positions = [
+        {"ticker": "LDOS", "type": "call", "qty": 50, "strike": 110.0, "expiry": expiry, "purchase_premium": "4.4"},
+        {"ticker": "BAH", "type": "call", "qty": 16, "strike": 100.0, "expiry": expiry, "purchase_premium": "5.4"},
+        {"ticker": "KTOS", "type": "put", "qty": 12, "strike": 95.0, "expiry": expiry, "purchase_premium": "3.60"},
+        {"ticker": "DFEN", "type": "etf", "qty": 1800, "purchase_price": "45.00"},
+    ] * 25 # 100 positions
+
+    start_time = time.perf_counter()
+    result = run_backtest(test_positions, test_closes, 0.045, {"LDOS": 0.01})
+    elapsed = time.perf_counter() - start_time
+    print(f"{result['valuations'].shape[0]} positions x {result['valuations'].shape[1]} dates valorisées en {elapsed:.2f}s")
+    print(result["total_value"].tail())
+    print(f"P&L cumulé sur la période : {result['cumulative_pnl'].iloc[-1]:,.2f}€")
+
+    # Clôture manquante (jour férié local) : la position garde sa dernière clôture, pas de faux saut de P&L
+    holed_closes = test_closes.copy()
+    holed_closes.iloc[-5, holed_closes.columns.get_loc("DFEN")] = np.nan
+    holed = run_backtest(test_positions, holed_closes, 0.045, {"LDOS": 0.01})
+    jump = abs(holed["daily_pnl"].iloc[-5]) - abs(result["daily_pnl"].iloc[-5])
+    print(f"Clôture manquante comblée : {'OK' if holed['total_value'].notna().all() and jump < 1e6 else 'ÉCHEC'}")
+
+    # Ticker coté en cours de période : P&L cumulé défini dès que toutes les positions ont un prix
+    late_closes = test_closes.copy()
+    late_closes.iloc[:150, late_closes.columns.get_loc("BAH")] = np.nan
+    late = run_backtest(test_positions, late_closes, 0.045, {"LDOS": 0.01})
+    valid_totals, valid_pnl = late["total_value"].notna().sum(), late["cumulative_pnl"].notna().sum()
+    print(f"Ticker coté tardivement : {valid_totals} totaux, {valid_pnl} P&L cumulés "
+          f"{'OK' if valid_pnl == valid_totals > 0 and late['cumulative_pnl'].dropna().iloc[0] == 0 else 'ÉCHEC'}")
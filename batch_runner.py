@@ -0,0 +1,112 @@
+# batch_runner.py
+import os
+import time
+
+from position_loader import OPTION_TYPES, format_expiry
+
+
+def collect_universe(portfolios):
+    """
+    Construit l'union des tickers et des contrats d'options de plusieurs portefeuilles.
+
+    Paramètres:
+    portfolios (dict): Nom du portefeuille -> liste de positions.
+
+    Retourne:
+    tuple: (ensemble des tickers, liste des contrats d'options uniques au format fetch_live_option_data,
+            nombre total de positions).
+    """
+    tickers = set()
+    contracts = set()
+    position_count = 0
+    for positions in portfolios.values():
+        for pos in positions:
+            position_count += 1
+            tickers.add(pos["ticker"])
+            if pos["type"] in OPTION_TYPES:
+                contracts.add((pos["ticker"], float(pos["strike"]), format_expiry(pos["expiry"]), pos["type"]))
+
+    option_positions_details = [{"ticker": ticker, "strike": strike, "expiry": expiry, "type": option_type}
+                                for ticker, strike, expiry, option_type in sorted(contracts)]
+    return tickers, option_positions_details, position_count
+
+
+def run_batch(portfolios, with_reports=True):
+    """
+    Valorise plusieurs portefeuilles (ex: plusieurs comptes) en partageant les données de marché.
+
+    Les données sont récupérées sur l'union des instruments : chaque sous-jacent (spot,
+    dividende, HV) et chaque contrat d'option (cotation, IV, prix théorique) n'est
+    téléchargé et valorisé qu'une seule fois, puis les résultats sont redistribués à
+    chaque portefeuille. Le coût dépend du nombre d'instruments uniques et non du
+    nombre total de positions.
+
+    Paramètres:
+    portfolios (dict): Nom du portefeuille -> liste de positions.
+    with_reports (bool): Génère aussi le rapport HTML de chaque portefeuille.
+
+    Retourne:
+    dict: Nom du portefeuille -> dict avec 'df', 'summary', 'options_valuation_details' et 'html' (si demandé),
+          ou None si les données de marché n'ont pas pu être récupérées.
+    """
+    from main_portfolio import fetch_market_inputs
+    from portfolio_analyzer import analyze_portfolio
+    from portfolio_reporter import get_portfolio_report_html
+
+    start = time.perf_counter()
+    tickers, option_positions_details, position_count = collect_universe(portfolios)
+    print(f"Batch : {len(portfolios)} portefeuilles, {position_count} positions -> "
+          f"{len(tickers)} sous-jacents et {len(option_positions_details)} contrats d'options uniques.")
+
+    market_inputs = fetch_market_inputs(tickers, option_positions_details)
+    if market_inputs is None:
+        return None
+    risk_free_rate, live_prices, dividend_yields_by_ticker, live_option_data = market_inputs
+
+    # Caches partagés par tous les portefeuilles du batch
+    historical_volatilities = {}
+    pricing_cache = {}
+
+    results = {}
+    for name, positions in portfolios.items():
+        df, summary, options_valuation_details = analyze_portfolio(
+            positions, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data,
+            historical_volatilities=historical_volatilities, pricing_cache=pricing_cache
+        )
+        df_sorted = df.sort_values(by="Valeur Marché (€)", ascending=False)
+        results[name] = {"df": df_sorted, "summary": summary, "options_valuation_details": options_valuation_details}
+        if with_reports:
+            results[name]["html"] = get_portfolio_report_html(df_sorted, summary, options_valuation_details)
+
+    print(f"Batch terminé en {time.perf_counter() - start:.1f}s : {len(historical_volatilities)} HV et "
+          f"{len(pricing_cache)} contrats valorisés pour {position_count} positions.")
+    return results
+
+
+def load_portfolios(paths):
+    """
+    Charge plusieurs fichiers de positions (CSV, JSON Lines ou Parquet).
+    Le nom de chaque portefeuille est le nom du fichier sans extension ; il sert aussi de nom
+    au rapport HTML, deux fichiers de même nom (a/book.csv, b/book.csv) sont donc refusés.
+    """
+    from position_loader import load_positions
+
+    sources = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in sources:
+            raise ValueError(f"Nom de portefeuille en double '{name}' : {sources[name]} et {path}. Renommer l'un des fichiers.")
+        sources[name] = path
+    return {name: load_positions(path) for name, path in sources.items()}
+
+
+def write_reports(results, output_dir):
+    """
+    Écrit le rapport HTML de chaque portefeuille dans output_dir/<nom>.html.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name, result in results.items():
+        report_path = os.path.join(output_dir, f"{name}.html")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(result["html"])
+        print(f"Rapport {name} écrit dans {report_path}")
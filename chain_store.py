@@ -0,0 +1,304 @@
+# chain_store.py
+"""
+Stockage local des chaînes d'options téléchargées, en Parquet compressé (zstd),
+partitionné par date de snapshot, ticker et échéance :
+
+    <racine>/date=2026-10-19/ticker=LDOS/expiry=2026-12-18/part-<horodatage>-<id>.parquet
+
+Les écritures sont en ajout seul (un nouveau fichier par snapshot). Les lectures
+n'ouvrent que les partitions correspondant aux critères (dates, ticker, échéances),
+puis filtrent type et strikes dans les fichiers (statistiques des row groups).
+"""
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+STORE_COLUMNS = ("snapshot_ts", "type", "strike", "bid", "ask", "lastPrice", "volume", "openInterest",
+                 "impliedVolatility", "contractSymbol")
+PARTITION_COLUMNS = ("date", "ticker", "expiry")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow # noqa: F401
+    except ImportError as e:
+        raise ImportError("Le stockage des chaînes d'options nécessite pyarrow (pip install pyarrow).") from e
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("snapshot_ts", pa.timestamp("s")),
+        ("type", pa.string()),
+        ("strike", pa.float64()),
+        ("bid", pa.float64()),
+        ("ask", pa.float64()),
+        ("lastPrice", pa.float64()),
+        ("volume", pa.float64()),
+        ("openInterest", pa.float64()),
+        ("impliedVolatility", pa.float64()),
+        ("contractSymbol", pa.string()),
+    ])
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def chain_frame(calls, puts):
+    """
+    Assemble les DataFrames calls et puts d'une échéance (format yfinance option_chain)
+    en une table au format du stockage (colonne 'type' ajoutée, colonnes manquantes à NaN).
+    """
+    import pandas as pd
+
+    frames = []
+    for option_type, options_df in (("call", calls), ("put", puts)):
+        if options_df is None or options_df.empty:
+            continue
+        frame = options_df.reindex(columns=[c for c in STORE_COLUMNS if c not in ("snapshot_ts", "type")]).copy()
+        frame.insert(0, "type", option_type)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=STORE_COLUMNS[1:])
+    return pd.concat(frames, ignore_index=True)
+
+
+class OptionChainStore:
+    """
+    Stockage partitionné (date / ticker / échéance) des snapshots de chaînes d'options.
+
+    Paramètres:
+    root (str): Répertoire racine du stockage (créé si nécessaire).
+    compression (str): Codec Parquet ('zstd' par défaut).
+    """
+
+    def __init__(self, root, compression="zstd"):
+        _require_pyarrow()
+        self.root = root
+        self.compression = compression
+        os.makedirs(root, exist_ok=True)
+
+    def _partition_dir(self, snapshot_date, ticker, expiry):
+        return os.path.join(self.root, f"date={snapshot_date}", f"ticker={ticker}", f"expiry={expiry}")
+
+    def write_snapshot(self, ticker, expiry, chain, snapshot_time=None):
+        """
+        Ajoute un snapshot de la chaîne d'une échéance (nouveau fichier, jamais de réécriture).
+
+        Paramètres:
+        ticker (str): Sous-jacent.
+        expiry (str ou date): Échéance ('YYYY-MM-DD').
+        chain (pd.DataFrame): Options de l'échéance (colonnes de STORE_COLUMNS, 'type' = 'call'/'put'),
+                              par exemple issue de chain_frame.
+        snapshot_time (datetime): Horodatage du snapshot (maintenant par défaut).
+
+        Retourne:
+        str: Chemin du fichier écrit, ou None si la chaîne est vide.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if chain is None or chain.empty:
+            return None
+        snapshot_time = (snapshot_time or datetime.now()).replace(microsecond=0)
+        expiry = _as_date(expiry).strftime("%Y-%m-%d")
+
+        frame = chain.reindex(columns=STORE_COLUMNS[1:]).copy()
+        frame.insert(0, "snapshot_ts", snapshot_time)
+        # Tri par type puis strike : les statistiques min/max des row groups restent sélectives
+        frame = frame.sort_values(["type", "strike"], kind="stable")
+        table = pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+
+        directory = self._partition_dir(snapshot_time.date(), ticker, expiry)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{snapshot_time:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        temporary_path = path + ".tmp"
+        pq.write_table(table, temporary_path, compression=self.compression)
+        os.replace(temporary_path, path) # Un lecteur ne voit jamais de fichier partiellement écrit
+        return path
+
+    def write_chain(self, ticker, chain, snapshot_time=None):
+        """
+        Ajoute un snapshot d'une chaîne multi-échéances (colonne 'expiry'), ex: fetch_full_option_chain.
+
+        Retourne:
+        list: Chemins des fichiers écrits (un par échéance).
+        """
+        snapshot_time = snapshot_time or datetime.now()
+        paths = []
+        for expiry, expiry_chain in chain.groupby("expiry", sort=True):
+            path = self.write_snapshot(ticker, expiry, expiry_chain, snapshot_time=snapshot_time)
+            if path is not None:
+                paths.append(path)
+        return paths
+
+    def archive(self, ticker, chain, expiry=None):
+        """
+        Archive une chaîne téléchargée pendant une analyse (write_snapshot si `expiry` est donné,
+        sinon write_chain) : un échec d'écriture n'est qu'un avertissement, il n'interrompt
+        jamais la récupération des cotations.
+
+        Retourne:
+        bool: True si la chaîne a été archivée.
+        """
+        try:
+            if expiry is None:
+                self.write_chain(ticker, chain)
+            else:
+                self.write_snapshot(ticker, expiry, chain)
+            return True
+        except Exception as e:
+            print(f"Avertissement: Chaîne {ticker} non archivée dans {self.root} : {e}")
+            return False
+
+    def _partition_files(self, ticker, start, end, expiry_min, expiry_max):
+        """
+        Fichiers des partitions retenues : seuls les répertoires des dates, du ticker et des
+        échéances demandés sont listés, jamais l'arborescence complète.
+        """
+        if start is None or end is None:
+            dates = sorted(name[5:] for name in os.listdir(self.root) if name.startswith("date="))
+            start = _as_date(start or (dates[0] if dates else date.today()))
+            end = _as_date(end or (dates[-1] if dates else date.today()))
+        files = []
+        day = _as_date(start)
+        while day <= _as_date(end):
+            date_dir = os.path.join(self.root, f"date={day}")
+            ticker_dirs = ([os.path.join(date_dir, f"ticker={ticker}")] if ticker is not None
+                           else [entry.path for entry in os.scandir(date_dir)] if os.path.isdir(date_dir) else [])
+            for ticker_dir in ticker_dirs:
+                if not os.path.isdir(ticker_dir):
+                    continue
+                for expiry_entry in os.scandir(ticker_dir):
+                    expiry = expiry_entry.name[len("expiry="):]
+                    if (expiry_min is not None and expiry < expiry_min) or (expiry_max is not None and expiry > expiry_max):
+                        continue
+                    files.extend(entry.path for entry in os.scandir(expiry_entry.path) if entry.name.endswith(".parquet"))
+            day += timedelta(days=1)
+        return files
+
+    def query(self, ticker=None, option_type=None, strike_min=None, strike_max=None, start=None, end=None,
+              expiry_min=None, expiry_max=None, columns=None):
+        """
+        Lit l'historique des snapshots avec élagage des partitions et filtres poussés dans Parquet.
+
+        Exemple : tous les calls LDOS de strike 150 à 200 sur les 30 derniers jours :
+            store.query("LDOS", "call", 150, 200, start=date.today() - timedelta(days=30))
+
+        Paramètres:
+        ticker (str): Sous-jacent (tous si None).
+        option_type (str): 'call' ou 'put' (les deux si None).
+        strike_min, strike_max (float): Bornes incluses des strikes.
+        start, end (date): Bornes incluses des dates de snapshot (toutes si None).
+        expiry_min, expiry_max (str ou date): Bornes incluses des échéances.
+        columns (list): Colonnes à lire (toutes par défaut).
+
+        Retourne:
+        pd.DataFrame: Une ligne par option et par snapshot, avec les colonnes 'date', 'ticker' et 'expiry'.
+        """
+        import pandas as pd
+        import pyarrow.dataset as ds
+
+        expiry_min = _as_date(expiry_min).strftime("%Y-%m-%d") if expiry_min is not None else None
+        expiry_max = _as_date(expiry_max).strftime("%Y-%m-%d") if expiry_max is not None else None
+        files = self._partition_files(ticker, start, end, expiry_min, expiry_max)
+        output_columns = list(PARTITION_COLUMNS) + list(columns or STORE_COLUMNS)
+        if not files:
+            return pd.DataFrame(columns=output_columns)
+
+        import pyarrow as pa
+
+        partition_schema = pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS])
+        dataset = ds.dataset(files, format="parquet", partition_base_dir=self.root,
+                             partitioning=ds.partitioning(partition_schema, flavor="hive"))
+        condition = None
+        for expression in (
+            ds.field("type") == option_type if option_type is not None else None,
+            ds.field("strike") >= float(strike_min) if strike_min is not None else None,
+            ds.field("strike") <= float(strike_max) if strike_max is not None else None,
+        ):
+            if expression is not None:
+                condition = expression if condition is None else condition & expression
+        return dataset.to_table(columns=output_columns, filter=condition).to_pandas()
+
+    def compact(self, snapshot_date):
+        """
+        Fusionne les fichiers de chaque partition d'une journée close en un seul fichier
+        (moins de fichiers à ouvrir pour les requêtes sur de longues périodes).
+
+        Retourne:
+        int: Nombre de partitions compactées.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        compacted = 0
+        date_dir = os.path.join(self.root, f"date={_as_date(snapshot_date)}")
+        if not os.path.isdir(date_dir):
+            return 0
+        for ticker_entry in os.scandir(date_dir):
+            for expiry_entry in os.scandir(ticker_entry.path):
+                parts = sorted(entry.path for entry in os.scandir(expiry_entry.path) if entry.name.endswith(".parquet"))
+                if len(parts) < 2:
+                    continue
+                table = pa.concat_tables([pq.ParquetFile(part).read() for part in parts])
+                path = os.path.join(expiry_entry.path, f"compacted-{uuid.uuid4().hex[:8]}.parquet")
+                pq.write_table(table, path + ".tmp", compression=self.compression)
+                os.replace(path + ".tmp", path)
+                for part in parts:
+                    os.remove(part)
+                compacted += 1
+        return compacted
+
+
+# Pour tester ce module indépendamment (données synthétiques, sans réseau)
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    import numpy as np
+    import pandas as pd
+
+    print("--- Test de chain_store.py ---")
+    rng = np.random.default_rng(0)
+    store = OptionChainStore(tempfile.mkdtemp(prefix="chain-store-"))
+    today = datetime.now().replace(hour=16, minute=0, second=0, microsecond=0)
+    tickers = ["LDOS", "BAH", "KTOS", "DFEN", "AAPL"]
+    expiries = [(today + timedelta(days=30 * k)).strftime("%Y-%m-%d") for k in range(1, 9)]
+    strikes = np.arange(100.0, 250.0, 2.5)
+
+    start_time = time.perf_counter()
+    for day in range(60):
+        snapshot_time = today - timedelta(days=day)
+        for ticker in tickers:
+            for expiry in expiries:
+                chain = pd.DataFrame({
+                    "type": ["call"] * len(strikes) + ["put"] * len(strikes),
+                    "strike": np.concatenate([strikes, strikes]),
+                    "bid": rng.uniform(0.5, 20, 2 * len(strikes)),
+                    "ask": rng.uniform(0.5, 20, 2 * len(strikes)),
+                    "lastPrice": rng.uniform(0.5, 20, 2 * len(strikes)),
+                })
+                store.write_snapshot(ticker, expiry, chain, snapshot_time=snapshot_time)
+    print(f"Écriture de 60 jours x {len(tickers)} tickers x {len(expiries)} échéances : {time.perf_counter() - start_time:.1f}s")
+
+    start_time = time.perf_counter()
+    result = store.query("LDOS", "call", 150, 200, start=(today - timedelta(days=30)).date(), end=today.date())
+    print(f"Calls LDOS 150-200 sur 30 jours : {len(result)} lignes en {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    print(result.head())
+
+    # Plusieurs snapshots intrajournaliers, puis compaction de la journée
+    for hour in (10, 12, 14):
+        store.write_snapshot("LDOS", expiries[0], chain, snapshot_time=today.replace(hour=hour))
+    print(f"Partitions compactées pour le {today.date()} : {store.compact(today.date())}")
+
+    start_time = time.perf_counter()
+    result = store.query("LDOS", "call", 150, 200, start=(today - timedelta(days=30)).date(), end=today.date(),
+                         expiry_min=expiries[0], expiry_max=expiries[0])
+    print(f"Même requête sur une seule échéance : {len(result)} lignes en {(time.perf_counter() - start_time) * 1000:.0f} ms")
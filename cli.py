@@ -0,0 +1,440 @@
+# cli.py
+"""
+Point d'entrée en ligne de commande d'Iron Dome.
+
+Sous-commandes :
+    price    Prix d'une option (Black-Scholes ou arbre binomial américain)
+    iv       Volatilité implicite à partir d'un prix de marché
+    analyze  Analyse complète du portefeuille (affichage console)
+    report   Génère le rapport HTML (fichier ou sortie standard)
+    send     Génère le rapport et l'envoie par email
+    backtest Revalorise le portefeuille actuel sur un an d'historique
+    batch    Valorise plusieurs portefeuilles en partageant données de marché et pricing
+    bench-fetch  Benchmark de la récupération des données contre un serveur Yahoo factice
+    bench-scale  Montée en charge analyse -> rapport sur des portefeuilles synthétiques
+    screen   Classe toutes les options cotées d'un univers par sur/sous-évaluation
+    explain  Explique le P&L entre deux exécutions de l'historique (delta, gamma, vega, theta, taux)
+
+Chaque sous-commande n'importe que ce dont elle a besoin : `price` et `iv`
+ne chargent que numpy (ni scipy, ni pandas, ni yfinance).
+Utiliser `--timing` pour mesurer le temps de démarrage et vérifier les modules chargés.
+"""
+import time
+
+_START_TIME = time.perf_counter()
+
+import argparse
+import contextlib
+import sys
+
+HEAVY_MODULES = ("pandas", "scipy", "yfinance", "smtplib")
+# Options d'analyse sans effet en mode flux (--chunk-size) : refusées plutôt qu'ignorées
+STREAMING_UNSUPPORTED = ("vol_surface", "hv_estimator", "chain_store", "history_db", "iv_index", "risk_rules",
+                         "risk_state", "risk_model", "pricing_budget", "pricing_tolerance")
+
+
+def _cmd_price(args):
+    from option_pricing import black_scholes_call, binomial_tree_american_call
+
+    if args.model == "bs":
+        price = black_scholes_call(args.spot, args.strike, args.T, args.rate, args.sigma, args.q)
+    else:
+        price = binomial_tree_american_call(args.spot, args.strike, args.T, args.rate, args.sigma, args.q, args.steps)
+    print(f"{price:.4f}")
+    return 0
+
+
+def _cmd_iv(args):
+    from implied_volatility_calculator import find_implied_volatility_bisection
+
+    iv = find_implied_volatility_bisection(args.market_price, args.spot, args.strike, args.T, args.rate, args.q)
+    if iv != iv: # NaN
+        print("Volatilité implicite introuvable pour ces paramètres.")
+        return 1
+    print(f"{iv:.6f}")
+    return 0
+
+
+def _load_positions(args):
+    if args.positions:
+        from position_loader import load_positions
+        return load_positions(args.positions)
+    import main_portfolio
+    return main_portfolio.positions
+
+
+def _analysis_options(args):
+    chain_store = None
+    if args.chain_store:
+        from chain_store import OptionChainStore
+        chain_store = OptionChainStore(args.chain_store)
+    run_history = None
+    if args.history_db:
+        from run_history import RunHistory
+        run_history = RunHistory(args.history_db)
+    iv_index = None
+    if args.iv_index:
+        from iv_index import IVIndex
+        iv_index = IVIndex(args.iv_index)
+        if not iv_index.series and run_history is not None: # Premier usage : amorçage depuis l'historique
+            iv_index.backfill_from_history(run_history)
+    risk_engine = None
+    if args.risk_rules:
+        from risk_rules import RiskEngine, load_rules
+        rules = None if args.risk_rules == "default" else load_rules(args.risk_rules)
+        risk_engine = RiskEngine(rules, state_path=args.risk_state)
+    risk_model = None
+    if args.risk_model:
+        from portfolio_risk import EWMACovariance
+        risk_model = EWMACovariance(args.risk_model)
+    return {"with_vol_surfaces": args.vol_surface, "hv_estimator": args.hv_estimator, "hv_window": args.hv_window,
+            "chain_store": chain_store, "run_history": run_history, "iv_index": iv_index, "risk_engine": risk_engine,
+            "pricing_budget": args.pricing_budget, "pricing_tolerance": args.pricing_tolerance, "risk_model": risk_model}
+
+
+@contextlib.contextmanager
+def _market_data(args):
+    """
+    Installe le fournisseur de données demandé (--record-market-data / --replay-market-data).
+    """
+    if not (args.record_market_data or args.replay_market_data):
+        yield
+        return
+    from market_data_provider import RecordingProvider, ReplayProvider, use_provider
+
+    if args.replay_market_data:
+        provider = ReplayProvider(args.replay_market_data)
+        print(f"Rejeu de l'instantané {args.replay_market_data} (données du {provider.as_of:%Y-%m-%d %H:%M}).")
+    else:
+        provider = RecordingProvider(path=args.record_market_data)
+    try:
+        with use_provider(provider):
+            yield
+    finally:
+        if args.record_market_data and not args.replay_market_data:
+            print(f"{provider.save()} réponses enregistrées dans {args.record_market_data}.")
+
+
+def _cmd_analyze(args):
+    with _market_data(args):
+        return _run_analyze(args)
+
+
+def _run_analyze(args):
+    import main_portfolio
+
+    if args.positions and args.chunk_size:
+        # Analyse en flux : la mémoire reste bornée par la taille des lots
+        portfolio_summary = main_portfolio.run_streaming_analysis(args.positions, chunk_size=args.chunk_size)
+        if portfolio_summary is None:
+            return 1
+        for key, value in portfolio_summary.items():
+            print(f"{key.strip()}: {value}")
+        return 0
+
+    positions = _load_positions(args)
+    options = _analysis_options(args)
+    result = main_portfolio.run_analysis(positions, **options)
+    if result is None:
+        return 1
+    df_portfolio_sorted, portfolio_summary, options_valuation_details = result
+    print(df_portfolio_sorted.to_string(index=False))
+    for key, value in portfolio_summary.items():
+        print(f"{key.strip()}: {value}")
+    from strategies import analyze_strategies, format_strategies
+    strategies = analyze_strategies(positions, options_valuation_details)
+    if strategies:
+        print(f"\n{format_strategies(strategies)}")
+    if options["risk_model"] is not None and "Volatilité annuelle portefeuille " in portfolio_summary:
+        from portfolio_risk import format_risk_contributions
+        print(f"\n{format_risk_contributions(options['risk_model'].portfolio_risk(df_portfolio_sorted, options_valuation_details))}")
+    return 0
+
+
+def _cmd_report(args):
+    import main_portfolio
+
+    with _market_data(args):
+        html_report_output = main_portfolio.build_report(_load_positions(args), **_analysis_options(args))
+    if html_report_output is None:
+        return 1
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(html_report_output)
+        print(f"Rapport écrit dans {args.output}")
+    else:
+        sys.stdout.write(html_report_output)
+    return 0
+
+
+def _cmd_send(args):
+    import main_portfolio
+
+    email_config = main_portfolio.get_email_config()
+    if email_config is None:
+        return 1
+    with _market_data(args):
+        html_report_output = main_portfolio.build_report(_load_positions(args), **_analysis_options(args))
+    if html_report_output is None:
+        return 1
+    return 0 if main_portfolio.send_report(html_report_output, email_config) else 1
+
+
+def _cmd_batch(args):
+    from batch_runner import load_portfolios, run_batch, write_reports
+
+    try:
+        portfolios = load_portfolios(args.portfolios)
+    except ValueError as e:
+        print(f"Erreur: {e}")
+        return 1
+    results = run_batch(portfolios, with_reports=True)
+    if results is None:
+        return 1
+    for name, result in results.items():
+        print(f"[{name}]")
+        for key, value in result["summary"].items():
+            print(f"  {key.strip()}: {value}")
+    write_reports(results, args.output_dir)
+    return 0
+
+
+def _cmd_backtest(args):
+    from backtest import backtest_portfolio
+
+    result = backtest_portfolio(_load_positions(args), days=args.days, tree_steps=args.steps)
+    if result is None:
+        return 1
+    if args.output:
+        result["valuations"].to_csv(args.output)
+        print(f"Matrice de valorisation écrite dans {args.output}")
+    print(result["total_value"].to_string())
+    print(f"P&L cumulé sur la période : {result['cumulative_pnl'].iloc[-1]:,.2f}€")
+    return 0
+
+
+def _cmd_bench_fetch(args):
+    from fake_yahoo_server import FakeYahooConfig
+    from fetch_benchmark import format_results, run_fetch_benchmark
+
+    config = FakeYahooConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             rate_limit_rate=args.rate_limit_rate, max_requests_per_second=args.max_rps,
+                             recordings_dir=args.recordings, seed=args.seed)
+    print(format_results(run_fetch_benchmark(sizes=args.sizes, config=config)))
+    return 0
+
+
+def _cmd_bench_scale(args):
+    from scale_benchmark import format_results, growth_exponents, run_scale_benchmark
+
+    results = run_scale_benchmark(sizes=args.sizes, seed=args.seed)
+    print(format_results(results))
+    if args.fail_on_superlinear and any(superlinear for *_, superlinear in growth_exponents(results)):
+        return 1
+    return 0
+
+
+def _cmd_screen(args):
+    from option_screener import format_screen, screen_universe
+
+    chain_store = None
+    if args.chain_store:
+        from chain_store import OptionChainStore
+        chain_store = OptionChainStore(args.chain_store)
+    with contextlib.ExitStack() as stack:
+        coordinator = None
+        if args.listen or args.local_workers:
+            from work_queue import WorkQueueCoordinator
+            host, _, port = (args.listen or "127.0.0.1:0").rpartition(":")
+            coordinator = stack.enter_context(WorkQueueCoordinator((host, int(port))))
+            print(f"File de travaux à l'écoute sur {coordinator.address[0]}:{coordinator.address[1]}")
+            if args.local_workers:
+                coordinator.start_local_workers(args.local_workers)
+        ranked = screen_universe(args.tickers, max_spread_pct=args.max_spread, min_open_interest=args.min_open_interest,
+                                 min_volume=args.min_volume, hv_estimator=args.hv_estimator, hv_window=args.hv_window,
+                                 tree_steps=args.tree_steps, workers=args.workers, fetch_workers=args.fetch_workers,
+                                 chain_store=chain_store, coordinator=coordinator)
+    if ranked is None:
+        return 1
+    if args.output:
+        ranked.to_csv(args.output, index=False)
+        print(f"{len(ranked)} contrats classés écrits dans {args.output}")
+    if not ranked.empty:
+        print(format_screen(ranked, top=args.top))
+    return 0
+
+
+def _cmd_worker(args):
+    import os
+
+    from work_queue import AUTHKEY_ENV, run_worker
+
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        print(f"Erreur: Clé partagée manquante (variable d'environnement {AUTHKEY_ENV}).")
+        return 1
+    host, _, port = args.connect.rpartition(":")
+    completed = run_worker((host, int(port)), authkey.encode())
+    print(f"Worker arrêté après {completed} tâche(s).")
+    return 0
+
+
+def _cmd_explain(args):
+    from pnl_explain import explain_runs, format_explain
+    from run_history import RunHistory
+
+    with RunHistory(args.history_db) as history:
+        result = explain_runs(history, run_id=args.run_id, previous_run_id=args.previous_run_id)
+    if result is None:
+        return 1
+    print(format_explain(result))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="iron-dome", description="Analyse de portefeuille Iron Dome.")
+    parser.add_argument("--timing", action="store_true",
+                        help="Affiche le temps écoulé depuis le démarrage et les modules lourds chargés.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_pricing_args(p):
+        p.add_argument("--spot", "-S", type=float, required=True, help="Prix spot du sous-jacent")
+        p.add_argument("--strike", "-K", type=float, required=True, help="Prix d'exercice")
+        p.add_argument("--T", "-T", type=float, required=True, help="Temps jusqu'à l'échéance en années")
+        p.add_argument("--rate", "-r", type=float, default=0.045, help="Taux sans risque annuel (décimal)")
+        p.add_argument("--q", "-q", type=float, default=0.0, help="Rendement des dividendes annuel (décimal)")
+
+    p_price = subparsers.add_parser("price", help="Prix d'une option call")
+    add_pricing_args(p_price)
+    p_price.add_argument("--sigma", "-s", type=float, required=True, help="Volatilité annuelle (décimal)")
+    p_price.add_argument("--model", choices=["bs", "binomial"], default="binomial",
+                         help="bs = Black-Scholes européen, binomial = arbre américain")
+    p_price.add_argument("--steps", "-N", type=int, default=500, help="Nombre de pas de l'arbre binomial")
+    p_price.set_defaults(func=_cmd_price)
+
+    p_iv = subparsers.add_parser("iv", help="Volatilité implicite d'un call")
+    add_pricing_args(p_iv)
+    p_iv.add_argument("--market-price", "-P", type=float, required=True, help="Prix de marché de l'option")
+    p_iv.set_defaults(func=_cmd_iv)
+
+    def add_positions_arg(p):
+        p.add_argument("--positions", help="Fichier de positions (CSV, JSON Lines ou Parquet). "
+                                           "Par défaut : positions définies dans main_portfolio.py")
+        p.add_argument("--vol-surface", action="store_true",
+                       help="Construit la surface de volatilité (SVI) de chaque sous-jacent d'option")
+        p.add_argument("--hv-estimator", choices=["close_to_close", "ewma", "parkinson", "garman_klass",
+                                                  "rogers_satchell", "yang_zhang"],
+                       help="Estimateur de volatilité réalisée (données OHLC, un seul téléchargement)")
+        p.add_argument("--hv-window", type=int, default=60, help="Fenêtre de l'estimateur en séances (défaut : 60)")
+        p.add_argument("--chain-store", help="Répertoire où archiver les chaînes d'options téléchargées (Parquet partitionné)")
+        p.add_argument("--history-db", help="Base SQLite où enregistrer les valorisations de l'exécution (historique)")
+        p.add_argument("--iv-index", help="Fichier JSON de l'index IV rank / percentile (mis à jour à chaque exécution)")
+        p.add_argument("--risk-rules", help="Fichier JSON des limites de risque ('default' : règles par défaut)")
+        p.add_argument("--risk-state", help="Fichier JSON des alertes actives, pour ne notifier que les changements d'état")
+        p.add_argument("--risk-model", help="Fichier .npz de la covariance EWMA des sous-jacents (créé s'il n'existe pas) : "
+                                            "volatilité du portefeuille et contributions au risque")
+        p.add_argument("--pricing-budget", type=float,
+                       help="Secondes accordées aux prix théoriques : résultat approché immédiat, raffiné jusqu'à l'échéance")
+        p.add_argument("--pricing-tolerance", type=float,
+                       help="Erreur cible (€) sur la valeur théorique des options (raffinement progressif)")
+        market_data = p.add_mutually_exclusive_group()
+        market_data.add_argument("--record-market-data", help="Enregistre toutes les réponses du fournisseur dans cet instantané")
+        market_data.add_argument("--replay-market-data", help="Rejoue un instantané enregistré, sans accès réseau")
+
+    p_analyze = subparsers.add_parser("analyze", help="Analyse du portefeuille (console)")
+    add_positions_arg(p_analyze)
+    p_analyze.add_argument("--chunk-size", type=int,
+                           help="Analyse en flux par lots de cette taille (affiche uniquement le résumé)")
+    p_analyze.set_defaults(func=_cmd_analyze)
+
+    p_report = subparsers.add_parser("report", help="Génère le rapport HTML")
+    add_positions_arg(p_report)
+    p_report.add_argument("--output", "-o", help="Fichier de sortie (sortie standard par défaut)")
+    p_report.set_defaults(func=_cmd_report)
+
+    p_send = subparsers.add_parser("send", help="Génère le rapport et l'envoie par email")
+    add_positions_arg(p_send)
+    p_send.set_defaults(func=_cmd_send)
+
+    p_batch = subparsers.add_parser("batch", help="Valorise plusieurs portefeuilles avec des données de marché partagées")
+    p_batch.add_argument("portfolios", nargs="+", help="Fichiers de positions (un portefeuille par fichier)")
+    p_batch.add_argument("--output-dir", "-o", default="reports", help="Répertoire des rapports HTML")
+    p_batch.set_defaults(func=_cmd_batch)
+
+    p_backtest = subparsers.add_parser("backtest", help="Revalorise le portefeuille actuel sur l'historique")
+    add_positions_arg(p_backtest)
+    p_backtest.add_argument("--days", type=int, default=365, help="Profondeur de l'historique en jours")
+    p_backtest.add_argument("--steps", "-N", type=int, default=100, help="Nombre de pas de l'arbre binomial")
+    p_backtest.add_argument("--output", "-o", help="Fichier CSV pour la matrice positions x dates")
+    p_backtest.set_defaults(func=_cmd_backtest)
+
+    p_bench = subparsers.add_parser("bench-fetch", help="Benchmark de la récupération des données (serveur Yahoo factice)")
+    p_bench.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Tailles d'univers (tickers)")
+    p_bench.add_argument("--latency", type=float, default=0.02, help="Latence par requête en secondes")
+    p_bench.add_argument("--jitter", type=float, default=0.005, help="Écart-type de la gigue en secondes")
+    p_bench.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses HTTP 500")
+    p_bench.add_argument("--rate-limit-rate", type=float, default=0.0, help="Proportion de réponses HTTP 429")
+    p_bench.add_argument("--max-rps", type=float, help="Débit maximal du serveur (requêtes/s) avant HTTP 429")
+    p_bench.add_argument("--recordings", help="Répertoire de réponses enregistrées (<endpoint>/<TICKER>.json)")
+    p_bench.add_argument("--seed", type=int, default=0, help="Graine de la gigue et des erreurs injectées")
+    p_bench.set_defaults(func=_cmd_bench_fetch)
+
+    p_scale = subparsers.add_parser("bench-scale", help="Montée en charge analyse -> rapport (portefeuilles synthétiques)")
+    p_scale.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Nombres de positions")
+    p_scale.add_argument("--seed", type=int, default=0, help="Graine du générateur de portefeuilles")
+    p_scale.add_argument("--fail-on-superlinear", action="store_true",
+                         help="Code de sortie 1 si une étape croît de façon super-linéaire")
+    p_scale.set_defaults(func=_cmd_bench_scale)
+
+    p_screen = subparsers.add_parser("screen", help="Classe les options cotées d'un univers par sur/sous-évaluation")
+    p_screen.add_argument("tickers", nargs="+", help="Univers de sous-jacents")
+    p_screen.add_argument("--max-spread", type=float, default=0.10, help="Fourchette (ask - bid) / mid maximale")
+    p_screen.add_argument("--min-open-interest", type=int, default=100, help="Open interest minimal")
+    p_screen.add_argument("--min-volume", type=int, default=0, help="Volume du jour minimal")
+    p_screen.add_argument("--hv-estimator", default="close_to_close", help="Estimateur de volatilité réalisée")
+    p_screen.add_argument("--hv-window", type=int, default=60, help="Fenêtre de l'estimateur en séances")
+    p_screen.add_argument("--tree-steps", type=int, default=200, help="Nombre de pas de l'arbre binomial")
+    p_screen.add_argument("--workers", type=int, help="Processus de calcul (tous les cœurs par défaut)")
+    p_screen.add_argument("--fetch-workers", type=int, default=16, help="Téléchargements de chaînes simultanés")
+    p_screen.add_argument("--chain-store", help="Répertoire où archiver les chaînes téléchargées")
+    p_screen.add_argument("--top", type=int, default=20, help="Contrats affichés par sens")
+    p_screen.add_argument("--output", "-o", help="Fichier CSV du classement complet")
+    p_screen.add_argument("--listen", help="Valorise via la file de travaux répartie, à l'écoute sur HÔTE:PORT "
+                                           "(workers distants : cli.py worker --connect HÔTE:PORT)")
+    p_screen.add_argument("--local-workers", type=int, help="Workers locaux lancés pour la file de travaux répartie")
+    p_screen.set_defaults(func=_cmd_screen)
+
+    p_worker = subparsers.add_parser("worker", help="Worker de la file de travaux répartie (clé : PORTFOLIO_WORKER_AUTHKEY)")
+    p_worker.add_argument("--connect", required=True, help="Adresse HÔTE:PORT du coordinateur")
+    p_worker.set_defaults(func=_cmd_worker)
+
+    p_explain = subparsers.add_parser("explain", help="Explique le P&L entre deux exécutions de l'historique")
+    p_explain.add_argument("--history-db", required=True, help="Base SQLite de l'historique des exécutions")
+    p_explain.add_argument("--run-id", type=int, help="Exécution à expliquer (la dernière par défaut)")
+    p_explain.add_argument("--previous-run-id", type=int, help="Exécution de référence (la précédente par défaut)")
+    p_explain.set_defaults(func=_cmd_explain)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "chunk_size", None) and args.positions:
+        unsupported = [f"--{name.replace('_', '-')}" for name in STREAMING_UNSUPPORTED if getattr(args, name)]
+        if args.hv_window != 60:
+            unsupported.append("--hv-window")
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} non pris en charge avec --chunk-size (analyse en flux).")
+    exit_code = args.func(args)
+
+    if args.timing:
+        elapsed_ms = (time.perf_counter() - _START_TIME) * 1000
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(f"[timing] {args.command}: {elapsed_ms:.1f} ms depuis l'import de cli "
+              f"(modules lourds chargés : {', '.join(loaded) if loaded else 'aucun'})", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+# fake_yahoo_server.py
+"""
+Serveur HTTP local imitant les endpoints Yahoo Finance utilisés par yfinance
+(cookie/crumb, quoteSummary, quote, timeseries, chart et options), pour exercer
+market_data_fetcher hors ligne et de façon reproductible.
+
+Les réponses sont synthétiques (déterministes par ticker) ou rejouées depuis un
+répertoire d'enregistrements. Latence, gigue, taux d'erreurs HTTP 500 et réponses
+de limitation de débit (HTTP 429) sont configurables.
+
+Utilisation :
+    with FakeYahooServer(FakeYahooConfig(latency=0.05, jitter=0.02)) as server:
+        server.install() # yfinance passe désormais par le serveur local
+        fetch_live_data(["LDOS", "BAH"])
+"""
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+ORIGINAL_HOST_HEADER = "X-Yahoo-Host"
+FAKE_CRUMB = "fake-crumb"
+EXPIRY_COUNT = 6
+STRIKES_PER_EXPIRY = 41
+HISTORY_DAYS = 3 * 365
+
+
+@dataclass
+class FakeYahooConfig:
+    """
+    Paramètres du serveur.
+
+    latency (float): Délai ajouté à chaque réponse, en secondes.
+    jitter (float): Écart-type (s) d'une gigue gaussienne ajoutée à la latence.
+    error_rate (float): Probabilité de répondre HTTP 500.
+    rate_limit_rate (float): Probabilité de répondre HTTP 429.
+    max_requests_per_second (float): Débit maximal (seau à jetons) ; au-delà, HTTP 429. None = illimité.
+    recordings_dir (str): Répertoire de réponses enregistrées (<endpoint>/<TICKER>.json), prioritaires
+                          sur les réponses synthétiques.
+    seed (int): Graine des tirages aléatoires (gigue et injection d'erreurs).
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    max_requests_per_second: float = None
+    recordings_dir: str = None
+    seed: int = 0
+
+
+def _ticker_rng(ticker, salt=""):
+    digest = hashlib.sha256(f"{ticker}{salt}".encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+def _ticker_profile(ticker):
+    """
+    Caractéristiques synthétiques stables d'un ticker : spot, volatilité, dividende.
+    """
+    rng = _ticker_rng(ticker)
+    return {
+        "spot": float(np.round(rng.uniform(20, 400), 2)),
+        "volatility": float(rng.uniform(0.15, 0.6)),
+        "dividend_yield": float(np.round(rng.choice([0.0, rng.uniform(0.005, 0.04)]), 4)),
+    }
+
+
+def _history(ticker, days=HISTORY_DAYS):
+    """
+    Historique quotidien synthétique (jours ouvrés) se terminant au spot du profil.
+    """
+    profile = _ticker_profile(ticker)
+    today = datetime.now(timezone.utc).replace(hour=13, minute=30, second=0, microsecond=0)
+    dates = [today - timedelta(days=d) for d in range(days, -1, -1)]
+    dates = [d for d in dates if d.weekday() < 5]
+    rng = _ticker_rng(ticker, "history")
+    daily_sigma = profile["volatility"] / np.sqrt(252)
+    log_path = np.cumsum(rng.normal(0, daily_sigma, len(dates)))
+    close = profile["spot"] * np.exp(log_path - log_path[-1])
+    open_ = close * np.exp(rng.normal(0, daily_sigma / 3, len(dates)))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, daily_sigma / 2, len(dates))))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, daily_sigma / 2, len(dates))))
+    volume = rng.integers(100_000, 5_000_000, len(dates))
+    return [int(d.timestamp()) for d in dates], open_, high, low, close, volume
+
+
+def _expiries():
+    """
+    Échéances mensuelles (troisième vendredi) des EXPIRY_COUNT prochains mois, en timestamps UTC.
+    """
+    today = datetime.now(timezone.utc).date()
+    expiries = []
+    year, month = today.year, today.month
+    while len(expiries) < EXPIRY_COUNT:
+        first = datetime(year, month, 1, tzinfo=timezone.utc)
+        third_friday = first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+        if third_friday.date() > today:
+            expiries.append(int(third_friday.timestamp()))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return expiries
+
+
+def _strike_step(spot):
+    return 1.0 if spot < 50 else 2.5 if spot < 150 else 5.0
+
+
+def _strikes(spot):
+    step = _strike_step(spot)
+    center = round(spot / step) * step
+    half = STRIKES_PER_EXPIRY // 2
+    return [center + step * i for i in range(-half, half + 1) if center + step * i > 0]
+
+
+def chart_payload(ticker, params):
+    timestamps, open_, high, low, close, volume = _history(ticker)
+    if "period1" in params:
+        start = int(params["period1"])
+        end = int(params.get("period2", time.time()))
+    else:
+        days = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+        period = params.get("range", "1mo")
+        if period.endswith("d") and period[:-1].isdigit():
+            span = int(period[:-1])
+        else:
+            span = days.get(period, HISTORY_DAYS)
+        end = int(time.time()) + 1
+        start = end - span * 86400
+    keep = [i for i, ts in enumerate(timestamps) if start <= ts < end] or [len(timestamps) - 1]
+
+    def values(series):
+        return [round(float(series[i]), 4) for i in keep]
+
+    return {"chart": {"result": [{
+        "meta": {
+            "currency": "USD", "symbol": ticker, "exchangeName": "NYQ", "instrumentType": "EQUITY",
+            "exchangeTimezoneName": "America/New_York", "timezone": "EDT", "gmtoffset": -14400,
+            "regularMarketPrice": float(close[-1]), "chartPreviousClose": float(close[-2]),
+            "priceHint": 2, "dataGranularity": params.get("interval", "1d"),
+            "range": params.get("range", ""),
+            "validRanges": ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"],
+        },
+        "timestamp": [timestamps[i] for i in keep],
+        "indicators": {
+            "quote": [{"open": values(open_), "high": values(high), "low": values(low),
+                       "close": values(close), "volume": [int(volume[i]) for i in keep]}],
+            "adjclose": [{"adjclose": values(close)}],
+        },
+    }], "error": None}}
+
+
+def quote_summary_payload(ticker):
+    profile = _ticker_profile(ticker)
+    return {"quoteSummary": {"result": [{
+        "financialData": {"currentPrice": profile["spot"]},
+        "summaryDetail": {"dividendYield": profile["dividend_yield"], "previousClose": profile["spot"]},
+        "quoteType": {"symbol": ticker, "quoteType": "EQUITY", "exchangeTimezoneName": "America/New_York"},
+        "defaultKeyStatistics": {},
+        "assetProfile": {},
+    }], "error": None}}
+
+
+def quote_payload(symbols):
+    result = []
+    for ticker in symbols:
+        profile = _ticker_profile(ticker)
+        result.append({"symbol": ticker, "regularMarketPrice": profile["spot"],
+                       "trailingAnnualDividendYield": profile["dividend_yield"], "currency": "USD"})
+    return {"quoteResponse": {"result": result, "error": None}}
+
+
+def _option_rows(ticker, expiry_ts, option_type, spot, volatility):
+    from option_pricing import black_scholes_call
+
+    T = max((expiry_ts - time.time()) / (365 * 86400), 1 / 365)
+    rows = []
+    rng = _ticker_rng(ticker, f"{expiry_ts}{option_type}")
+    for strike in _strikes(spot):
+        call = black_scholes_call(spot, strike, T, 0.04, volatility)
+        price = call if option_type == "call" else call - spot + strike * np.exp(-0.04 * T) # Parité call-put
+        price = max(float(price), 0.01)
+        spread = max(0.01, round(price * 0.04, 2))
+        symbol = f"{ticker}{datetime.fromtimestamp(expiry_ts, timezone.utc):%y%m%d}{option_type[0].upper()}{int(strike * 1000):08d}"
+        rows.append({
+            "contractSymbol": symbol, "strike": strike, "currency": "USD", "lastPrice": round(price, 2),
+            "change": 0.0, "percentChange": 0.0, "volume": int(rng.integers(0, 2000)),
+            "openInterest": int(rng.integers(0, 10_000)), "bid": round(max(price - spread / 2, 0.0), 2),
+            "ask": round(price + spread / 2, 2), "contractSize": "REGULAR", "expiration": expiry_ts,
+            "lastTradeDate": int(time.time()) - 3600, "impliedVolatility": volatility,
+            "inTheMoney": (spot > strike) if option_type == "call" else (spot < strike),
+        })
+    return rows
+
+
+def options_payload(ticker, expiry_ts=None):
+    profile = _ticker_profile(ticker)
+    expiries = _expiries()
+    expiry_ts = expiries[0] if expiry_ts is None else int(expiry_ts)
+    spot, volatility = profile["spot"], profile["volatility"]
+    options = []
+    if expiry_ts in expiries:
+        options.append({
+            "expirationDate": expiry_ts, "hasMiniOptions": False,
+            "calls": _option_rows(ticker, expiry_ts, "call", spot, volatility),
+            "puts": _option_rows(ticker, expiry_ts, "put", spot, volatility),
+        })
+    return {"optionChain": {"result": [{
+        "underlyingSymbol": ticker, "expirationDates": expiries, "strikes": _strikes(spot), "hasMiniOptions": False,
+        "quote": {"symbol": ticker, "regularMarketPrice": spot, "currency": "USD"},
+        "options": options,
+    }], "error": None}}
+
+
+class _TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # En-têtes et corps sont écrits séparément : sans TCP_NODELAY, l'algorithme de Nagle
+        # ajouterait ~40 ms par réponse en keep-alive et fausserait les mesures de latence
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args): # Silencieux (le serveur tient ses propres statistiques)
+        pass
+
+    def do_GET(self):
+        server = self.server.fake_yahoo
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        host = self.headers.get(ORIGINAL_HOST_HEADER, "")
+        endpoint, ticker = server.route(host, url.path)
+        server.count(endpoint)
+
+        delay = server.draw_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        injected = server.draw_failure(endpoint)
+        if injected == 429:
+            return self._send(429, "text/plain", b"Too Many Requests")
+        if injected == 500:
+            return self._send(500, "text/plain", b"Internal Server Error")
+
+        if endpoint == "cookie":
+            return self._send(200, "text/html", b"<html></html>",
+                              {"Set-Cookie": "A3=fake; Domain=.yahoo.com; Path=/; Max-Age=86400"})
+        if endpoint == "crumb":
+            return self._send(200, "text/plain", FAKE_CRUMB.encode())
+        if endpoint is None:
+            return self._send(404, "application/json", b'{"error": "not found"}')
+
+        payload = server.payload(endpoint, ticker, params)
+        self._send(200, "application/json", json.dumps(payload).encode())
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeYahooServer:
+    """
+    Serveur Yahoo Finance factice (thread d'arrière-plan sur 127.0.0.1).
+    """
+
+    def __init__(self, config=None, port=0):
+        self.config = config or FakeYahooConfig()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._bucket = _TokenBucket(self.config.max_requests_per_second) if self.config.max_requests_per_second else None
+        self._stats_lock = threading.Lock()
+        self.requests = {}
+        self.failures = {}
+        self._payload_cache = {}
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake_yahoo = self
+        self._thread = None
+        self._original_new_session = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def install(self, cache_dir=None):
+        """
+        Redirige yfinance vers ce serveur (session HTTP partagée par tout le processus,
+        y compris celle que yf.download crée à chaque appel).
+        Les caches disque de yfinance (fuseaux horaires, cookies) sont isolés dans `cache_dir`
+        (répertoire temporaire par défaut) pour ne pas polluer ceux des exécutions live.
+        """
+        import tempfile
+        import yfinance as yf
+        import yfinance.multi
+        from yfinance.data import YfData
+
+        yf.set_tz_cache_location(cache_dir or tempfile.mkdtemp(prefix="fake-yahoo-cache-"))
+        session = make_session(self.base_url)
+        if self._original_new_session is None:
+            self._original_new_session = yfinance.multi.new_session
+        yfinance.multi.new_session = lambda: session
+        data = YfData(session=session)
+        data._cookie, data._crumb = None, None
+        return session
+
+    def uninstall(self):
+        """
+        Rend à yfinance sa session d'origine (les caches disque restent isolés jusqu'à la fin du processus).
+        """
+        import yfinance.multi
+        from yfinance.data import YfData
+
+        if self._original_new_session is not None:
+            yfinance.multi.new_session = self._original_new_session
+            self._original_new_session = None
+        data = YfData(session=yfinance.multi.new_session())
+        data._cookie, data._crumb = None, None
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.requests, self.failures = {}, {}
+
+    def route(self, host, path):
+        parts = [part for part in path.split("/") if part]
+        if host.startswith("fc."):
+            return "cookie", None
+        if path.startswith("/v1/test/getcrumb"):
+            return "crumb", None
+        if len(parts) >= 4 and parts[:3] == ["v10", "finance", "quoteSummary"]:
+            return "quoteSummary", parts[3]
+        if parts[:3] == ["v7", "finance", "quote"]:
+            return "quote", None
+        if len(parts) >= 4 and parts[:3] == ["v8", "finance", "chart"]:
+            return "chart", parts[3]
+        if len(parts) >= 4 and parts[:3] == ["v7", "finance", "options"]:
+            return "options", parts[3]
+        if "fundamentals-timeseries" in parts: # Appelé par Ticker.info ; aucune donnée fondamentale servie
+            return "timeseries", parts[-1]
+        return None, None
+
+    def count(self, endpoint):
+        with self._stats_lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def draw_delay(self):
+        with self._random_lock:
+            jitter = self._random.gauss(0, self.config.jitter) if self.config.jitter else 0.0
+        return max(0.0, self.config.latency + jitter)
+
+    def draw_failure(self, endpoint):
+        if endpoint in ("cookie", "crumb", None):
+            return None
+        status = None
+        if self._bucket is not None and not self._bucket.take():
+            status = 429
+        else:
+            with self._random_lock:
+                draw = self._random.random()
+            if draw < self.config.rate_limit_rate:
+                status = 429
+            elif draw < self.config.rate_limit_rate + self.config.error_rate:
+                status = 500
+        if status is not None:
+            with self._stats_lock:
+                self.failures[status] = self.failures.get(status, 0) + 1
+        return status
+
+    def payload(self, endpoint, ticker, params):
+        recorded = self._recorded(endpoint, ticker, params)
+        if recorded is not None:
+            return recorded
+        if endpoint == "timeseries":
+            return {"timeseries": {"result": [], "error": None}}
+        if endpoint == "quote":
+            return quote_payload(params.get("symbols", "").split(","))
+        if endpoint == "chart":
+            return chart_payload(ticker, params)
+        key = (endpoint, ticker, params.get("date"))
+        if key not in self._payload_cache: # Les chaînes et profils sont coûteux à générer : une fois par clé
+            if endpoint == "quoteSummary":
+                self._payload_cache[key] = quote_summary_payload(ticker)
+            else:
+                self._payload_cache[key] = options_payload(ticker, params.get("date"))
+        return self._payload_cache[key]
+
+    def _recorded(self, endpoint, ticker, params):
+        if not self.config.recordings_dir or ticker is None:
+            return None
+        name = f"{ticker}_{params['date']}.json" if endpoint == "options" and "date" in params else f"{ticker}.json"
+        path = os.path.join(self.config.recordings_dir, endpoint, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def make_session(base_url):
+    """
+    Session `requests` dont toutes les requêtes HTTPS (hôtes Yahoo) sont envoyées à base_url.
+    L'hôte d'origine est transmis dans l'en-tête X-Yahoo-Host.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    class _RedirectAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            original = urlsplit(request.url)
+            redirected = request.copy()
+            redirected.url = f"{base_url}{original.path or '/'}{'?' + original.query if original.query else ''}"
+            redirected.headers[ORIGINAL_HOST_HEADER] = original.netloc
+            response = super().send(redirected, **kwargs)
+            response.url = request.url
+            return response
+
+    session = requests.Session()
+    adapter = _RedirectAdapter(pool_connections=16, pool_maxsize=64)
+    session.mount("https://", adapter)
+    session.mount("http://", HTTPAdapter(pool_maxsize=64))
+    return session
+
+
+# Pour tester ce module indépendamment (sans réseau)
+if __name__ == "__main__":
+    print("--- Test de fake_yahoo_server.py ---")
+    with FakeYahooServer(FakeYahooConfig(latency=0.01)) as fake_server:
+        fake_server.install()
+        from market_data_fetcher import calculate_historical_volatility, fetch_live_data, fetch_live_option_data
+
+        live_data = fetch_live_data(["LDOS", "BAH"])
+        expiry = datetime.fromtimestamp(_expiries()[1], timezone.utc).strftime("%Y-%m-%d")
+        strike = _strikes(live_data["LDOS"]["spot_price"])[20]
+        option_data = fetch_live_option_data(
+            [{"ticker": "LDOS", "strike": strike, "expiry": expiry, "type": "call"}],
+            {ticker: data["spot_price"] for ticker, data in live_data.items()}
+        )
+        print(option_data)
+        print(f"HV LDOS : {calculate_historical_volatility('LDOS'):.4f}")
+        print(f"Requêtes servies : {fake_server.requests}")
@@ -0,0 +1,116 @@
+# fetch_benchmark.py
+"""
+Benchmark de la couche réseau de market_data_fetcher contre le serveur Yahoo Finance
+factice (fake_yahoo_server) : temps de bout en bout de fetch_live_data,
+fetch_live_option_data et calculate_historical_volatility quand l'univers passe
+de 10 à 1 000 tickers, avec latence, gigue et erreurs injectées.
+"""
+import contextlib
+import os
+import time
+from datetime import datetime, timezone
+
+from fake_yahoo_server import FakeYahooConfig, FakeYahooServer, _expiries, _strikes, _ticker_profile
+
+DEFAULT_SIZES = (10, 100, 1000)
+
+
+def synthetic_universe(size):
+    """
+    Tickers synthétiques ('T0000', 'T0001', ...) servis par le serveur factice.
+    """
+    return [f"T{i:04d}" for i in range(size)]
+
+
+def _option_positions(tickers):
+    """
+    Un call à la monnaie sur la deuxième échéance pour chaque ticker.
+    """
+    expiry = datetime.fromtimestamp(_expiries()[1], timezone.utc).strftime("%Y-%m-%d")
+    positions = []
+    for ticker in tickers:
+        strikes = _strikes(_ticker_profile(ticker)["spot"])
+        positions.append({"ticker": ticker, "strike": strikes[len(strikes) // 2], "expiry": expiry, "type": "call"})
+    return positions
+
+
+def _timed(function, *args, quiet=True):
+    start = time.perf_counter()
+    if quiet: # Les fonctions du fetcher impriment une ligne par ticker
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = function(*args)
+    else:
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_fetch_benchmark(sizes=DEFAULT_SIZES, config=None, quiet=True):
+    """
+    Mesure le temps de récupération pour chaque taille d'univers.
+
+    Paramètres:
+    sizes (iterable): Nombres de tickers à tester.
+    config (FakeYahooConfig): Latence, gigue et erreurs injectées par le serveur.
+    quiet (bool): Masque les impressions du fetcher pendant les mesures.
+
+    Retourne:
+    list: Une ligne (dict) par (taille, fonction) : secondes, requêtes HTTP, échecs injectés
+          (429/500) et nombre de tickers ou contrats effectivement récupérés.
+    """
+    from market_data_fetcher import calculate_historical_volatility, fetch_live_data, fetch_live_option_data
+
+    def historical_volatilities(tickers):
+        return {ticker: calculate_historical_volatility(ticker) for ticker in tickers}
+
+    results = []
+    with FakeYahooServer(config or FakeYahooConfig()) as server:
+        server.install()
+        try:
+            for size in sizes:
+                tickers = synthetic_universe(size)
+                option_positions = _option_positions(tickers)
+                spot_prices = {ticker: _ticker_profile(ticker)["spot"] for ticker in tickers}
+
+                benchmarks = (
+                    ("fetch_live_data", fetch_live_data, (tickers,),
+                     lambda data: sum(ticker in data for ticker in tickers)),
+                    ("fetch_live_option_data", fetch_live_option_data, (option_positions, spot_prices),
+                     lambda data: sum(option["found"] for option in data.values())),
+                    ("calculate_historical_volatility", historical_volatilities, (tickers,),
+                     lambda data: sum(value == value for value in data.values())), # Hors NaN
+                )
+                for name, function, args, count_ok in benchmarks:
+                    server.reset_stats()
+                    result, elapsed = _timed(function, *args, quiet=quiet)
+                    results.append({
+                        "tickers": size,
+                        "function": name,
+                        "seconds": elapsed,
+                        "per_ticker_ms": elapsed / size * 1000,
+                        "requests": sum(server.requests.values()),
+                        "http_429": server.failures.get(429, 0),
+                        "http_500": server.failures.get(500, 0),
+                        "succeeded": count_ok(result),
+                    })
+        finally:
+            server.uninstall()
+    return results
+
+
+def format_results(results):
+    """
+    Tableau texte des résultats de run_fetch_benchmark.
+    """
+    header = f"{'Tickers':>8} {'Fonction':<32} {'Temps (s)':>10} {'ms/ticker':>10} {'Requêtes':>9} {'429':>5} {'500':>5} {'OK':>6}"
+    lines = [header, "-" * len(header)]
+    for row in results:
+        lines.append(f"{row['tickers']:>8} {row['function']:<32} {row['seconds']:>10.2f} {row['per_ticker_ms']:>10.1f} "
+                     f"{row['requests']:>9} {row['http_429']:>5} {row['http_500']:>5} {row['succeeded']:>6}")
+    return "\n".join(lines)
+
+
+# Pour tester ce module indépendamment (sans réseau)
+if __name__ == "__main__":
+    print("--- Benchmark de market_data_fetcher (serveur Yahoo factice) ---")
+    benchmark_config = FakeYahooConfig(latency=0.005, jitter=0.002, error_rate=0.01, rate_limit_rate=0.01, seed=1)
+    print(format_results(run_fetch_benchmark(sizes=(10, 100), config=benchmark_config)))
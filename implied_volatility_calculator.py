@@ -1,10 +1,10 @@
 # implied_volatility_calculator.py
 import numpy as np
-import pandas as pd
-import yfinance as yf
 from datetime import datetime
-from scipy.stats import norm
-from option_pricing import black_scholes_call 
+from option_pricing import black_scholes_call, black_scholes_call_vectorized
+from yield_curve import resolve_rate
+# pandas et le fournisseur de données ne sont importés que dans le bloc de test (__main__) :
+# le solveur d'IV doit rester léger à charger pour la CLI.
 
 # --- Implied Volatility Solver (Bisection Method - Dichotomie) ---
 def find_implied_volatility_bisection(market_price, S, K, T, r, q=0, tol=1e-6, max_iterations=200):
@@ -73,6 +73,50 @@ def find_implied_volatility_bisection(market_price, S, K, T, r, q=0, tol=1e-6, m
     return np.nan # Non convergent après max_iterations
 
 
+def find_implied_volatility_bisection_vectorized(market_prices, S, K, T, r, q=0, tol=1e-6, max_iterations=200):
+    """
+    Version vectorisée de find_implied_volatility_bisection : résout l'IV de plusieurs
+    calls européens simultanément (une bissection par élément, menée en parallèle).
+
+    Tous les paramètres peuvent être des tableaux (diffusés entre eux). `r` peut donc
+    contenir un taux sans risque par contrat (ex: YieldCurve.rate(T)).
+
+    Retourne:
+    np.ndarray: Volatilités implicites, np.nan là où le prix est hors bornes ou les paramètres invalides.
+    """
+    market_prices, S, K, T, r, q = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (market_prices, S, K, T, r, q))
+    )
+    low_sigma = np.full(market_prices.shape, 0.001)
+    high_sigma = np.full(market_prices.shape, 5.0)
+
+    valid = (T > 0) & (S > 0) & (K > 0) & np.isfinite(market_prices)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_at_low = black_scholes_call_vectorized(S, K, T, r, low_sigma, q)
+        price_at_high = black_scholes_call_vectorized(S, K, T, r, high_sigma, q)
+    valid &= (market_prices >= price_at_low) & (market_prices <= price_at_high)
+
+    result = np.full(market_prices.shape, np.nan)
+    active = valid.copy()
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        mid_sigma = (low_sigma + high_sigma) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            diff = black_scholes_call_vectorized(S, K, T, r, mid_sigma, q) - market_prices
+
+        converged = active & (np.abs(diff) < tol)
+        result[converged] = mid_sigma[converged]
+        active &= ~converged
+
+        too_low = active & (diff < 0) # Le prix du modèle est trop bas, augmenter sigma
+        too_high = active & (diff > 0) # Le prix du modèle est trop haut, diminuer sigma
+        low_sigma = np.where(too_low, mid_sigma, low_sigma)
+        high_sigma = np.where(too_high, mid_sigma, high_sigma)
+
+    return result
+
+
 # --- Main function to fetch option data and calculate IV ---
 # SIGNATURE DE LA FONCTION MODIFIÉE ICI
 def get_implied_volatility_for_option(ticker, strike, expiry, spot_price, risk_free_rate, dividend_yield, option_type="call", market_price=None):
@@ -84,7 +128,8 @@ def get_implied_volatility_for_option(ticker, strike, expiry, spot_price, risk_f
     strike (float): Prix d'exercice de l'option.
     expiry (str): Date d'expiration de l'option au format 'YYYY-MM-DD'. # NOM DE PARAMÈTRE MODIFIÉ
     spot_price (float): Prix spot actuel de l'actif sous-jacent.
-    risk_free_rate (float): Taux d'intérêt sans risque annuel.
+    risk_free_rate (float ou YieldCurve): Taux d'intérêt sans risque annuel, ou courbe des taux
+                                          (le taux est alors lu à la maturité de l'option).
     dividend_yield (float): Rendement des dividendes annuel de l'actif sous-jacent.
     option_type (str): 'call' ou 'put'. (Ajouté)
     market_price (float): Le prix de marché de l'option (prix mid). (Ajouté)
@@ -99,7 +144,7 @@ def get_implied_volatility_for_option(ticker, strike, expiry, spot_price, risk_f
         return np.nan
 
     # Utilisation du market_price passé en paramètre, PAS DE NOUVEL APPEL YFINANCE ICI
-    if market_price is None or pd.isna(market_price) or market_price <= 0:
+    if market_price is None or np.isnan(market_price) or market_price <= 0:
         print(f"Warning: Market price for {ticker} {strike} {expiry} is invalid or missing ({market_price}). Cannot calculate IV.")
         return np.nan
 
@@ -120,7 +165,7 @@ def get_implied_volatility_for_option(ticker, strike, expiry, spot_price, risk_f
             S=spot_price,
             K=strike,
             T=T,
-            r=risk_free_rate,
+            r=resolve_rate(risk_free_rate, T),
             q=dividend_yield
         )
         return implied_vol
@@ -133,6 +178,9 @@ def get_implied_volatility_for_option(ticker, strike, expiry, spot_price, risk_f
 
 # Pour tester ce module indépendamment
 if __name__ == "__main__":
+    import pandas as pd
+    from market_data_provider import get_provider
+
     print("--- Test du calculateur de Volatilité Implicite (Méthode Dichotomie) ---")
     
     test_ticker = "NVDA" # Un exemple plus courant pour les options
@@ -143,10 +191,10 @@ if __name__ == "__main__":
     test_S = None # Initialiser à None
 
     try:
-        yf_ticker = yf.Ticker(test_ticker)
+        provider = get_provider() # Yahoo Finance, ou un instantané rejoué (voir market_data_provider)
         
         # --- Tenter de récupérer le prix actuel via .info d'abord ---
-        ticker_info = yf_ticker.info
+        ticker_info = provider.info(test_ticker)
         if 'currentPrice' in ticker_info and pd.notna(ticker_info['currentPrice']):
             test_S = float(ticker_info['currentPrice'])
             print(f"Current spot price for {test_ticker} fetched from .info: {test_S:.2f}")
@@ -154,7 +202,7 @@ if __name__ == "__main__":
             print(f"currentPrice not found in .info or is invalid for {test_ticker}. Falling back to .download().")
             
             # --- Fallback vers .download() si .info a échoué ---
-            yf_data = yf.download(test_ticker, period="5d", progress=False, actions=False) 
+            yf_data = provider.history(test_ticker, period="5d", actions=False)
             
             if not yf_data.empty:
                 if 'Adj Close' in yf_data.columns:
@@ -183,7 +231,7 @@ if __name__ == "__main__":
         test_q = 0.00
 
         # --- CALCUL DU TEMPS JUSQU'À ÉCHÉANCE POUR LE TEST ---
-        today_for_test = datetime.now()
+        today_for_test = provider.as_of or datetime.now()
         expiry_dt_for_test = datetime.strptime(test_expiry, "%Y-%m-%d")
         days_to_expiry_for_test = (expiry_dt_for_test - today_for_test).days
         T_for_test = days_to_expiry_for_test / 365.0
@@ -0,0 +1,276 @@
+# iv_index.py
+"""
+Index IV rank / IV percentile : historique glissant d'un an des volatilités implicites,
+par contrat et à la monnaie (ATM) par sous-jacent, une observation par jour.
+
+Chaque série maintient ses observations triées au fil des ajouts (bisect) : l'IV rank
+((IV - min) / (max - min)) se lit en O(1) et l'IV percentile (part des jours où l'IV était
+plus basse) en O(log n), sans reparcourir l'historique brut à chaque exécution.
+L'index est persisté en JSON entre les exécutions.
+"""
+import bisect
+import json
+import math
+import os
+from collections import deque
+from datetime import date, datetime, timedelta
+
+DEFAULT_WINDOW_DAYS = 365
+ATM_TARGET_T = 30 / 365.0 # À moneyness égale, l'échéance la plus proche de 30 jours est retenue pour l'ATM
+ATM_MAX_LOG_MONEYNESS = 0.05 # Au-delà de |ln(K/S)|, un contrat détenu ne représente pas l'IV ATM
+
+
+class RollingOrderStatistics:
+    """
+    Observations datées sur une fenêtre glissante, maintenues triées pour les statistiques d'ordre.
+
+    Paramètres:
+    window_days (int): Profondeur de la fenêtre en jours calendaires.
+    """
+
+    def __init__(self, window_days=DEFAULT_WINDOW_DAYS):
+        self.window_days = window_days
+        self._chronological = deque() # (date, valeur) par date croissante
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._sorted)
+
+    @property
+    def last_date(self):
+        return self._chronological[-1][0] if self._chronological else None
+
+    @property
+    def latest(self):
+        return self._chronological[-1][1] if self._chronological else math.nan
+
+    def _remove(self, value):
+        del self._sorted[bisect.bisect_left(self._sorted, value)]
+
+    def add(self, day, value):
+        """
+        Ajoute l'observation du jour `day` (remplace celle du même jour) et retire celles sorties de la fenêtre.
+        Les observations antérieures à la dernière date sont ignorées.
+        """
+        if value is None or not math.isfinite(value) or (self.last_date is not None and day < self.last_date):
+            return
+        if self.last_date == day:
+            self._remove(self._chronological.pop()[1])
+        self._chronological.append((day, value))
+        bisect.insort(self._sorted, value)
+        cutoff = day - timedelta(days=self.window_days)
+        while self._chronological[0][0] <= cutoff:
+            self._remove(self._chronological.popleft()[1])
+
+    def rank(self, value=None):
+        """
+        IV rank en % : position de `value` (dernière observation par défaut) entre le min et le max de la fenêtre.
+        """
+        value = self.latest if value is None else value
+        if len(self._sorted) < 2 or self._sorted[-1] == self._sorted[0]:
+            return math.nan
+        return min(max((value - self._sorted[0]) / (self._sorted[-1] - self._sorted[0]), 0.0), 1.0) * 100
+
+    def percentile(self, value=None):
+        """
+        IV percentile en % : part des observations de la fenêtre strictement inférieures à `value`.
+        """
+        value = self.latest if value is None else value
+        if len(self._sorted) < 2:
+            return math.nan
+        return bisect.bisect_left(self._sorted, value) / len(self._sorted) * 100
+
+    def to_dict(self):
+        return [[day.isoformat(), value] for day, value in self._chronological]
+
+    @classmethod
+    def from_dict(cls, payload, window_days=DEFAULT_WINDOW_DAYS):
+        series = cls(window_days)
+        series._chronological = deque((date.fromisoformat(day), value) for day, value in payload)
+        series._sorted = sorted(value for _, value in series._chronological)
+        return series
+
+
+def atm_key(ticker):
+    return f"ATM:{ticker}"
+
+
+def contract_key(ticker, strike, expiry, option_type):
+    return f"{ticker}-{float(strike)}-{expiry}-{option_type}"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def atm_implied_volatilities(options_valuation_details):
+    """
+    IV à la monnaie de chaque sous-jacent : celle de la surface à K = S et T = 30 jours
+    ('atm_surface_volatility') si elle est disponible, sinon celle du contrat détenu le plus
+    proche du spot (|ln(K/S)| minimal, puis échéance la plus proche de 30 jours). Sans surface,
+    un sous-jacent dont aucun contrat n'est à moins de ATM_MAX_LOG_MONEYNESS du spot n'a pas
+    d'IV ATM (une option très en dehors de la monnaie fausserait la série).
+    """
+    surface_ivs, best = {}, {}
+    for option in options_valuation_details:
+        surface_iv = option.get("atm_surface_volatility")
+        if _is_number(surface_iv) and surface_iv > 0:
+            surface_ivs[option["ticker"]] = surface_iv
+            continue
+        iv, spot, T = option.get("implied_volatility"), option.get("spot_price"), option.get("time_to_expiry")
+        if not (_is_number(iv) and _is_number(spot) and spot > 0 and _is_number(T)):
+            continue
+        moneyness = abs(math.log(option["strike"] / spot))
+        if moneyness > ATM_MAX_LOG_MONEYNESS:
+            continue
+        distance = (moneyness, abs(T - ATM_TARGET_T))
+        if option["ticker"] not in best or distance < best[option["ticker"]][0]:
+            best[option["ticker"]] = (distance, iv)
+    atm_ivs = {ticker: iv for ticker, (_, iv) in best.items()}
+    atm_ivs.update(surface_ivs)
+    return atm_ivs
+
+
+class IVIndex:
+    """
+    Séries d'IV par contrat et ATM par sous-jacent, avec IV rank et percentile sur un an.
+
+    Paramètres:
+    path (str): Fichier JSON de persistance (chargé s'il existe), optionnel.
+    window_days (int): Profondeur de l'historique en jours calendaires.
+    """
+
+    def __init__(self, path=None, window_days=DEFAULT_WINDOW_DAYS):
+        self.path = path
+        self.window_days = window_days
+        self.series = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    payload = json.load(f)
+                self.series = {key: RollingOrderStatistics.from_dict(values, window_days)
+                               for key, values in payload.get("series", {}).items()}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Avertissement: Index IV illisible ({path}) : {e}. Nouvel index.")
+
+    def record(self, key, day, iv):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = RollingOrderStatistics(self.window_days)
+        series.add(day, iv)
+
+    def rank(self, key, iv=None):
+        series = self.series.get(key)
+        return series.rank(iv) if series is not None else math.nan
+
+    def percentile(self, key, iv=None):
+        series = self.series.get(key)
+        return series.percentile(iv) if series is not None else math.nan
+
+    def update_from_details(self, options_valuation_details, as_of=None):
+        """
+        Enregistre l'IV du jour de chaque contrat et l'IV ATM de chaque sous-jacent.
+        Par défaut, le jour est celui des données de marché (date de l'instantané en cas de rejeu).
+        """
+        if as_of is None:
+            from market_data_provider import get_provider
+
+            replay_as_of = get_provider().as_of
+            as_of = replay_as_of.date() if replay_as_of is not None else date.today()
+        day = as_of
+        for option in options_valuation_details:
+            if _is_number(option.get("implied_volatility")):
+                self.record(contract_key(option["ticker"], option["strike"], option["expiry"], option["type"]),
+                            day, option["implied_volatility"])
+        for ticker, iv in atm_implied_volatilities(options_valuation_details).items():
+            self.record(atm_key(ticker), day, iv)
+
+    def annotate(self, options_valuation_details):
+        """
+        Renseigne 'iv_rank', 'iv_percentile' (contrat) et 'atm_iv_rank', 'atm_iv_percentile'
+        (sous-jacent) sur chaque détail de valorisation.
+        """
+        for option in options_valuation_details:
+            key = contract_key(option["ticker"], option["strike"], option["expiry"], option["type"])
+            iv = option.get("implied_volatility")
+            iv = iv if _is_number(iv) else None
+            option["iv_rank"] = self.rank(key, iv) if iv is not None else math.nan
+            option["iv_percentile"] = self.percentile(key, iv) if iv is not None else math.nan
+            option["atm_iv_rank"] = self.rank(atm_key(option["ticker"]))
+            option["atm_iv_percentile"] = self.percentile(atm_key(option["ticker"]))
+
+    def backfill_from_history(self, run_history):
+        """
+        Amorce l'index depuis l'historique des exécutions (dernière IV de chaque jour, par contrat).
+        """
+        cutoff = int((datetime.now() - timedelta(days=self.window_days)).timestamp())
+        rows = run_history.connection.execute(
+            "SELECT c.ticker, c.strike, c.expiry, c.type, a.run_ts, a.implied_volatility, a.spot_price, a.time_to_expiry "
+            "FROM option_analytics a JOIN contracts c ON c.contract_id = a.contract_id "
+            "WHERE a.run_ts >= ? AND a.implied_volatility IS NOT NULL ORDER BY a.run_ts", (cutoff,)
+        )
+        by_day = {}
+        for ticker, strike, expiry, option_type, run_ts, iv, spot, T in rows:
+            day = datetime.fromtimestamp(run_ts).date()
+            self.record(contract_key(ticker, strike, expiry, option_type), day, iv)
+            by_day.setdefault(day, {})[(ticker, strike, expiry, option_type)] = {
+                "ticker": ticker, "strike": strike, "implied_volatility": iv, "spot_price": spot, "time_to_expiry": T}
+        for day, options in by_day.items():
+            for ticker, iv in atm_implied_volatilities(list(options.values())).items():
+                self.record(atm_key(ticker), day, iv)
+
+    def save(self, path=None):
+        """
+        Écrit l'index en JSON (les séries sans observation dans la fenêtre, ex. contrats expirés, sont retirées).
+        """
+        path = path or self.path
+        if not path:
+            return
+        cutoff = date.today() - timedelta(days=self.window_days)
+        self.series = {key: series for key, series in self.series.items()
+                       if series.last_date is not None and series.last_date > cutoff}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"window_days": self.window_days,
+                       "series": {key: series.to_dict() for key, series in self.series.items()}}, f)
+        os.replace(tmp_path, path)
+
+
+# Pour tester ce module indépendamment
+if __name__ == "__main__":
+    import random
+    import tempfile
+    import time
+
+    print("--- Test de iv_index.py ---")
+    rng = random.Random(0)
+    index = IVIndex(os.path.join(tempfile.mkdtemp(), "iv_index.json"))
+    start_day = date.today() - timedelta(days=500)
+    ivs = []
+    for offset in range(501): # Plus d'un an d'observations quotidiennes : les plus anciennes sortent de la fenêtre
+        iv = 0.30 + 0.1 * math.sin(offset / 40) + rng.gauss(0, 0.01)
+        ivs.append((start_day + timedelta(days=offset), iv))
+        index.record(atm_key("LDOS"), *ivs[-1])
+
+    in_window = [iv for day, iv in ivs if day > date.today() - timedelta(days=DEFAULT_WINDOW_DAYS)]
+    current = ivs[-1][1]
+    expected_rank = (current - min(in_window)) / (max(in_window) - min(in_window)) * 100
+    expected_percentile = sum(iv < current for iv in in_window) / len(in_window) * 100
+    print(f"IV ATM LDOS {current:.2%} : rank {index.rank(atm_key('LDOS')):.1f}% (attendu {expected_rank:.1f}%), "
+          f"percentile {index.percentile(atm_key('LDOS')):.1f}% (attendu {expected_percentile:.1f}%)")
+
+    start_time = time.perf_counter()
+    for _ in range(100_000):
+        index.percentile(atm_key("LDOS"), 0.3)
+    print(f"Requête percentile : {(time.perf_counter() - start_time) / 100_000 * 1e6:.2f} µs")
+
+    index.save()
+    reloaded = IVIndex(index.path)
+    assert reloaded.rank(atm_key("LDOS")) == index.rank(atm_key("LDOS"))
+    print(f"Index rechargé depuis {index.path} ({len(reloaded.series[atm_key('LDOS')])} observations)")
+
+    # IV ATM : un put très en dehors de la monnaie n'alimente pas la série, la surface prime sur les contrats
+    deep_otm_put = {"ticker": "KTOS", "strike": 60.0, "implied_volatility": 0.65, "spot_price": 100.0, "time_to_expiry": 0.1}
+    near_call = {"ticker": "LDOS", "strike": 102.0, "implied_volatility": 0.31, "spot_price": 100.0, "time_to_expiry": 0.1}
+    print("IV ATM sans surface :", atm_implied_volatilities([deep_otm_put, near_call]))
+    print("IV ATM avec surface :", atm_implied_volatilities([dict(near_call, atm_surface_volatility=0.28)]))
@@ -1,15 +1,12 @@
 # main_portfolio.py
 import io
 import sys
-import pandas as pd
 from datetime import datetime
 import os
 
-
-from market_data_fetcher import fetch_live_data, fetch_us_10y_treasury_yield, fetch_live_option_data # Ajout de fetch_live_option_data
-from portfolio_analyzer import analyze_portfolio
-from portfolio_reporter import get_portfolio_report_html 
-from email_reporter import send_email
+# Les modules lourds (yfinance, pandas, scipy, smtplib) sont importés à l'intérieur
+# des fonctions qui en ont besoin : importer main_portfolio (ex: depuis cli.py)
+# ne doit ni coûter le chargement complet ni quitter le processus.
 
 # --- Fonctions pour capturer/restaurer l'output ---
 def capture_output(func, *args, **kwargs):
@@ -33,77 +30,298 @@ positions = [
     {"ticker": "DFEN", "type": "etf", "qty": 1800, "purchase_price": "45.00"},
 ]
 
-# --- Configuration email (à configurer dans les variables d'environnement) ---
-SENDER_EMAIL = os.getenv("SENDER_EMAIL")
-SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
-RECEIVER_EMAIL = os.getenv("RECEIVER_EMAIL")
 
-if not SENDER_EMAIL or not SENDER_PASSWORD or not RECEIVER_EMAIL:
-    print("Erreur: Les variables d'environnement SENDER_EMAIL, SENDER_PASSWORD et RECEIVER_EMAIL doivent être configurées.")
-    print("Veuillez les définir avant d'exécuter le script.")
-    sys.exit(1) # Quitte le script si les variables ne sont pas configurées
+def get_email_config():
+    """
+    Lit la configuration email depuis les variables d'environnement.
 
-# --- Logique principale ---
-if __name__ == "__main__":
-    print(f"Démarrage de l'analyse de portefeuille Iron Dome à {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    Retourne:
+    tuple: (SENDER_EMAIL, SENDER_PASSWORD, RECEIVER_EMAIL), ou None si une variable manque.
+    """
+    sender_email = os.getenv("SENDER_EMAIL")
+    sender_password = os.getenv("SENDER_PASSWORD")
+    receiver_email = os.getenv("RECEIVER_EMAIL")
+
+    if not sender_email or not sender_password or not receiver_email:
+        print("Erreur: Les variables d'environnement SENDER_EMAIL, SENDER_PASSWORD et RECEIVER_EMAIL doivent être configurées.")
+        print("Veuillez les définir avant d'exécuter le script.")
+        return None
+    return sender_email, sender_password, receiver_email
+
+
+def fetch_market_inputs(tickers, option_positions_details, chain_store=None):
+    """
+    Récupère toutes les données de marché nécessaires à l'analyse.
 
-    # 1. Récupérer le taux d'intérêt sans risque
-    live_risk_free_rate = fetch_us_10y_treasury_yield()
+    Paramètres:
+    tickers (iterable): Tickers uniques des sous-jacents.
+    option_positions_details (list): Contrats d'options ('ticker', 'strike', 'expiry', 'type').
+
+    Retourne:
+    tuple: (courbe des taux sans risque, prix spot par ticker, rendements de dividende par ticker, données live des options),
+           ou None si le taux sans risque ne peut pas être récupéré.
+    """
+    from market_data_fetcher import fetch_live_data, fetch_live_option_data
+    from yield_curve import fetch_treasury_curve
+
+    # 1. Récupérer la courbe des taux sans risque (un seul téléchargement, en cache pour la journée)
+    live_risk_free_rate = fetch_treasury_curve()
     if live_risk_free_rate is None:
         print("Erreur critique: Impossible de récupérer le taux sans risque. Arrêt du script.")
-        sys.exit(1) # Quitte si le taux sans risque ne peut pas être récupéré
-
-    # 2. Préparer la liste des tickers uniques pour les sous-jacents et les options
-    unique_underlying_tickers = set()
-    option_positions_details = [] # Pour stocker les infos des options pour fetch_live_option_data
-
-    for pos in positions:
-        ticker = pos["ticker"]
-        unique_underlying_tickers.add(ticker)
-        if pos["type"] in ["call", "put"]:
-            # Créer une copie ou extraire les infos nécessaires pour fetch_live_option_data
-            option_positions_details.append({
-                "ticker": pos["ticker"],
-                "strike": float(pos["strike"]), # Assurer que le strike est un float
-                "expiry": pos["expiry"],
-                "type": pos["type"]
-            })
-    
-    # Convertir le set en liste pour les fonctions de fetching
-    list_of_all_tickers = list(unique_underlying_tickers)
-
-    # 3. Récupérer les prix spot live et rendements de dividende pour tous les sous-jacents
-    live_market_data = fetch_live_data(list_of_all_tickers)
-    
+        return None
+
+    # 2. Récupérer les prix spot live et rendements de dividende pour tous les sous-jacents
+    live_market_data = fetch_live_data(list(tickers))
+
     # Extraire les prix spot et rendements de dividende pour un accès facile
     live_prices_only = {ticker: data["spot_price"] for ticker, data in live_market_data.items()}
     dividend_yields_by_ticker = {ticker: data["dividend_yield"] for ticker, data in live_market_data.items()}
 
-    # 4. Récupérer les prix live pour les options
+    # 3. Récupérer les prix live pour les options
     # On passe les détails des options et les prix spot des sous-jacents
-    live_option_data = fetch_live_option_data(option_positions_details, live_prices_only)
-
-    # 5. Analyser le portefeuille
-    df_portfolio, portfolio_summary, options_valuation_details = analyze_portfolio( 
-        positions,
-        live_prices_only,
-        live_risk_free_rate, 
-        dividend_yields_by_ticker,
-        live_option_data 
-    )
+    live_option_data = fetch_live_option_data(option_positions_details, live_prices_only, chain_store=chain_store)
+
+    return live_risk_free_rate, live_prices_only, dividend_yields_by_ticker, live_option_data
+
+
+def build_vol_surfaces(tickers, live_prices, risk_free_rate, dividend_yields_by_ticker, chain_store=None):
+    """
+    Construit (ou lit depuis le cache du jour) la surface de volatilité de chaque sous-jacent.
+
+    Retourne:
+    dict: Surfaces par ticker (seuls les tickers dont la surface a pu être construite).
+    """
+    from vol_surface import get_vol_surface
+
+    vol_surfaces = {}
+    for ticker in tickers:
+        if ticker not in live_prices:
+            continue
+        surface = get_vol_surface(ticker, live_prices[ticker], risk_free_rate, dividend_yields_by_ticker.get(ticker, 0.0),
+                                  chain_store=chain_store)
+        if surface is not None:
+            vol_surfaces[ticker] = surface
+    return vol_surfaces
+
+
+def build_historical_volatilities(tickers, estimator, window=60):
+    """
+    Calcule la volatilité réalisée de chaque sous-jacent avec l'estimateur choisi, à partir
+    d'un seul téléchargement OHLC groupé (au lieu d'un téléchargement par ticker).
+
+    Retourne:
+    dict: Volatilité annualisée par ticker (NaN si l'historique est insuffisant).
+    """
+    from realized_volatility import DEFAULT_WINDOWS, RealizedVolatilityEngine
+
+    windows = DEFAULT_WINDOWS if window in DEFAULT_WINDOWS else DEFAULT_WINDOWS + (window,)
+    try:
+        engine = RealizedVolatilityEngine.from_yfinance(tickers, windows=windows)
+    except ValueError as e:
+        print(f"Avertissement: {e} Retour à la volatilité historique par ticker.")
+        return {}
+    return engine.latest(estimator, window).to_dict()
+
+
+def run_analysis(positions, with_vol_surfaces=False, hv_estimator=None, hv_window=60, chain_store=None, run_history=None,
+                 iv_index=None, risk_engine=None, pricing_budget=None, pricing_tolerance=None, risk_model=None):
+    """
+    Orchestre la récupération des données de marché et l'analyse du portefeuille
+    (graphe d'étapes concurrentes, voir pipeline.build_analysis_pipeline).
+
+    Paramètres:
+    positions (list): Liste des dictionnaires de positions.
+    with_vol_surfaces (bool): Construit la surface de volatilité de chaque sous-jacent d'option
+                              (chaîne complète) et l'ajoute aux détails de valorisation.
+    hv_estimator (str): Estimateur de volatilité réalisée (voir realized_volatility.ESTIMATORS).
+                        Par défaut : HV close-to-close sur 60 jours, téléchargée par ticker.
+    hv_window (int): Fenêtre de l'estimateur en séances.
+    chain_store (OptionChainStore): Archive les chaînes d'options téléchargées (optionnel).
+    run_history (RunHistory): Enregistre les valorisations de l'exécution dans l'historique (optionnel).
+    iv_index (IVIndex): Ajoute les IV du jour à l'index et renseigne IV rank et percentile (optionnel).
+    risk_engine (RiskEngine): Évalue les limites de risque et notifie les alertes qui changent d'état (optionnel).
+    pricing_budget (float): Secondes accordées, à partir de l'appel, au calcul des prix théoriques (optionnel).
+    pricing_tolerance (float): Erreur cible (€) sur la valeur théorique des options (optionnel). Avec l'un ou
+                               l'autre, les prix sont raffinés progressivement (progressive_pricing).
+    risk_model (EWMACovariance): Mis à jour avec les dernières clôtures ; ajoute la volatilité du portefeuille
+                                 au résumé (optionnel, voir portfolio_risk).
+
+    Retourne:
+    tuple: (DataFrame trié par valeur de marché, résumé, détails de valorisation des options),
+           ou None si le taux sans risque ne peut pas être récupéré.
+    """
+    import time
+
+    from pipeline import build_analysis_pipeline
+
+    pricing_deadline = time.perf_counter() + pricing_budget if pricing_budget is not None else None
+    # 1. Récupération des données de marché et valorisation, par sous-jacent : les étapes sans
+    # dépendance entre elles (taux, spots, cotations, HV, surfaces) s'exécutent en parallèle
+    pipeline_run = build_analysis_pipeline(positions, with_vol_surfaces=with_vol_surfaces, hv_estimator=hv_estimator,
+                                           hv_window=hv_window, chain_store=chain_store, pricing_deadline=pricing_deadline,
+                                           pricing_tolerance=pricing_tolerance).run()
+    print(pipeline_run.summary())
+    if "rate" in pipeline_run.failed:
+        print("Erreur critique: Impossible de récupérer le taux sans risque. Arrêt du script.")
+        return None
+    if "merge" not in pipeline_run.results:
+        print("Erreur critique: L'analyse du portefeuille n'a pas pu être menée à terme.")
+        return None
+
+    # 2. Résultat de l'analyse, tous sous-jacents confondus
+    df_portfolio, portfolio_summary, options_valuation_details = pipeline_run.results["merge"]
     df_portfolio_sorted = df_portfolio.sort_values(by="Valeur Marché (€)", ascending=False)
+    if iv_index is not None:
+        iv_index.update_from_details(options_valuation_details)
+        iv_index.annotate(options_valuation_details)
+        iv_index.save()
+    if risk_engine is not None:
+        risk_engine.evaluate(df_portfolio_sorted, options_valuation_details)
+        risk_engine.save_state()
+    if risk_model is not None:
+        try:
+            risk_model.refresh(df_portfolio_sorted["Ticker"].unique())
+            risk_model.save()
+            portfolio_risk = risk_model.portfolio_risk(df_portfolio_sorted, options_valuation_details)
+            total_value = portfolio_summary["Valeur totale portefeuille "]
+            portfolio_summary["Volatilité annuelle portefeuille "] = portfolio_risk["volatility"]
+            portfolio_summary["Volatilité annuelle (% valeur) "] = \
+                f"{portfolio_risk['volatility'] / total_value * 100 if total_value > 0 else 0:.2f}%"
+        except Exception as e:
+            print(f"Avertissement: Volatilité du portefeuille non calculée : {e}")
+    if run_history is not None:
+        run_id = run_history.record_run(df_portfolio_sorted, portfolio_summary, options_valuation_details)
+        print(f"Exécution {run_id} enregistrée dans l'historique {run_history.path}.")
+    return df_portfolio_sorted, portfolio_summary, options_valuation_details
+
+
+def run_streaming_analysis(positions_path, chunk_size=10_000, on_chunk=None):
+    """
+    Analyse un portefeuille stocké dans un fichier (CSV, JSON Lines ou Parquet) en flux :
+    un premier passage extrait l'univers (tickers et contrats), les données de marché
+    sont récupérées une seule fois, puis les positions sont analysées lot par lot.
+
+    Retourne:
+    dict: Résumé global du portefeuille, ou None si les données de marché sont indisponibles.
+    """
+    from position_loader import scan_universe, analyze_portfolio_in_chunks
+
+    loader = scan_universe(positions_path, chunk_size=chunk_size)
+    print(f"{loader.position_count} positions lues ({len(loader.tickers)} tickers, "
+          f"{len(loader.option_contracts)} contrats d'options, {loader.invalid_records} invalides).")
+
+    market_inputs = fetch_market_inputs(loader.tickers, loader.option_positions_details())
+    if market_inputs is None:
+        return None
+    live_risk_free_rate, live_prices_only, dividend_yields_by_ticker, live_option_data = market_inputs
+
+    return analyze_portfolio_in_chunks(loader, live_prices_only, live_risk_free_rate,
+                                       dividend_yields_by_ticker, live_option_data, on_chunk=on_chunk)
 
-    # 6. Générer le rapport en HTML 
-    html_report_output = get_portfolio_report_html(df_portfolio_sorted, portfolio_summary, options_valuation_details) 
 
-    # 7. Envoyer l'email avec le rapport HTML
+def build_report(positions, with_vol_surfaces=False, hv_estimator=None, hv_window=60, chain_store=None, run_history=None,
+                 iv_index=None, risk_engine=None, pricing_budget=None, pricing_tolerance=None, risk_model=None):
+    """
+    Analyse le portefeuille et génère le rapport HTML (avec les stratégies multi-jambes,
+    l'explication du P&L depuis l'exécution précédente si un historique est fourni, et les
+    alertes de risque actives si un moteur de règles est fourni).
+
+    Retourne:
+    str: Le rapport HTML, ou None si l'analyse a échoué.
+    """
+    from portfolio_reporter import get_portfolio_report_html
+
+    result = run_analysis(positions, with_vol_surfaces=with_vol_surfaces, hv_estimator=hv_estimator, hv_window=hv_window,
+                          chain_store=chain_store, run_history=run_history, iv_index=iv_index, risk_engine=risk_engine,
+                          pricing_budget=pricing_budget, pricing_tolerance=pricing_tolerance, risk_model=risk_model)
+    if result is None:
+        return None
+    df_portfolio_sorted, portfolio_summary, options_valuation_details = result
+
+    pnl_explain = None
+    if run_history is not None: # Explication du P&L depuis l'exécution précédente de l'historique
+        from pnl_explain import explain_runs
+        pnl_explain = explain_runs(run_history)
+    risk_alerts = risk_engine.active_alerts() if risk_engine is not None else None
+    from strategies import analyze_strategies
+    strategies = analyze_strategies(positions, options_valuation_details)
+    portfolio_risk = None
+    if risk_model is not None and "Volatilité annuelle portefeuille " in portfolio_summary:
+        portfolio_risk = risk_model.portfolio_risk(df_portfolio_sorted, options_valuation_details)
+    return get_portfolio_report_html(df_portfolio_sorted, portfolio_summary, options_valuation_details,
+                                     pnl_explain=pnl_explain, risk_alerts=risk_alerts, strategies=strategies,
+                                     portfolio_risk=portfolio_risk)
+
+
+def send_report(html_report_output, email_config):
+    """
+    Envoie le rapport HTML par email.
+
+    Paramètres:
+    html_report_output (str): Le rapport HTML.
+    email_config (tuple): (SENDER_EMAIL, SENDER_PASSWORD, RECEIVER_EMAIL).
+
+    Retourne:
+    bool: True si l'email a été envoyé.
+    """
+    from email_reporter import send_email
+
+    sender_email, sender_password, receiver_email = email_config
     subject = f"Iron Dome - Rapport de Portefeuille US - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
 
-    email_sent_successfully = send_email(subject, html_report_output, RECEIVER_EMAIL, SENDER_EMAIL, SENDER_PASSWORD, is_html=True) # is_html=True est crucial
+    email_sent_successfully = send_email(subject, html_report_output, receiver_email, sender_email, sender_password, is_html=True) # is_html=True est crucial
 
     if email_sent_successfully:
         print("Analyse de portefeuille Iron Dome terminée.")
-        print(f"Rapport envoyé avec succès à {RECEIVER_EMAIL}.")
+        print(f"Rapport envoyé avec succès à {receiver_email}.")
     else:
         print("\n--- ATTENTION : ÉCHEC DE L'ENVOI D'EMAIL ---")
         print("Le rapport n'a pas pu être envoyé par e-mail. Veuillez vérifier la configuration et les logs d'erreurs.")
+    return email_sent_successfully
+
+
+def main(positions=positions):
+    """
+    Exécution complète : analyse, rapport HTML et envoi par email.
+    Retourne le code de sortie du processus.
+    """
+    # --- Configuration email (à configurer dans les variables d'environnement) ---
+    email_config = get_email_config()
+    if email_config is None:
+        return 1 # Quitte le script si les variables ne sont pas configurées
+
+    print(f"Démarrage de l'analyse de portefeuille Iron Dome à {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # Historique des exécutions (optionnel) : IRON_DOME_HISTORY_DB=chemin/vers/historique.db
+    run_history = None
+    history_path = os.getenv("IRON_DOME_HISTORY_DB")
+    if history_path:
+        from run_history import RunHistory
+        run_history = RunHistory(history_path)
+
+    # Index IV rank / percentile (optionnel) : IRON_DOME_IV_INDEX=chemin/vers/iv_index.json
+    iv_index = None
+    iv_index_path = os.getenv("IRON_DOME_IV_INDEX")
+    if iv_index_path:
+        from iv_index import IVIndex
+        iv_index = IVIndex(iv_index_path)
+
+    # Limites de risque (optionnel) : IRON_DOME_RISK_RULES=regles.json (ou "default"),
+    # IRON_DOME_RISK_STATE=etat.json pour ne notifier que les changements d'une exécution à l'autre
+    risk_engine = None
+    risk_rules_path = os.getenv("IRON_DOME_RISK_RULES")
+    if risk_rules_path:
+        from risk_rules import RiskEngine, load_rules
+        rules = None if risk_rules_path == "default" else load_rules(risk_rules_path)
+        risk_engine = RiskEngine(rules, state_path=os.getenv("IRON_DOME_RISK_STATE"))
+
+    html_report_output = build_report(positions, run_history=run_history, iv_index=iv_index, risk_engine=risk_engine)
+    if html_report_output is None:
+        return 1 # Quitte si le taux sans risque ne peut pas être récupéré
+
+    return 0 if send_report(html_report_output, email_config) else 1
+
+
+# --- Logique principale ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 # market_data_fetcher.py
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+from market_data_provider import get_provider
+
 def fetch_us_10y_treasury_yield():
     """
     Récupère le rendement actuel du bon du Trésor américain à 10 ans.
@@ -16,7 +17,7 @@ def fetch_us_10y_treasury_yield():
         end_date = datetime.now()
         start_date = end_date - timedelta(days=5) # Quelques jours d'historique
         
-        data = yf.download(ticker_symbol, start=start_date, end=end_date, auto_adjust=True)
+        data = get_provider().history(ticker_symbol, start=start_date, end=end_date, auto_adjust=True)
         
         if not data.empty:
             latest_yield_value = float(data['Close'].iloc[-1].item())
@@ -30,6 +31,68 @@ def fetch_us_10y_treasury_yield():
         return None
 
 
+def fetch_ticker_live_data(ticker):
+    """
+    Récupère le prix spot actuel et le rendement de dividende d'un ticker.
+
+    Retourne:
+    dict: {'spot_price', 'dividend_yield'}, ou None si aucun prix spot valide n'a pu être récupéré.
+    """
+    try:
+        provider = get_provider()
+        ticker_info = provider.info(ticker)
+
+        # --- Récupérer le prix spot ---
+        spot_price = None
+        if 'currentPrice' in ticker_info and pd.notna(ticker_info['currentPrice']):
+            spot_price = float(ticker_info['currentPrice'])
+        elif 'regularMarketPrice' in ticker_info and pd.notna(ticker_info['regularMarketPrice']):
+            spot_price = float(ticker_info['regularMarketPrice'])
+        else:
+            data_download = provider.history(ticker, period="5d", actions=False)
+            if not data_download.empty:
+                # Prioriser 'Adj Close' si disponible, sinon 'Close'
+                if 'Adj Close' in data_download.columns:
+                    temp_spot = data_download['Adj Close'].iloc[-1]
+                elif 'Close' in data_download.columns:
+                    temp_spot = data_download['Close'].iloc[-1]
+                else:
+                    temp_spot = np.nan # Assigner NaN si aucune colonne de prix n'est trouvée
+
+                if pd.notna(temp_spot):
+                    spot_price = float(temp_spot)
+                else:
+                    print(f"Warning: Could not find valid spot price in .download() for {ticker}.")
+            else:
+                print(f"Warning: No data downloaded for {ticker} for period '5d'.")
+
+        # --- Récupérer le rendement de dividende ---
+        
+        dividend_yield = ticker_info.get('dividendYield') # Commence par le plus direct
+        if dividend_yield is None or pd.isna(dividend_yield):
+            dividend_yield = ticker_info.get('trailingAnnualDividendYield') # Fallback pour les dividendes passés
+
+        if dividend_yield is None or pd.isna(dividend_yield):
+            dividend_yield = 0.00 # Votre valeur par défaut si aucune info n'est trouvée
+
+        if dividend_yield > 0.1:
+            dividend_yield /= 100.0
+
+        # Assurez-vous que le prix spot est valide avant de le retourner
+        if spot_price is not None and pd.notna(spot_price) and spot_price > 0:
+            print(f"  {ticker}: Spot={spot_price:.2f}, Dividend Yield={dividend_yield:.4f}")
+            return {
+                "spot_price": spot_price,
+                "dividend_yield": dividend_yield
+            }
+        print(f"Warning: Failed to retrieve a valid positive spot price for {ticker}.")
+
+    except Exception as e:
+        print(f"Error fetching data for {ticker}: {e}")
+        print(f"  Skipping {ticker} due to error. It will use a placeholder/default if available.")
+    return None
+
+
 def fetch_live_data(tickers_list):
     """
     Récupère les prix spot actuels et les rendements de dividende pour une liste de tickers.
@@ -46,59 +109,9 @@ def fetch_live_data(tickers_list):
     print(f"Fetching live data for: {', '.join(tickers_list)} from Yahoo Finance...")
 
     for ticker in tickers_list:
-        try:
-            yf_ticker = yf.Ticker(ticker)
-            ticker_info = yf_ticker.info
-
-            # --- Récupérer le prix spot ---
-            spot_price = None
-            if 'currentPrice' in ticker_info and pd.notna(ticker_info['currentPrice']):
-                spot_price = float(ticker_info['currentPrice'])
-            elif 'regularMarketPrice' in ticker_info and pd.notna(ticker_info['regularMarketPrice']):
-                spot_price = float(ticker_info['regularMarketPrice'])
-            else:
-                data_download = yf.download(ticker, period="5d", progress=False, actions=False)
-                if not data_download.empty:
-                    # Prioriser 'Adj Close' si disponible, sinon 'Close'
-                    if 'Adj Close' in data_download.columns:
-                        temp_spot = data_download['Adj Close'].iloc[-1]
-                    elif 'Close' in data_download.columns:
-                        temp_spot = data_download['Close'].iloc[-1]
-                    else:
-                        temp_spot = np.nan # Assigner NaN si aucune colonne de prix n'est trouvée
-
-                    if pd.notna(temp_spot):
-                        spot_price = float(temp_spot)
-                    else:
-                        print(f"Warning: Could not find valid spot price in .download() for {ticker}.")
-                else:
-                    print(f"Warning: No data downloaded for {ticker} for period '5d'.")
-
-            # --- Récupérer le rendement de dividende ---
-            
-            dividend_yield = ticker_info.get('dividendYield') # Commence par le plus direct
-            if dividend_yield is None or pd.isna(dividend_yield):
-                dividend_yield = ticker_info.get('trailingAnnualDividendYield') # Fallback pour les dividendes passés
-
-            if dividend_yield is None or pd.isna(dividend_yield):
-                dividend_yield = 0.00 # Votre valeur par défaut si aucune info n'est trouvée
-
-            if dividend_yield > 0.1:
-                dividend_yield /= 100.0
-
-            # Assurez-vous que le prix spot est valide avant d'ajouter à live_data
-            if spot_price is not None and pd.notna(spot_price) and spot_price > 0:
-                live_data[ticker] = {
-                    "spot_price": spot_price,
-                    "dividend_yield": dividend_yield
-                }
-                print(f"  {ticker}: Spot={spot_price:.2f}, Dividend Yield={dividend_yield:.4f}")
-            else:
-                print(f"Warning: Failed to retrieve a valid positive spot price for {ticker}.")
-
-        except Exception as e:
-            print(f"Error fetching data for {ticker}: {e}")
-            print(f"  Skipping {ticker} due to error. It will use a placeholder/default if available.")
+        ticker_data = fetch_ticker_live_data(ticker)
+        if ticker_data is not None:
+            live_data[ticker] = ticker_data
 
     if not live_data:
         print("Error: No live data was successfully retrieved for any ticker.")
@@ -114,7 +127,7 @@ def fetch_live_data(tickers_list):
     return live_data
 
 
-def fetch_live_option_data(option_positions, spot_prices_by_ticker):
+def fetch_live_option_data(option_positions, spot_prices_by_ticker, chain_store=None):
     """
     Récupère les prix live (bid/ask/mid) pour une liste de positions d'options spécifiques.
     Prend en entrée les positions d'options et les prix spot déjà récupérés.
@@ -123,6 +136,7 @@ def fetch_live_option_data(option_positions, spot_prices_by_ticker):
     option_positions (list): Liste des dictionnaires de positions d'options
                              (doit contenir 'ticker', 'strike', 'expiry', 'type').
     spot_prices_by_ticker (dict): Dictionnaire des prix spot actuels des sous-jacents.
+    chain_store (OptionChainStore): Si fourni, chaque chaîne téléchargée y est archivée en entier (optionnel).
 
     Retourne:
     dict: Un dictionnaire où les clés sont un identifiant unique de l'option
@@ -132,23 +146,33 @@ def fetch_live_option_data(option_positions, spot_prices_by_ticker):
     live_option_data = {}
     print("\nFetching live option data from Yahoo Finance...")
 
+    # Caches locaux : une seule liste d'échéances par ticker et une seule chaîne
+    # par (ticker, échéance), même si plusieurs positions portent sur le même sous-jacent
+    provider = get_provider()
+    available_expiries_by_ticker = {}
+    option_chains = {}
+
     for pos in option_positions:
         ticker = pos["ticker"]
         strike = pos["strike"]
         expiry_date_str = pos["expiry"] # Format 'YYYY-MM-DD'
+        if not isinstance(expiry_date_str, str): # date/datetime (ex: positions normalisées par position_loader)
+            expiry_date_str = expiry_date_str.strftime("%Y-%m-%d")
         option_type = pos["type"] # 'call' ou 'put'
 
+        if f"{ticker}-{strike}-{expiry_date_str}-{option_type}" in live_option_data:
+            continue # Contrat déjà récupéré
+
         # Vérifier que nous avons le prix spot du sous-jacent, nécessaire pour la cohérence
         if ticker not in spot_prices_by_ticker:
             print(f"Option Data Error: Spot price for {ticker} not found in fetched underlying data. Skipping option {ticker} {strike} {expiry_date_str}.")
             continue
 
         try:
-            yf_ticker = yf.Ticker(ticker)
-            
             # --- Vérifier si la date d'expiration est disponible ---
-            # available_expiries est correctement défini ici
-            available_expiries = yf_ticker.options
+            if ticker not in available_expiries_by_ticker:
+                available_expiries_by_ticker[ticker] = provider.option_expiries(ticker)
+            available_expiries = available_expiries_by_ticker[ticker]
             
             if expiry_date_str not in available_expiries:
                 print(f"Option Data Warning: Expiry date {expiry_date_str} not found in available options for {ticker}. Skipping this option.")
@@ -157,7 +181,13 @@ def fetch_live_option_data(option_positions, spot_prices_by_ticker):
                 }
                 continue # Passer à l'option suivante
 
-            option_chain = yf_ticker.option_chain(expiry_date_str)
+            if (ticker, expiry_date_str) not in option_chains:
+                option_chains[(ticker, expiry_date_str)] = provider.option_chain(ticker, expiry_date_str)
+                if chain_store is not None:
+                    from chain_store import chain_frame
+                    downloaded_chain = option_chains[(ticker, expiry_date_str)]
+                    chain_store.archive(ticker, chain_frame(downloaded_chain.calls, downloaded_chain.puts), expiry=expiry_date_str)
+            option_chain = option_chains[(ticker, expiry_date_str)]
             
             # Sélectionner le bon type d'option (calls ou puts)
             if option_type == 'call':
@@ -230,7 +260,7 @@ def calculate_historical_volatility(ticker, period="60d"):
     """
     try:
         # Télécharger les données historiques
-        data = yf.download(ticker, period=period, progress=False, auto_adjust=True)
+        data = get_provider().history(ticker, period=period, auto_adjust=True)
 
         if data.empty:
             print(f"Avertissement: Aucune donnée historique trouvée pour {ticker} sur la période {period}. Impossible de calculer la volatilité historique.")
@@ -0,0 +1,322 @@
+# market_data_provider.py
+"""
+Interface des fournisseurs de données de marché : toutes les requêtes au fournisseur
+(infos spot et dividendes, historiques de cours, échéances et chaînes d'options, taux via
+l'historique des indices du Trésor) passent par le fournisseur courant (get_provider).
+
+Trois implémentations :
+    YFinanceProvider   Yahoo Finance (par défaut).
+    RecordingProvider  Délègue à un autre fournisseur et capture chaque réponse dans un
+                       instantané local compact (archive zip : index JSON + DataFrames Parquet zstd).
+    ReplayProvider     Sert un instantané sans aucune requête réseau ; la date de valorisation
+                       (as_of) est celle de l'enregistrement, ce qui rend les analyses reproductibles.
+"""
+import abc
+import contextlib
+import io
+import json
+import threading
+import zipfile
+from collections import namedtuple
+from datetime import date, datetime
+
+INFO_FIELDS = ("currentPrice", "regularMarketPrice", "dividendYield", "trailingAnnualDividendYield")
+SNAPSHOT_VERSION = 1
+
+OptionChain = namedtuple("OptionChain", ["calls", "puts"]) # Même forme que Ticker.option_chain de yfinance
+
+
+class MarketDataProvider(abc.ABC):
+    """
+    Interface commune. Les réponses ont la forme de celles de yfinance, pour que les appelants
+    (market_data_fetcher, yield_curve, vol_surface, realized_volatility) gardent leur logique.
+    Un fournisseur incomplet échoue dès son instanciation (méthodes abstraites).
+    """
+    as_of = None # Date de valorisation imposée (datetime), None = maintenant
+
+    @abc.abstractmethod
+    def info(self, ticker):
+        """Champs INFO_FIELDS disponibles du ticker (dict)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def history(self, tickers, **options):
+        """Historique de cours, mêmes paramètres et même DataFrame que yf.download (period, start, end, ...)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def option_expiries(self, ticker):
+        """Échéances d'options cotées ('YYYY-MM-DD')."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def option_chain(self, ticker, expiry):
+        """Chaîne d'une échéance (OptionChain : DataFrames calls et puts)."""
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Fournisseur Yahoo Finance. Pour les options, un objet Ticker par symbole et par jour est
+    conservé : la liste des échéances n'est téléchargée qu'une fois avant les chaînes. Les infos
+    (spot, dividendes) sont toujours redemandées, yfinance les gardant en cache sur l'objet.
+    """
+
+    def __init__(self):
+        self._option_tickers = {}
+
+    def _option_ticker(self, ticker):
+        import yfinance as yf
+
+        key = (ticker, date.today())
+        if key not in self._option_tickers:
+            self._option_tickers[key] = yf.Ticker(ticker)
+        return self._option_tickers[key]
+
+    def info(self, ticker):
+        import yfinance as yf
+
+        ticker_info = yf.Ticker(ticker).info
+        return {field: ticker_info[field] for field in INFO_FIELDS if ticker_info.get(field) is not None}
+
+    def history(self, tickers, **options):
+        import yfinance as yf
+
+        return yf.download(tickers, progress=False, **options)
+
+    def option_expiries(self, ticker):
+        return tuple(self._option_ticker(ticker).options)
+
+    def option_chain(self, ticker, expiry):
+        chain = self._option_ticker(ticker).option_chain(expiry)
+        return OptionChain(chain.calls, chain.puts)
+
+
+def _request_key(method, *args, **options):
+    """
+    Clé canonique d'une requête. Les bornes start/end d'un historique sont exprimées en jours
+    relatifs à aujourd'hui : un instantané enregistré un autre jour répond aux mêmes requêtes.
+    """
+    today = date.today()
+    canonical = {}
+    for name, value in sorted(options.items()):
+        if name in ("start", "end") and value is not None:
+            value = value.date() if isinstance(value, datetime) else value
+            value = f"{(value - today).days:+d}d"
+        canonical[name] = value
+    return json.dumps([method, list(args), canonical], default=str, separators=(",", ":"))
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow # noqa: F401
+    except ImportError as e:
+        raise ImportError("Les instantanés de données de marché nécessitent pyarrow (pip install pyarrow).") from e
+
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Capture chaque réponse d'un autre fournisseur (les requêtes en échec ne sont pas enregistrées).
+
+    Paramètres:
+    inner (MarketDataProvider): Fournisseur interrogé (YFinanceProvider par défaut).
+    path (str): Fichier de l'instantané écrit par save().
+    """
+
+    def __init__(self, inner=None, path=None):
+        self.inner = inner or YFinanceProvider()
+        self.path = path
+        self.recorded_at = datetime.now()
+        self.responses = {}
+        self._lock = threading.Lock() # Étapes du pipeline exécutées en parallèle
+
+    def _record(self, key, value):
+        with self._lock:
+            self.responses[key] = value
+        return value
+
+    def info(self, ticker):
+        return self._record(_request_key("info", ticker), self.inner.info(ticker))
+
+    def history(self, tickers, **options):
+        return self._record(_request_key("history", tickers, **options), self.inner.history(tickers, **options))
+
+    def option_expiries(self, ticker):
+        return self._record(_request_key("option_expiries", ticker), tuple(self.inner.option_expiries(ticker)))
+
+    def option_chain(self, ticker, expiry):
+        return self._record(_request_key("option_chain", ticker, expiry), self.inner.option_chain(ticker, expiry))
+
+    def save(self, path=None):
+        """
+        Écrit l'instantané : index.json (réponses simples et références) et un fichier Parquet par DataFrame.
+
+        Retourne:
+        int: Nombre de réponses enregistrées.
+        """
+        import pandas as pd
+
+        _require_pyarrow()
+        path = path or self.path
+        with self._lock:
+            responses = dict(self.responses)
+
+        def write_frame(archive, frame):
+            name = f"frames/{len(frames)}.parquet"
+            buffer = io.BytesIO()
+            frame.to_parquet(buffer, compression="zstd")
+            archive.writestr(name, buffer.getvalue(), compress_type=zipfile.ZIP_STORED) # Déjà compressé
+            frames.append(name)
+            return name
+
+        frames, index = [], {}
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for key, value in responses.items():
+                if isinstance(value, OptionChain):
+                    index[key] = {"chain": [write_frame(archive, value.calls), write_frame(archive, value.puts)]}
+                elif isinstance(value, pd.DataFrame):
+                    index[key] = {"frame": write_frame(archive, value)}
+                else:
+                    index[key] = {"value": list(value) if isinstance(value, tuple) else value}
+            archive.writestr("index.json", json.dumps({"version": SNAPSHOT_VERSION,
+                                                       "recorded_at": self.recorded_at.isoformat(timespec="seconds"),
+                                                       "responses": index}))
+        return len(index)
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Sert les réponses d'un instantané, sans réseau. Une requête absente de l'instantané lève KeyError
+    (traitée par les appelants comme une erreur du fournisseur).
+
+    Paramètres:
+    path (str): Fichier écrit par RecordingProvider.save.
+    """
+
+    def __init__(self, path):
+        import pandas as pd
+
+        _require_pyarrow()
+        self.path = path
+        self.responses = {}
+        with zipfile.ZipFile(path) as archive:
+            payload = json.loads(archive.read("index.json"))
+            if payload.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Version d'instantané non prise en charge ({path}) : {payload.get('version')}")
+
+            def read_frame(name):
+                return pd.read_parquet(io.BytesIO(archive.read(name)))
+
+            for key, entry in payload["responses"].items():
+                if "chain" in entry:
+                    self.responses[key] = OptionChain(*(read_frame(name) for name in entry["chain"]))
+                elif "frame" in entry:
+                    self.responses[key] = read_frame(entry["frame"])
+                else:
+                    self.responses[key] = entry["value"]
+        self.as_of = datetime.fromisoformat(payload["recorded_at"])
+
+    def _replay(self, key):
+        try:
+            value = self.responses[key]
+        except KeyError:
+            raise KeyError(f"Requête absente de l'instantané {self.path} : {key}") from None
+        return value.copy() if hasattr(value, "copy") else value # Les appelants peuvent modifier les DataFrames
+
+    def info(self, ticker):
+        return self._replay(_request_key("info", ticker))
+
+    def history(self, tickers, **options):
+        return self._replay(_request_key("history", tickers, **options))
+
+    def option_expiries(self, ticker):
+        return tuple(self._replay(_request_key("option_expiries", ticker)))
+
+    def option_chain(self, ticker, expiry):
+        chain = self._replay(_request_key("option_chain", ticker, expiry))
+        return OptionChain(chain.calls.copy(), chain.puts.copy())
+
+
+_provider = None
+
+
+def get_provider():
+    """
+    Fournisseur courant (YFinanceProvider tant qu'aucun autre n'a été installé).
+    """
+    global _provider
+    if _provider is None:
+        _provider = YFinanceProvider()
+    return _provider
+
+
+def set_provider(provider):
+    """
+    Installe le fournisseur utilisé par tout le processus et retourne le précédent.
+    """
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+@contextlib.contextmanager
+def use_provider(provider):
+    """
+    Installe `provider` le temps d'un bloc `with`. Les caches du jour (courbe des taux,
+    surfaces de volatilité) sont vidés à l'entrée et à la sortie pour ne pas mélanger les sources.
+    """
+    import vol_surface
+    import yield_curve
+
+    previous = set_provider(provider)
+    yield_curve._CURVE_CACHE.clear()
+    vol_surface._SURFACE_CACHE.clear()
+    try:
+        yield provider
+    finally:
+        set_provider(previous)
+        yield_curve._CURVE_CACHE.clear()
+        vol_surface._SURFACE_CACHE.clear()
+
+
+# Pour tester ce module indépendamment : enregistrement contre le serveur Yahoo factice,
+# puis rejeu hors ligne de la même analyse
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    from fake_yahoo_server import FakeYahooConfig, FakeYahooServer
+    from fetch_benchmark import _option_positions, synthetic_universe
+    from main_portfolio import run_analysis
+    # Le fournisseur courant est celui du module importé par market_data_fetcher, pas celui de __main__
+    from market_data_provider import RecordingProvider, ReplayProvider, YFinanceProvider, use_provider
+
+    print("--- Test de market_data_provider.py ---")
+    test_positions = [{**option, "qty": 10, "purchase_premium": "2.0"}
+                      for option in _option_positions(synthetic_universe(20))]
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "market_data.zip")
+
+    def analysis():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start_time = time.perf_counter()
+            df, summary, _ = run_analysis(test_positions, hv_estimator="close_to_close")
+            return df.sort_index(), summary, time.perf_counter() - start_time
+
+    with FakeYahooServer(FakeYahooConfig(latency=0.02)) as server:
+        server.install()
+        try:
+            recorder = RecordingProvider(YFinanceProvider(), snapshot_path)
+            with use_provider(recorder):
+                recorded_df, recorded_summary, recorded_seconds = analysis()
+            count = recorder.save()
+        finally:
+            server.uninstall()
+        live_requests = sum(server.requests.values())
+    print(f"Enregistrement : {count} réponses ({live_requests} requêtes HTTP), "
+          f"{os.path.getsize(snapshot_path) / 1024:.0f} Ko, analyse en {recorded_seconds:.2f}s")
+
+    with use_provider(ReplayProvider(snapshot_path)): # Serveur arrêté : aucune requête possible
+        replayed_df, replayed_summary, replayed_seconds = analysis()
+    identical = replayed_df.equals(recorded_df) and replayed_summary == recorded_summary
+    print(f"Rejeu hors ligne : analyse en {replayed_seconds:.2f}s, résultats identiques : {identical}")
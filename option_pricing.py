@@ -1,6 +1,22 @@
 # option_pricing.py
+import math
 import numpy as np
-from scipy.stats import norm
+
+
+def _norm_cdf(x):
+    """
+    Fonction de répartition de la loi normale centrée réduite.
+    Utilise math.erfc pour éviter d'importer scipy sur les chemins de pricing purs.
+    """
+    return 0.5 * math.erfc(-x / math.sqrt(2.0))
+
+
+def _norm_cdf_array(x):
+    """
+    Version vectorisée de _norm_cdf (scipy n'est importé que pour les calculs en lot).
+    """
+    from scipy.special import ndtr
+    return ndtr(x)
 
 
 def black_scholes_call(S, K, T, r, sigma, q=0):
@@ -25,11 +41,84 @@ def black_scholes_call(S, K, T, r, sigma, q=0):
     d1 = (np.log(S / K) + (r - q + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
 
-    call_price = S * np.exp(-q * T) * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    call_price = S * np.exp(-q * T) * _norm_cdf(d1) - K * np.exp(-r * T) * _norm_cdf(d2)
     return call_price
 
 
 
+def black_scholes_call_vectorized(S, K, T, r, sigma, q=0):
+    """
+    Version vectorisée de black_scholes_call : tous les paramètres peuvent être des
+    tableaux numpy (diffusés entre eux), ce qui permet notamment de passer un taux
+    sans risque par contrat (ex: issu de YieldCurve.rate).
+
+    Retourne:
+    np.ndarray: Prix des calls européens.
+    """
+    S, K, T, r, sigma, q = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)))
+    T_pos = np.where(T > 0, T, 1.0)
+    sigma_pos = np.where(sigma >= 1e-6, sigma, 1.0)
+
+    sqrt_T = np.sqrt(T_pos)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma_pos**2) * T_pos) / (sigma_pos * sqrt_T)
+    d2 = d1 - sigma_pos * sqrt_T
+    discounted_S = S * np.exp(-q * T_pos)
+    discounted_K = K * np.exp(-r * T_pos)
+    price = discounted_S * _norm_cdf_array(d1) - discounted_K * _norm_cdf_array(d2)
+
+    # Mêmes cas limites que la version scalaire
+    price = np.where(sigma < 1e-6, np.maximum(0, discounted_S - discounted_K), price)
+    return np.where(T <= 0, np.maximum(0, S - K), price)
+
+
+def black_scholes_greeks_vectorized(S, K, T, r, sigma, q=0, option_type="call"):
+    """
+    Sensibilités Black-Scholes (européennes, avec dividende continu) calculées en lot.
+
+    Paramètres:
+    S, K, T, r, sigma, q : Comme black_scholes_call_vectorized (tableaux diffusés entre eux).
+    option_type : "call", "put", ou tableau de types (un par contrat).
+
+    Retourne:
+    dict: Tableaux 'delta', 'gamma', 'vega' (par unité de volatilité), 'theta' (dV/dt par an,
+          négatif pour une option longue en général) et 'rho' (par unité de taux).
+          À l'échéance (T <= 0), seul le delta intrinsèque est non nul.
+    """
+    S, K, T, r, sigma, q = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)))
+    is_call = np.broadcast_to(np.asarray(option_type) == "call", S.shape)
+    expired = T <= 0
+    T_pos = np.where(expired, 1.0, T)
+    sigma_pos = np.where(sigma >= 1e-6, sigma, 1e-6)
+
+    sqrt_T = np.sqrt(T_pos)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma_pos**2) * T_pos) / (sigma_pos * sqrt_T)
+    d2 = d1 - sigma_pos * sqrt_T
+    dividend_discount = np.exp(-q * T_pos)
+    rate_discount = np.exp(-r * T_pos)
+    pdf_d1 = np.exp(-0.5 * d1**2) / math.sqrt(2.0 * math.pi)
+    cdf_d1 = _norm_cdf_array(d1)
+    cdf_d2 = _norm_cdf_array(d2)
+
+    delta = np.where(is_call, dividend_discount * cdf_d1, dividend_discount * (cdf_d1 - 1.0))
+    gamma = dividend_discount * pdf_d1 / (S * sigma_pos * sqrt_T)
+    vega = S * dividend_discount * pdf_d1 * sqrt_T
+    decay = -S * dividend_discount * pdf_d1 * sigma_pos / (2.0 * sqrt_T)
+    theta = np.where(is_call,
+                     decay - r * K * rate_discount * cdf_d2 + q * S * dividend_discount * cdf_d1,
+                     decay + r * K * rate_discount * (1.0 - cdf_d2) - q * S * dividend_discount * (1.0 - cdf_d1))
+    rho = np.where(is_call, K * T_pos * rate_discount * cdf_d2, -K * T_pos * rate_discount * (1.0 - cdf_d2))
+
+    intrinsic_delta = np.where(is_call, (S > K).astype(float), -(S < K).astype(float))
+    zero = np.zeros_like(S)
+    return {
+        "delta": np.where(expired, intrinsic_delta, delta),
+        "gamma": np.where(expired, zero, gamma),
+        "vega": np.where(expired, zero, vega),
+        "theta": np.where(expired, zero, theta),
+        "rho": np.where(expired, zero, rho),
+    }
+
+
 def binomial_tree_american_call(S, K, T, r, sigma, q, N):
     """
     Calcule le prix d'une option call américaine en utilisant le modèle d'arbre binomial.
@@ -84,6 +173,305 @@ def binomial_tree_american_call(S, K, T, r, sigma, q, N):
 
 
 
+def binomial_tree_american_shared(S, K, T, r, sigma, q, N, option_type="call"):
+    """
+    Arbre binomial américain (CRR) commun à plusieurs options d'un même sous-jacent et d'une même
+    échéance (jambes d'une stratégie, strikes d'une chaîne) : un seul treillis de prix du sous-jacent,
+    et une remontée qui traite toutes les jambes ensemble, avec le test d'exercice anticipé propre
+    à chaque jambe (call ou put).
+
+    Paramètres:
+    S, T, r, sigma, q (float): Paramètres communs (spot, échéance, taux, volatilité, dividendes).
+    K (array-like): Strike de chaque jambe.
+    N (int): Nombre de pas de l'arbre.
+    option_type (str ou array-like): 'call' ou 'put' (ou un type par jambe).
+
+    Retourne:
+    np.ndarray: Prix de chaque jambe (np.nan si la probabilité neutre au risque sort de [0, 1]).
+    """
+    K = np.atleast_1d(np.asarray(K, dtype=float))
+    sign = np.where(np.broadcast_to(np.asarray(option_type), K.shape) == "call", 1.0, -1.0)
+    if T <= 0:
+        return np.maximum(0, sign * (S - K))
+
+    dt = T / N
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1 / u
+    p = (np.exp((r - q) * dt) - d) / (u - d)
+    if not (0 <= p <= 1):
+        print(f"Warning: Probability p={p:.4f} is out of [0,1] range. Check input parameters or increase N.")
+        return np.full(K.shape, np.nan)
+    discount = np.exp(-r * dt)
+
+    # Treillis partagé : nœuds à l'échéance S * u^(N - 2j), une ligne de valeurs par jambe
+    sign_col = sign[:, None]
+    K_col = K[:, None]
+    nodes = S * u ** (N - 2.0 * np.arange(N + 1))
+    values = np.maximum(0, sign_col * (nodes - K_col))
+    for i in range(N - 1, -1, -1):
+        nodes = nodes[:i + 1] / u
+        continuation = discount * (p * values[:, :i + 1] + (1 - p) * values[:, 1:i + 2])
+        values = np.maximum(continuation, sign_col * (nodes - K_col)) # Exercice anticipé, jambe par jambe
+    return values[:, 0]
+
+
+def binomial_tree_european_vectorized(S, K, T, r, sigma, q, N, option_type="call"):
+    """
+    Prix européen sur le même arbre CRR que binomial_tree_american_vectorized, calculé directement
+    comme espérance actualisée à l'échéance (somme binomiale en O(N) par option, sans remontée).
+    Sert de variable de contrôle : américain(N) - européen(N) + Black-Scholes.
+
+    Retourne:
+    np.ndarray: Prix des options (np.nan si la probabilité neutre au risque sort de [0, 1]).
+    """
+    S, K, T, r, sigma, q, option_type = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)), np.asarray(option_type)
+    )
+    sign = np.where(option_type == "call", 1.0, -1.0)[..., None]
+    expired = T <= 0
+    dt = np.where(expired, 1.0, T) / N
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1 / u
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = (np.exp((r - q) * dt) - d) / (u - d)
+        invalid = ~((p > 0) & (p < 1))
+        p = np.where(invalid, 0.5, p)[..., None]
+
+    # Poids binomiaux en log (C(N, j) p^(N-j) (1-p)^j) : stables même pour N grand
+    j = np.arange(N + 1)
+    log_binomial = np.concatenate(([0.0], np.cumsum(np.log(N - j[1:] + 1.0) - np.log(j[1:]))))
+    weights = np.exp(log_binomial + (N - j) * np.log(p) + j * np.log1p(-p))
+    nodes = S[..., None] * u[..., None] ** (N - 2.0 * j)
+    prices = np.exp(-r * np.where(expired, 0.0, T)) * np.sum(weights * np.maximum(0, sign * (nodes - K[..., None])), axis=-1)
+    intrinsic = np.maximum(0, sign[..., 0] * (S - K))
+    return np.where(expired, intrinsic, np.where(invalid, np.nan, prices))
+
+
+def binomial_tree_american_vectorized(S, K, T, r, sigma, q, N, option_type="call", batch_size=4096):
+    """
+    Version vectorisée de l'arbre binomial américain (CRR) : valorise un lot d'options
+    en une seule remontée, chaque option ayant ses propres paramètres.
+
+    Paramètres:
+    S, K, T, r, sigma, q: Scalaires ou tableaux numpy (diffusés entre eux).
+    N (int): Nombre de pas de l'arbre (commun à tout le lot).
+    option_type (str ou tableau): 'call' ou 'put' (ou tableau de types par option).
+    batch_size (int): Nombre d'options traitées simultanément (borne la mémoire à batch_size x (N+1)).
+
+    Retourne:
+    np.ndarray: Prix des options (np.nan si la probabilité neutre au risque sort de [0, 1]).
+    """
+    S, K, T, r, sigma, q, option_type = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q)), np.asarray(option_type)
+    )
+    shape = S.shape
+    S, K, T, r, sigma, q = (x.ravel() for x in (S, K, T, r, sigma, q))
+    is_call = (option_type.ravel() == "call")
+    prices = np.empty(S.size)
+
+    for start in range(0, S.size, batch_size):
+        sl = slice(start, start + batch_size)
+        prices[sl] = _binomial_batch(S[sl], K[sl], T[sl], r[sl], sigma[sl], q[sl], is_call[sl], N)
+    return prices.reshape(shape)
+
+
+def _binomial_batch(S, K, T, r, sigma, q, is_call, N):
+    """
+    Remontée binomiale pour un lot d'options (tableaux 1D de même taille).
+    """
+    expired = T <= 0
+    T_pos = np.where(expired, 1.0, T)
+    dt = T_pos / N
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1 / u
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = (np.exp((r - q) * dt) - d) / (u - d)
+    invalid = ~((p >= 0) & (p <= 1))
+    discount = np.exp(-r * dt)[:, None]
+    p_col = p[:, None]
+    sign = np.where(is_call, 1.0, -1.0)[:, None]
+    K_col = K[:, None]
+
+    # Nœuds à l'échéance : S * u^(N - 2j) ; on redescend d'un pas en divisant par u
+    j = np.arange(N + 1)
+    nodes = S[:, None] * u[:, None] ** (N - 2.0 * j)
+    values = np.maximum(0, sign * (nodes - K_col))
+    u_col = u[:, None]
+    for i in range(N - 1, -1, -1):
+        nodes = nodes[:, :i + 1] / u_col
+        continuation = discount * (p_col * values[:, :i + 1] + (1 - p_col) * values[:, 1:i + 2])
+        exercise = np.maximum(0, sign * (nodes - K_col)) # Valeur d'exercice anticipé
+        values = np.maximum(continuation, exercise)
+
+    prices = values[:, 0]
+    intrinsic = np.maximum(0, np.where(is_call, S - K, K - S))
+    prices = np.where(invalid, np.nan, prices)
+    return np.where(expired, intrinsic, prices)
+
+
+class FiniteDifferenceGrid:
+    """
+    Solution de l'EDP américaine sur une grille en log-spot normalisé par le strike.
+
+    La valeur d'une option est homogène de degré 1 en (S, K) : V(S, K) = K * v(ln(S/K)).
+    Une seule résolution (pour une échéance, une volatilité, r et q donnés) fournit donc
+    la valeur pour tous les spots de la grille ET pour tous les strikes, par simple
+    interpolation. Delta, gamma, theta et chocs de spot sont quasi gratuits.
+    """
+
+    def __init__(self, x, values, previous_values, dt, option_type):
+        self.x = x
+        self.values = values
+        self.previous_values = previous_values
+        self.dt = dt
+        self.option_type = option_type
+        h = x[1] - x[0]
+        # Dérivées en x sur la grille (différences centrées)
+        self._v_x = np.gradient(values, h)
+        self._v_xx = np.gradient(self._v_x, h)
+
+    def _interp(self, grid_values, S, K):
+        x = np.log(np.asarray(S, dtype=float) / np.asarray(K, dtype=float))
+        return np.interp(x, self.x, grid_values)
+
+    def _scalar(self, result):
+        return float(result) if np.ndim(result) == 0 else result
+
+    def price(self, S, K):
+        """
+        Prix de l'option pour un ou plusieurs spots / strikes (tableaux diffusés entre eux).
+        """
+        return self._scalar(np.asarray(K, dtype=float) * self._interp(self.values, S, K))
+
+    def delta(self, S, K):
+        """
+        Delta dV/dS = v'(x) * K / S.
+        """
+        S = np.asarray(S, dtype=float)
+        return self._scalar(np.asarray(K, dtype=float) / S * self._interp(self._v_x, S, K))
+
+    def gamma(self, S, K):
+        """
+        Gamma d2V/dS2 = (v''(x) - v'(x)) * K / S^2.
+        """
+        S = np.asarray(S, dtype=float)
+        return self._scalar(np.asarray(K, dtype=float) / S**2 * self._interp(self._v_xx - self._v_x, S, K))
+
+    def theta(self, S, K):
+        """
+        Theta dV/dt (par an) : variation de valeur quand l'échéance se rapproche d'un pas de temps.
+        """
+        change = self._interp(self.values - self.previous_values, S, K) / self.dt
+        return self._scalar(-np.asarray(K, dtype=float) * change)
+
+
+def crank_nicolson_american(T, r, sigma, q, option_type="call", n_space=400, n_time=200, x_max=None,
+                            rannacher_steps=2, penalty=1e8, max_penalty_iterations=20):
+    """
+    Résout l'EDP de Black-Scholes d'une option américaine (call ou put) par différences finies
+    de Crank-Nicolson, sur une grille en x = ln(S/K) (forme normalisée par le strike).
+
+    L'exercice anticipé est traité par la méthode de pénalité : à chaque pas de temps, le
+    système tridiagonal est résolu itérativement en pénalisant les nœuds où la valeur passe
+    sous la valeur d'exercice, jusqu'à stabilisation de la zone d'exercice. Les premiers pas
+    sont totalement implicites (lissage de Rannacher) pour éviter les oscillations dues au
+    point anguleux du payoff, ce qui garde des Greeks propres.
+
+    Paramètres:
+    T (float): Temps jusqu'à l'échéance en années.
+    r (float): Taux d'intérêt sans risque annuel.
+    sigma (float): Volatilité annuelle.
+    q (float): Rendement des dividendes annuel.
+    option_type (str): 'call' ou 'put'.
+    n_space (int): Nombre d'intervalles de la grille en x.
+    n_time (int): Nombre de pas de temps.
+    x_max (float): Demi-largeur de la grille en log-moneyness (par défaut max(6 * sigma * sqrt(T), 1.5)).
+    rannacher_steps (int): Nombre de pas implicites initiaux.
+    penalty (float): Paramètre de pénalité (grand devant 1 / tolérance de prix).
+    max_penalty_iterations (int): Nombre maximal d'itérations de pénalité par pas de temps.
+
+    Retourne:
+    FiniteDifferenceGrid: Solution réutilisable pour tous les spots et strikes de cette échéance.
+    """
+    from scipy.linalg import solve_banded
+
+    if T <= 0:
+        raise ValueError("crank_nicolson_american nécessite T > 0 (utiliser la valeur intrinsèque à l'échéance).")
+    if option_type not in ("call", "put"):
+        raise ValueError(f"Type d'option inconnu '{option_type}'.")
+
+    if x_max is None:
+        x_max = max(6 * sigma * np.sqrt(T), 1.5)
+    x = np.linspace(-x_max, x_max, n_space + 1)
+    h = x[1] - x[0]
+    dt = T / n_time
+    is_call = option_type == "call"
+    exercise = np.maximum(np.exp(x) - 1, 0) if is_call else np.maximum(1 - np.exp(x), 0)
+
+    # Opérateur A v = a v[j-1] + b v[j] + c v[j+1] (nœuds intérieurs)
+    drift = r - q - 0.5 * sigma**2
+    a = 0.5 * sigma**2 / h**2 - drift / (2 * h)
+    b = -sigma**2 / h**2 - r
+    c = 0.5 * sigma**2 / h**2 + drift / (2 * h)
+
+    def boundaries(tau):
+        # Valeurs aux bords : option sans valeur d'un côté, exercée (ou forward actualisé) de l'autre
+        if is_call:
+            return 0.0, max(np.exp(x[-1]) - 1, np.exp(x[-1] - q * tau) - np.exp(-r * tau))
+        return max(1 - np.exp(x[0]), np.exp(-r * tau) - np.exp(x[0] - q * tau)), 0.0
+
+    interior_exercise = exercise[1:-1]
+    n_interior = n_space - 1
+    values = exercise.copy()
+    previous_values = values
+
+    for step in range(n_time):
+        theta = 1.0 if step < rannacher_steps else 0.5
+        tau_next = (step + 1) * dt
+        lower_next, upper_next = boundaries(tau_next)
+
+        v = values
+        explicit = (1 - theta) * dt
+        rhs = v[1:-1] + explicit * (a * v[:-2] + b * v[1:-1] + c * v[2:])
+        rhs[0] += theta * dt * a * lower_next
+        rhs[-1] += theta * dt * c * upper_next
+
+        banded = np.zeros((3, n_interior))
+        banded[0, 1:] = -theta * dt * c
+        banded[1, :] = 1 - theta * dt * b
+        banded[2, :-1] = -theta * dt * a
+
+        # Itérations de pénalité : impose v >= valeur d'exercice
+        interior = np.maximum(v[1:-1], interior_exercise)
+        active = interior <= interior_exercise
+        for _ in range(max_penalty_iterations):
+            penalized = banded.copy()
+            penalized[1] += penalty * active
+            interior = solve_banded((1, 1), penalized, rhs + penalty * active * interior_exercise)
+            new_active = interior < interior_exercise
+            if np.array_equal(new_active, active):
+                break
+            active = new_active
+
+        previous_values = values
+        values = np.concatenate(([lower_next], interior, [upper_next]))
+
+    return FiniteDifferenceGrid(x, values, previous_values, dt, option_type)
+
+
+def crank_nicolson_american_price(S, K, T, r, sigma, q, option_type="call", n_space=400, n_time=200):
+    """
+    Prix d'une ou plusieurs options américaines de même échéance par Crank-Nicolson.
+    S et K peuvent être des tableaux : une seule résolution de l'EDP sert tous les strikes.
+    """
+    if T <= 0:
+        intrinsic = np.asarray(S, dtype=float) - np.asarray(K, dtype=float)
+        result = np.maximum(0, intrinsic if option_type == "call" else -intrinsic)
+        return float(result) if np.ndim(result) == 0 else result
+    grid = crank_nicolson_american(T, r, sigma, q, option_type=option_type, n_space=n_space, n_time=n_time)
+    return grid.price(S, K)
+
+
 # Un bloc 'if __name__ == "__main__":' est utile pour tester le module indépendamment
 if __name__ == "__main__":
     print("Test de la fonction Black-Scholes :")
@@ -125,3 +513,15 @@ if __name__ == "__main__":
         print(f"Prix Arbre Binomial (Call Américain, dividende élevé) : {price_bt_div:.4f}")
     else:
         print("Échec du calcul du prix par arbre binomial (dividende élevé).")
+
+    # Crank-Nicolson : une seule résolution de l'EDP pour plusieurs strikes et chocs de spot
+    print("\nTest Crank-Nicolson (Put Américain, grille réutilisée pour plusieurs strikes) :")
+    strikes_cn = np.array([90.0, 100.0, 110.0])
+    grid_cn = crank_nicolson_american(0.5, 0.05, 0.30, 0.0, option_type="put")
+    prices_cn = grid_cn.price(100, strikes_cn)
+    prices_tree = binomial_tree_american_vectorized(100, strikes_cn, 0.5, 0.05, 0.30, 0.0, 1000, "put")
+    for strike_cn, price_cn, price_tree in zip(strikes_cn, prices_cn, prices_tree):
+        print(f"K={strike_cn:.0f} : Crank-Nicolson={price_cn:.4f}, Arbre (1000 pas)={price_tree:.4f}, "
+              f"Delta={grid_cn.delta(100, strike_cn):.4f}, Gamma={grid_cn.gamma(100, strike_cn):.4f}")
+    spot_shocks = 100 * (1 + np.array([-0.10, -0.05, 0.05, 0.10]))
+    print(f"Chocs de spot (K=100) : {np.round(grid_cn.price(spot_shocks, 100.0), 4)}")
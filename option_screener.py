@@ -0,0 +1,254 @@
+# option_screener.py
+"""
+Screener de sur/sous-évaluation sur les chaînes d'options complètes d'un univers de tickers
+(et non plus seulement les contrats détenus).
+
+1. Les chaînes complètes et les spots sont récupérés en parallèle (threads : l'attente réseau domine).
+2. La volatilité historique de tout l'univers vient d'un seul téléchargement OHLC groupé.
+3. Les contrats passant les filtres de liquidité (fourchette bid/ask, open interest, volume)
+   sont valorisés en lots : prix théorique américain (arbre binomial vectorisé, HV) et IV,
+   répartis sur tous les cœurs (processus) quand la machine en a plusieurs.
+4. Les contrats sont classés par écart (marché - théorique) en pourcentage.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+
+DEFAULT_FETCH_WORKERS = 16
+DEFAULT_TREE_STEPS = 200 # Moins que les 500 pas de l'analyse : des dizaines de milliers de contrats
+DEFAULT_HV_WINDOW = 60
+DEFAULT_VOLATILITY = 0.20 # Comme portfolio_analyzer quand la HV est indisponible
+MIN_THEORETICAL_PRICE = 0.05 # En dessous, l'écart en pourcentage n'est pas significatif
+CHUNKS_PER_WORKER = 4
+
+
+def _fetch_ticker(ticker, chain_store):
+    """
+    Spot, dividende et chaîne complète d'un ticker (exécuté dans un thread).
+    """
+    from market_data_fetcher import fetch_live_data
+    from vol_surface import fetch_full_option_chain
+
+    try:
+        live = fetch_live_data([ticker]).get(ticker)
+        if live is None:
+            return ticker, None, None
+        chain = fetch_full_option_chain(ticker)
+        if chain_store is not None:
+            chain_store.archive(ticker, chain)
+        return ticker, live, chain
+    except Exception as e:
+        print(f"Erreur lors de la récupération de la chaîne de {ticker}: {e}")
+        return ticker, None, None
+
+
+def fetch_universe(tickers, max_workers=DEFAULT_FETCH_WORKERS, chain_store=None):
+    """
+    Récupère en parallèle les spots, dividendes et chaînes complètes d'un univers.
+
+    Retourne:
+    tuple: (données live par ticker {'spot_price', 'dividend_yield'}, chaîne concaténée
+            avec une colonne 'ticker').
+    """
+    import pandas as pd
+
+    live_data, chains = {}, []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for ticker, live, chain in executor.map(lambda t: _fetch_ticker(t, chain_store), tickers):
+            if live is None or chain is None or chain.empty:
+                print(f"Avertissement: Chaîne d'options indisponible pour {ticker}, ticker ignoré.")
+                continue
+            live_data[ticker] = live
+            chains.append(chain.assign(ticker=ticker))
+    return live_data, (pd.concat(chains, ignore_index=True) if chains else pd.DataFrame())
+
+
+def apply_liquidity_filters(chain, max_spread_pct=0.10, min_open_interest=100, min_volume=0, as_of=None):
+    """
+    Ajoute 'mid', 'spread_pct' et 'T' à la chaîne et ne garde que les contrats liquides.
+
+    Paramètres:
+    max_spread_pct (float): Fourchette (ask - bid) / mid maximale.
+    min_open_interest (int): Open interest minimal.
+    min_volume (int): Volume du jour minimal.
+    """
+    as_of = as_of or date.today()
+    bid = chain["bid"].to_numpy(dtype=float)
+    ask = chain["ask"].to_numpy(dtype=float)
+    mid = (bid + ask) / 2
+    expiry_days = {expiry: (datetime.strptime(expiry, "%Y-%m-%d").date() - as_of).days for expiry in chain["expiry"].unique()}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chain = chain.assign(mid=mid, spread_pct=(ask - bid) / mid, T=chain["expiry"].map(expiry_days) / 365.0)
+    keep = ((bid > 0) & (ask >= bid) & (chain["spread_pct"] <= max_spread_pct) & (chain["T"] > 0)
+            & (chain["openInterest"].fillna(0) >= min_open_interest) & (chain["volume"].fillna(0) >= min_volume))
+    return chain[keep].reset_index(drop=True)
+
+
+def _price_chunk(payload):
+    """
+    Prix théoriques et IV d'un lot de contrats (exécuté dans un processus de calcul).
+    """
+    from implied_volatility_calculator import find_implied_volatility_bisection_vectorized
+    from option_pricing import binomial_tree_american_vectorized
+
+    S, K, T, r, sigma, q, is_call, mid, tree_steps = payload
+    theoretical = binomial_tree_american_vectorized(S, K, T, r, sigma, q, tree_steps, np.where(is_call, "call", "put"))
+    # IV européenne (comme l'analyse) ; les puts sont convertis en calls par parité call-put
+    call_prices = np.where(is_call, mid, mid + S * np.exp(-q * T) - K * np.exp(-r * T))
+    implied = find_implied_volatility_bisection_vectorized(call_prices, S, K, T, r, q)
+    return theoretical, implied
+
+
+def price_contracts(S, K, T, r, sigma, q, is_call, mid, tree_steps=DEFAULT_TREE_STEPS, workers=None):
+    """
+    Valorise tous les contrats en lots, répartis sur `workers` processus (tous les cœurs par défaut).
+
+    Retourne:
+    tuple: (prix théoriques, volatilités implicites), tableaux alignés sur les entrées.
+    """
+    workers = workers or os.cpu_count() or 1
+    n = len(S)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    bounds = np.linspace(0, n, min(n, workers * CHUNKS_PER_WORKER) + 1, dtype=int)
+    payloads = [(S[a:b], K[a:b], T[a:b], r[a:b], sigma[a:b], q[a:b], is_call[a:b], mid[a:b], tree_steps)
+                for a, b in zip(bounds, bounds[1:])]
+    if workers == 1: # Un seul cœur : pas de processus (le transfert des lots coûterait sans rien paralléliser)
+        results = [_price_chunk(payload) for payload in payloads]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_price_chunk, payloads))
+    return np.concatenate([theo for theo, _ in results]), np.concatenate([iv for _, iv in results])
+
+
+def screen_universe(tickers, risk_free_rate=None, max_spread_pct=0.10, min_open_interest=100, min_volume=0,
+                    hv_estimator="close_to_close", hv_window=DEFAULT_HV_WINDOW, tree_steps=DEFAULT_TREE_STEPS,
+                    workers=None, fetch_workers=DEFAULT_FETCH_WORKERS, chain_store=None, coordinator=None):
+    """
+    Classe tous les contrats cotés d'un univers par sur/sous-évaluation (marché vs modèle binomial/HV).
+
+    Paramètres:
+    tickers (iterable): Univers de sous-jacents.
+    risk_free_rate (float ou YieldCurve): Taux sans risque (courbe du Trésor téléchargée par défaut).
+    max_spread_pct, min_open_interest, min_volume: Filtres de liquidité (voir apply_liquidity_filters).
+    hv_estimator (str): Estimateur de volatilité réalisée (voir realized_volatility.ESTIMATORS).
+    hv_window (int): Fenêtre de l'estimateur en séances.
+    tree_steps (int): Nombre de pas de l'arbre binomial.
+    workers (int): Processus de calcul (tous les cœurs par défaut).
+    fetch_workers (int): Threads de téléchargement des chaînes.
+    chain_store (OptionChainStore): Archive les chaînes téléchargées (optionnel).
+    coordinator (WorkQueueCoordinator): Valorise sur les workers de la file répartie au lieu des
+                                        processus locaux (optionnel, voir work_queue).
+
+    Retourne:
+    pd.DataFrame: Contrats liquides triés par |écart %| décroissant (colonnes 'over_under_value',
+                  'over_under_percent', 'theoretical_price', 'implied_volatility', 'historical_volatility'...),
+                  durées des étapes dans `.attrs['timings']` ; None si le taux sans risque est indisponible.
+    """
+    from main_portfolio import build_historical_volatilities
+    from yield_curve import fetch_treasury_curve, resolve_rate
+
+    tickers = sorted(set(tickers))
+    timings = {}
+
+    start = time.perf_counter()
+    if risk_free_rate is None:
+        risk_free_rate = fetch_treasury_curve()
+        if risk_free_rate is None:
+            print("Erreur critique: Impossible de récupérer le taux sans risque.")
+            return None
+    live_data, chain = fetch_universe(tickers, max_workers=fetch_workers, chain_store=chain_store)
+    timings["fetch"] = time.perf_counter() - start
+    listed_contracts = len(chain)
+
+    start = time.perf_counter()
+    historical_volatilities = build_historical_volatilities(list(live_data), hv_estimator, hv_window) if live_data else {}
+    timings["historical_volatility"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not chain.empty:
+        chain = apply_liquidity_filters(chain, max_spread_pct, min_open_interest, min_volume)
+    if chain.empty:
+        print("Avertissement: Aucun contrat ne passe les filtres de liquidité.")
+        return chain
+    spot = chain["ticker"].map({t: data["spot_price"] for t, data in live_data.items()}).to_numpy(dtype=float)
+    q = chain["ticker"].map({t: data["dividend_yield"] for t, data in live_data.items()}).to_numpy(dtype=float)
+    hv = chain["ticker"].map(historical_volatilities).to_numpy(dtype=float)
+    missing_hv = sorted(set(chain["ticker"][~(hv > 0)]))
+    if missing_hv:
+        print(f"Avertissement: Volatilité historique indisponible pour {', '.join(missing_hv)}. "
+              f"Utilisation d'une valeur par défaut de {DEFAULT_VOLATILITY:.2f}.")
+        hv = np.where(hv > 0, hv, DEFAULT_VOLATILITY)
+    T = chain["T"].to_numpy(dtype=float)
+    r = np.asarray(resolve_rate(risk_free_rate, T), dtype=float) * np.ones_like(T)
+    mid = chain["mid"].to_numpy(dtype=float)
+    if coordinator is not None:
+        from work_queue import distributed_price_contracts
+        theoretical, implied = distributed_price_contracts(coordinator, chain, live_data, historical_volatilities,
+                                                           risk_free_rate, tree_steps=tree_steps,
+                                                           default_volatility=DEFAULT_VOLATILITY)
+    else:
+        theoretical, implied = price_contracts(spot, chain["strike"].to_numpy(dtype=float), T, r, hv, q,
+                                               (chain["type"] == "call").to_numpy(), mid, tree_steps=tree_steps,
+                                               workers=workers)
+    timings["pricing"] = time.perf_counter() - start
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        over_under_value = mid - theoretical
+        over_under_percent = np.where(theoretical >= MIN_THEORETICAL_PRICE, over_under_value / theoretical * 100, np.nan)
+    ranked = chain.assign(spot=spot, historical_volatility=hv, implied_volatility=implied,
+                          theoretical_price=theoretical, over_under_value=over_under_value,
+                          over_under_percent=over_under_percent)
+    ranked = ranked[ranked["over_under_percent"].notna()]
+    ranked = ranked.reindex(ranked["over_under_percent"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+    ranked.attrs["timings"] = timings
+    ranked.attrs["listed_contracts"] = listed_contracts
+    print(f"Screener : {len(tickers)} tickers, {listed_contracts} contrats cotés, {len(ranked)} liquides valorisés "
+          f"(récupération {timings['fetch']:.1f}s, HV {timings['historical_volatility']:.1f}s, "
+          f"valorisation {timings['pricing']:.1f}s sur " +
+          (f"{coordinator.alive_workers} worker(s))" if coordinator is not None else f"{workers or os.cpu_count() or 1} cœur(s))"))
+    return ranked
+
+
+def format_screen(ranked, top=20):
+    """
+    Tableau texte des `top` contrats les plus sous-évalués et surévalués.
+    """
+    header = (f"{'Ticker':<8} {'Échéance':<10} {'Type':<4} {'Strike':>8} {'Mid':>8} {'Théo.':>8} {'Écart %':>8} "
+              f"{'IV':>7} {'HV':>7} {'Fourch.':>7} {'OI':>7}")
+    lines = []
+    for title, subset in (("Sous-évalués (marché < modèle)", ranked[ranked["over_under_percent"] < 0]),
+                          ("Surévalués (marché > modèle)", ranked[ranked["over_under_percent"] > 0])):
+        lines += ["", title, header, "-" * len(header)]
+        for row in subset.head(top).itertuples(index=False):
+            lines.append(f"{row.ticker:<8} {row.expiry:<10} {row.type:<4} {row.strike:>8.2f} {row.mid:>8.2f} "
+                         f"{row.theoretical_price:>8.2f} {row.over_under_percent:>8.1f} {row.implied_volatility:>7.1%} "
+                         f"{row.historical_volatility:>7.1%} {row.spread_pct:>7.1%} {row.openInterest:>7.0f}")
+    return "\n".join(lines[1:])
+
+
+# Pour tester ce module indépendamment (univers de 100 tickers servi par le serveur Yahoo factice)
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    from fake_yahoo_server import FakeYahooConfig, FakeYahooServer
+    from fetch_benchmark import synthetic_universe
+    from yield_curve import YieldCurve
+
+    print("--- Test de option_screener.py (serveur Yahoo factice, 100 tickers) ---")
+    with FakeYahooServer(FakeYahooConfig(latency=0.02, jitter=0.01, seed=1)) as server:
+        server.install()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = screen_universe(synthetic_universe(100), risk_free_rate=YieldCurve.flat(0.04),
+                                         min_open_interest=500, max_spread_pct=0.25)
+        finally:
+            server.uninstall()
+    timings = result.attrs["timings"]
+    print(f"{result.attrs['listed_contracts']} contrats cotés, {len(result)} liquides valorisés en "
+          f"{sum(timings.values()):.1f}s ({', '.join(f'{k} {v:.1f}s' for k, v in timings.items())})")
+    print(format_screen(result, top=5))
@@ -0,0 +1,390 @@
+# pipeline.py
+"""
+Ordonnanceur d'étapes à dépendances déclarées (DAG) pour l'analyse du portefeuille.
+
+Chaque étape déclare ses entrées (les noms des étapes dont elle consomme le résultat) et
+sa nature : 'io' (attente réseau, exécutée dans un pool de threads large) ou 'cpu' (calcul,
+pool séparé et étroit pour ne pas se disputer le GIL). Une étape est soumise dès que ses
+entrées sont disponibles : les téléchargements indépendants (courbe des taux, spots, cotations,
+historiques de volatilité) se recouvrent, et la valorisation d'un sous-jacent commence dès
+que ses propres données sont arrivées, pendant que les autres sont encore en cours de
+récupération. La durée totale tend vers le chemin critique au lieu de la somme des étapes.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+KINDS = ("io", "cpu")
+DEFAULT_IO_WORKERS = 16
+DEFAULT_CPU_WORKERS = 1 # Le pricing est en Python/numpy : un seul thread de calcul, recouvert par les I/O
+
+
+class Stage:
+    """
+    Étape du pipeline : `func(*résultats des entrées)`, dans l'ordre de `inputs`.
+    """
+    __slots__ = ("name", "func", "inputs", "kind")
+
+    def __init__(self, name, func, inputs=(), kind="io"):
+        if kind not in KINDS:
+            raise ValueError(f"Nature d'étape inconnue pour {name} : {kind!r} (attendu : {', '.join(KINDS)})")
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.kind = kind
+
+
+class PipelineRun:
+    """
+    Résultat d'une exécution : valeurs et horodatages de chaque étape, étapes en échec ou ignorées.
+    """
+
+    def __init__(self, stages, results, timings, failed, skipped, wall_seconds):
+        self.stages = stages
+        self.results = results
+        self.timings = timings # nom -> (début, fin) en secondes depuis le lancement
+        self.failed = failed # nom -> exception
+        self.skipped = skipped # Étapes dont une entrée a échoué
+        self.wall_seconds = wall_seconds
+
+    def duration(self, name):
+        start, end = self.timings[name]
+        return end - start
+
+    @property
+    def busy_seconds(self):
+        """Somme des durées des étapes (durée d'une exécution strictement séquentielle)."""
+        return sum(end - start for start, end in self.timings.values())
+
+    def critical_path(self):
+        """
+        Chaîne d'étapes de durée cumulée maximale (durées mesurées).
+
+        Retourne:
+        tuple: (durée du chemin critique en secondes, liste des noms d'étapes).
+        """
+        longest = {}
+        for name, stage in self.stages.items(): # Ordre topologique (voir Pipeline._order)
+            if name not in self.timings:
+                continue
+            previous = max((longest[dependency] for dependency in stage.inputs if dependency in longest),
+                           default=(0.0, []), key=lambda item: item[0])
+            longest[name] = (previous[0] + self.duration(name), previous[1] + [name])
+        return max(longest.values(), default=(0.0, []), key=lambda item: item[0])
+
+    def summary(self):
+        critical_seconds, critical_names = self.critical_path()
+        path = " -> ".join(critical_names) if len(critical_names) <= 6 else \
+            " -> ".join(critical_names[:3] + ["..."] + critical_names[-2:])
+        line = (f"Pipeline : {len(self.timings)} étapes en {self.wall_seconds:.2f}s "
+                f"(somme des étapes {self.busy_seconds:.2f}s, chemin critique {critical_seconds:.2f}s : {path})")
+        if self.failed or self.skipped:
+            line += f", {len(self.failed)} en échec, {len(self.skipped)} ignorées"
+        return line
+
+
+class Pipeline:
+    """
+    Graphe d'étapes exécuté par deux pools de threads (I/O et calcul).
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), kind="io"):
+        """
+        Déclare une étape. Les entrées peuvent être déclarées avant ou après l'étape qui les consomme.
+        """
+        if name in self.stages:
+            raise ValueError(f"Étape déjà déclarée : {name}")
+        self.stages[name] = Stage(name, func, inputs, kind)
+        return name
+
+    def _order(self):
+        """
+        Ordre topologique des étapes (Kahn) ; ValueError si une entrée est inconnue ou en cas de cycle.
+        """
+        dependents = {name: [] for name in self.stages}
+        remaining = {}
+        for name, stage in self.stages.items():
+            for dependency in stage.inputs:
+                if dependency not in self.stages:
+                    raise ValueError(f"Entrée inconnue pour l'étape {name} : {dependency}")
+                dependents[dependency].append(name)
+            remaining[name] = len(stage.inputs)
+        ready = [name for name, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for dependent in dependents[name]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.stages):
+            cycle = sorted(name for name, count in remaining.items() if count > 0)
+            raise ValueError(f"Cycle de dépendances entre les étapes : {', '.join(cycle[:10])}")
+        return order, dependents
+
+    def run(self, io_workers=DEFAULT_IO_WORKERS, cpu_workers=DEFAULT_CPU_WORKERS, on_result=None):
+        """
+        Exécute le graphe : chaque étape est soumise à son pool dès que toutes ses entrées sont prêtes.
+        Une étape qui lève une exception est signalée, et les étapes qui en dépendent sont ignorées.
+
+        Paramètres:
+        io_workers (int): Threads du pool des étapes 'io'.
+        cpu_workers (int): Threads du pool des étapes 'cpu'.
+        on_result (callable): Appelée `on_result(nom, valeur)` à la fin de chaque étape, au fil de l'eau (optionnel).
+
+        Retourne:
+        PipelineRun: Résultats, horodatages, échecs et étapes ignorées.
+        """
+        order, dependents = self._order()
+        position = {name: i for i, name in enumerate(self.stages)}
+        stages = {name: self.stages[name] for name in order}
+        remaining = {name: len(stage.inputs) for name, stage in stages.items()}
+        results, timings, failed, skipped = {}, {}, {}, set()
+        origin = time.perf_counter()
+
+        def timed(stage, args):
+            start = time.perf_counter() - origin
+            try:
+                return stage.func(*args)
+            finally:
+                timings[stage.name] = (start, time.perf_counter() - origin)
+
+        def skip(name):
+            skipped.add(name)
+            for dependent in dependents[name]:
+                if dependent not in skipped:
+                    skip(dependent)
+
+        with ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="pipeline-io") as io_pool, \
+                ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="pipeline-cpu") as cpu_pool:
+            pools = {"io": io_pool, "cpu": cpu_pool}
+            pending = {}
+
+            def submit(names):
+                for name in sorted(names, key=position.get): # Ordre de déclaration
+                    stage = stages[name]
+                    args = [results[dependency] for dependency in stage.inputs]
+                    pending[pools[stage.kind].submit(timed, stage, args)] = name
+
+            submit([name for name, count in remaining.items() if count == 0])
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        failed[name] = e
+                        print(f"Avertissement: Étape {name} en échec : {e}")
+                        for dependent in dependents[name]:
+                            if dependent not in skipped:
+                                skip(dependent)
+                        continue
+                    if on_result is not None:
+                        on_result(name, results[name])
+                    ready = []
+                    for dependent in dependents[name]:
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0 and dependent not in skipped:
+                            ready.append(dependent)
+                    submit(ready)
+
+        return PipelineRun(stages, results, timings, failed, sorted(skipped, key=position.get),
+                           time.perf_counter() - origin)
+
+
+def _fetch_rate():
+    from yield_curve import fetch_treasury_curve
+
+    curve = fetch_treasury_curve()
+    if curve is None:
+        raise RuntimeError("Impossible de récupérer le taux sans risque.")
+    return curve
+
+
+def _fetch_quotes(option_positions_details, chain_store, live):
+    from market_data_fetcher import fetch_live_option_data
+
+    if live is None:
+        return {}
+    ticker = option_positions_details[0]["ticker"]
+    return fetch_live_option_data(option_positions_details, {ticker: live["spot_price"]}, chain_store=chain_store)
+
+
+def _fetch_historical_volatility(ticker):
+    from market_data_fetcher import calculate_historical_volatility
+
+    return {ticker: calculate_historical_volatility(ticker)}
+
+
+def _fetch_historical_volatilities(tickers, estimator, window):
+    from main_portfolio import build_historical_volatilities
+
+    return build_historical_volatilities(tickers, estimator, window)
+
+
+def _build_surface(ticker, chain_store, live, risk_free_rate):
+    from vol_surface import get_vol_surface
+
+    if live is None:
+        return None
+    return get_vol_surface(ticker, live["spot_price"], risk_free_rate, live["dividend_yield"], chain_store=chain_store)
+
+
+class _PricingBudget:
+    """
+    Partage d'une échéance de pricing entre les étapes analyze:T : chaque étape reçoit, à son
+    démarrage, une part égale du temps restant (une étape qui finit tôt laisse son reliquat aux suivantes).
+    """
+
+    def __init__(self, deadline, tolerance, parts):
+        self.deadline = deadline
+        self.tolerance = tolerance / parts if tolerance is not None else None # Somme des parts = erreur cible
+        self._pending = parts
+        self._lock = threading.Lock()
+
+    def next_deadline(self):
+        if self.deadline is None:
+            return None
+        with self._lock:
+            now = time.perf_counter()
+            share = max(self.deadline - now, 0.0) / max(self._pending, 1)
+            self._pending -= 1
+        return now + share
+
+
+def _analyze_underlying(ticker, positions, risk_free_rate, live, quotes=None, historical_volatilities=None,
+                        surface=None, pricing_budget=None):
+    from market_data_provider import get_provider
+    from portfolio_analyzer import analyze_portfolio
+
+    live_prices = {ticker: live["spot_price"]} if live is not None else {}
+    dividend_yields = {ticker: live["dividend_yield"]} if live is not None else {}
+    # Copie : analyze_portfolio complète le dictionnaire des HV manquantes
+    historical_volatilities = {ticker: historical_volatilities[ticker]} \
+        if historical_volatilities and ticker in historical_volatilities else {}
+    df, _, details = analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields, quotes or {},
+                                       vol_surfaces={ticker: surface} if surface is not None else None,
+                                       historical_volatilities=historical_volatilities, as_of=get_provider().as_of,
+                                       pricing_deadline=pricing_budget.next_deadline() if pricing_budget else None,
+                                       pricing_tolerance=pricing_budget.tolerance if pricing_budget else None)
+    return df, details
+
+
+def _merge(*analyses):
+    import pandas as pd
+    from portfolio_analyzer import portfolio_totals, summarize_portfolio
+
+    # Lignes et détails concaténés dans le même ordre (celui des tickers dans les positions)
+    df = pd.concat([df for df, _ in analyses], ignore_index=True)
+    details = [option for _, ticker_details in analyses for option in ticker_details]
+    return df, summarize_portfolio(portfolio_totals(df)), details
+
+
+def build_analysis_pipeline(positions, with_vol_surfaces=False, hv_estimator=None, hv_window=60, chain_store=None,
+                            pricing_deadline=None, pricing_tolerance=None):
+    """
+    Construit le graphe de l'analyse, un sous-graphe par sous-jacent :
+
+        rate ─────────────────────────────┐
+        spot:T ─┬─ quotes:T ──────────────┼─ analyze:T ─┐
+                └─ surface:T (+ rate) ────┤             ├─ merge
+        hv:T (ou hv, téléchargement groupé)┘  (autres T) ┘
+
+    Paramètres: ceux de main_portfolio.run_analysis.
+
+    Retourne:
+    Pipeline: Le graphe ; l'étape 'merge' produit (DataFrame, résumé, détails de valorisation des options).
+    """
+    positions_by_ticker = {}
+    for pos in positions:
+        positions_by_ticker.setdefault(pos["ticker"], []).append(pos)
+
+    def option_details(ticker_positions):
+        return [{"ticker": pos["ticker"], "strike": float(pos["strike"]), "expiry": pos["expiry"], "type": pos["type"]}
+                for pos in ticker_positions if pos["type"] in ["call", "put"]]
+
+    option_tickers = [ticker for ticker, ticker_positions in positions_by_ticker.items()
+                      if option_details(ticker_positions)]
+
+    pricing_budget = None
+    if (pricing_deadline is not None or pricing_tolerance is not None) and option_tickers:
+        pricing_budget = _PricingBudget(pricing_deadline, pricing_tolerance, len(option_tickers))
+
+    pipeline = Pipeline()
+    pipeline.add("rate", _fetch_rate)
+    if hv_estimator is not None and option_tickers:
+        pipeline.add("hv", partial(_fetch_historical_volatilities, option_tickers, hv_estimator, hv_window))
+
+    from market_data_fetcher import fetch_ticker_live_data
+
+    analyses = []
+    for ticker, ticker_positions in positions_by_ticker.items():
+        spot = pipeline.add(f"spot:{ticker}", partial(fetch_ticker_live_data, ticker))
+        inputs = ["rate", spot]
+        details = option_details(ticker_positions)
+        if details:
+            # Avec les surfaces, la chaîne complète est archivée par get_vol_surface : les échéances
+            # détenues ne sont pas archivées une seconde fois par la récupération des cotations
+            quotes_store = None if with_vol_surfaces else chain_store
+            inputs.append(pipeline.add(f"quotes:{ticker}", partial(_fetch_quotes, details, quotes_store), [spot]))
+            inputs.append("hv" if hv_estimator is not None else
+                          pipeline.add(f"hv:{ticker}", partial(_fetch_historical_volatility, ticker)))
+            if with_vol_surfaces:
+                inputs.append(pipeline.add(f"surface:{ticker}", partial(_build_surface, ticker, chain_store),
+                                           [spot, "rate"]))
+        analyses.append(pipeline.add(f"analyze:{ticker}",
+                                     partial(_analyze_underlying, ticker, ticker_positions,
+                                             pricing_budget=pricing_budget if details else None),
+                                     inputs, kind="cpu"))
+    pipeline.add("merge", _merge, analyses, kind="cpu")
+    return pipeline
+
+
+# Benchmark : analyse séquentielle (fetch_market_inputs puis analyze_portfolio) contre le pipeline,
+# sur le serveur Yahoo factice avec latence (sans réseau)
+if __name__ == "__main__":
+    import contextlib
+    import os
+
+    import yield_curve
+    from fake_yahoo_server import FakeYahooConfig, FakeYahooServer
+    from fetch_benchmark import _option_positions, synthetic_universe
+    from main_portfolio import fetch_market_inputs
+    from portfolio_analyzer import analyze_portfolio
+
+    print("--- Test de pipeline.py (serveur Yahoo factice, 50 ms de latence) ---")
+    tickers = synthetic_universe(30)
+    test_positions = [{**option, "qty": 10, "purchase_premium": "2.0"} for option in _option_positions(tickers)]
+    test_positions += [{"ticker": ticker, "type": "stock", "qty": 100, "purchase_price": "50"} for ticker in tickers[:10]]
+
+    def sequential():
+        option_details = [{key: pos[key] for key in ("ticker", "strike", "expiry", "type")}
+                          for pos in test_positions if pos["type"] in ["call", "put"]]
+        rate, prices, dividends, quotes = fetch_market_inputs(set(tickers), option_details)
+        return analyze_portfolio(test_positions, prices, rate, dividends, quotes)
+
+    with FakeYahooServer(FakeYahooConfig(latency=0.05, seed=3)) as server:
+        server.install()
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start_time = time.perf_counter()
+                expected = sequential()
+                sequential_seconds = time.perf_counter() - start_time
+                yield_curve._CURVE_CACHE.clear() # Même travail réseau pour les deux exécutions
+                pipeline_run = build_analysis_pipeline(test_positions).run()
+        finally:
+            server.uninstall()
+
+    df, summary, details = pipeline_run.results["merge"]
+    assert len(df) == len(expected[0]) and len(details) == len(expected[2])
+    total_key = "Valeur totale portefeuille "
+    assert abs(summary[total_key] - expected[1][total_key]) < 1e-6 * max(1.0, abs(summary[total_key]))
+    print(f"Séquentiel : {sequential_seconds:.2f}s")
+    print(pipeline_run.summary())
+    print(f"Accélération : x{sequential_seconds / pipeline_run.wall_seconds:.1f}")
@@ -0,0 +1,227 @@
+# pnl_explain.py
+"""
+Explication du P&L d'une exécution à l'autre (P&L explain) : la variation de valeur de
+chaque option détenue depuis l'instantané précédent est décomposée en effet spot (delta et
+gamma), effet volatilité (vega), passage du temps (theta), effet taux (rho) et résiduel
+(termes croisés, dividendes, prime d'exercice anticipé, écart au modèle), puis agrégée par
+ticker et pour le portefeuille.
+
+Les sensibilités sont calculées en lot (black_scholes_greeks_vectorized) sur l'état de
+l'exécution précédente : un seul appel numpy pour tous les contrats.
+"""
+import numpy as np
+import pandas as pd
+
+from option_pricing import black_scholes_greeks_vectorized
+
+TERMS = ("delta", "gamma", "vega", "theta", "rates", "residual")
+TERM_LABELS = {"delta": "Spot (delta)", "gamma": "Spot (gamma)", "vega": "Volatilité (vega)",
+               "theta": "Temps (theta)", "rates": "Taux (rho)", "residual": "Résiduel", "total": "Total"}
+VOL_SOURCES = ("implied_volatility", "surface_volatility", "historical_volatility") # Par ordre de préférence
+CONTRACT_MULTIPLIER = 100
+
+
+def _paired_volatility(previous, current):
+    """
+    Volatilités des deux instantanés, lues sur la même source pour chaque contrat
+    (IV si disponible des deux côtés, sinon volatilité de surface, sinon HV).
+    """
+    sigma_previous = np.full(len(previous), np.nan)
+    sigma_current = np.full(len(previous), np.nan)
+    source = np.full(len(previous), None, dtype=object)
+    for column in reversed(VOL_SOURCES): # La source préférée est appliquée en dernier
+        a = previous[column].to_numpy(dtype=float)
+        b = current[column].to_numpy(dtype=float)
+        ok = (a > 0) & (b > 0) # Faux si NaN
+        sigma_previous = np.where(ok, a, sigma_previous)
+        sigma_current = np.where(ok, b, sigma_current)
+        source = np.where(ok, column, source)
+    return sigma_previous, sigma_current, source
+
+
+def explain_pnl(previous, current):
+    """
+    Décompose la variation de valeur des positions détenues dans les deux instantanés.
+
+    Les quantités de l'instantané précédent sont utilisées (P&L du portefeuille tel qu'il était
+    détenu) ; les instruments ouverts ou fermés entre les deux exécutions ne sont pas expliqués.
+
+    Paramètres:
+    previous (pd.DataFrame): Instantané précédent (voir RunHistory.snapshot).
+    current (pd.DataFrame): Instantané courant.
+
+    Retourne:
+    pd.DataFrame: Une ligne par instrument : identification, quantité, variations de spot et de
+                  volatilité, termes de TERMS et 'total' (variation de valeur observée).
+    """
+    keys = ["instrument", "ticker", "contract_id"]
+    previous = previous.assign(contract_id=previous["contract_id"].fillna(-1) if "contract_id" in previous else -1)
+    current = current.assign(contract_id=current["contract_id"].fillna(-1) if "contract_id" in current else -1)
+    held = previous.merge(current, on=keys, suffixes=("_0", "_1"))
+    held = held[held["market_price_0"].notna() & held["market_price_1"].notna()]
+
+    def column(name, suffix):
+        full_name = f"{name}_{suffix}"
+        return held[full_name] if full_name in held else pd.Series(np.nan, index=held.index)
+
+    is_option = (held["instrument"] == "option").to_numpy()
+    qty = held["qty_0"].to_numpy(dtype=float)
+    multiplier = np.where(is_option, CONTRACT_MULTIPLIER, 1.0) * qty
+    S0 = column("spot_price", 0).to_numpy(dtype=float)
+    S1 = column("spot_price", 1).to_numpy(dtype=float)
+    dS = S1 - S0
+    total = (held["market_price_1"].to_numpy(dtype=float) - held["market_price_0"].to_numpy(dtype=float)) * multiplier
+
+    vols_previous = pd.DataFrame({name: column(name, 0) for name in VOL_SOURCES})
+    vols_current = pd.DataFrame({name: column(name, 1) for name in VOL_SOURCES})
+    sigma0, sigma1, vol_source = _paired_volatility(vols_previous, vols_current)
+    T0 = column("time_to_expiry", 0).to_numpy(dtype=float)
+    T1 = column("time_to_expiry", 1).to_numpy(dtype=float)
+    r0 = column("risk_free_rate", 0).to_numpy(dtype=float)
+    r1 = column("risk_free_rate", 1).to_numpy(dtype=float)
+    q0 = np.nan_to_num(column("dividend_yield", 0).to_numpy(dtype=float))
+    strikes = column("strike", 0).to_numpy(dtype=float)
+    types = column("type", 0).fillna("call").to_numpy()
+
+    # Sensibilités à l'état précédent, tous les contrats en un seul appel
+    greeks = black_scholes_greeks_vectorized(np.where(is_option, S0, 1.0), np.where(is_option, strikes, 1.0),
+                                             np.where(is_option, T0, 0.0), np.nan_to_num(r0),
+                                             np.where(is_option, sigma0, 0.2), q0, types)
+
+    def term(values):
+        return np.nan_to_num(values * multiplier) # Volatilité ou spot manquant : tout part dans le résiduel
+
+    terms = {
+        "delta": np.where(is_option, term(greeks["delta"] * dS), term(dS)), # Actions et ETF : delta de 1
+        "gamma": np.where(is_option, term(0.5 * greeks["gamma"] * dS**2), 0.0),
+        "vega": np.where(is_option, term(greeks["vega"] * (sigma1 - sigma0)), 0.0),
+        "theta": np.where(is_option, term(greeks["theta"] * (T0 - T1)), 0.0),
+        "rates": np.where(is_option, term(greeks["rho"] * (r1 - r0)), 0.0),
+    }
+    terms["residual"] = total - sum(terms.values())
+
+    return pd.DataFrame({
+        "ticker": held["ticker"].to_numpy(),
+        "instrument": held["instrument"].to_numpy(),
+        "contract_id": held["contract_id"].to_numpy(),
+        "strike": column("strike", 0).to_numpy(),
+        "expiry": column("expiry", 0).to_numpy(),
+        "type": column("type", 0).to_numpy(),
+        "qty": qty,
+        "spot_change": dS,
+        "vol_change": sigma1 - sigma0,
+        "vol_source": vol_source,
+        **terms,
+        "total": total,
+    })
+
+
+def explain_by_ticker(explained):
+    """
+    Agrège les termes par ticker, avec une dernière ligne 'Portefeuille'.
+    """
+    columns = list(TERMS) + ["total"]
+    by_ticker = explained.groupby("ticker")[columns].sum().sort_values("total", key=np.abs, ascending=False)
+    by_ticker.loc["Portefeuille"] = by_ticker.sum()
+    return by_ticker
+
+
+def explain_runs(history, run_id=None, previous_run_id=None):
+    """
+    Explique le P&L entre deux exécutions enregistrées (par défaut : les deux dernières).
+
+    Paramètres:
+    history (RunHistory): Historique des exécutions.
+    run_id (int): Exécution courante.
+    previous_run_id (int): Exécution de référence (la précédente par défaut).
+
+    Retourne:
+    dict: 'run_id', 'previous_run_id', 'positions' (explain_pnl), 'by_ticker' (explain_by_ticker),
+          'new_instruments' et 'closed_instruments' ; None s'il n'y a pas d'exécution précédente.
+    """
+    if run_id is None or previous_run_id is None:
+        run_ids = history.latest_run_ids(2)
+        if run_id is None:
+            run_id = run_ids[0] if run_ids else None
+        if previous_run_id is None:
+            previous_run_id = next((other for other in run_ids if other != run_id), None)
+    if run_id is None or previous_run_id is None:
+        print("Avertissement: Pas d'exécution précédente dans l'historique, P&L non expliqué.")
+        return None
+
+    previous = history.snapshot(previous_run_id)
+    current = history.snapshot(run_id)
+    explained = explain_pnl(previous, current)
+
+    def instrument_keys(snapshot):
+        return set(zip(snapshot["ticker"], snapshot.get("contract_id", pd.Series(dtype=float)).fillna(-1)))
+
+    return {
+        "run_id": run_id,
+        "previous_run_id": previous_run_id,
+        "positions": explained,
+        "by_ticker": explain_by_ticker(explained),
+        "new_instruments": len(instrument_keys(current) - instrument_keys(previous)),
+        "closed_instruments": len(instrument_keys(previous) - instrument_keys(current)),
+    }
+
+
+def format_explain(result):
+    """
+    Tableau texte de l'explication du P&L par ticker.
+    """
+    by_ticker = result["by_ticker"]
+    columns = list(TERMS) + ["total"]
+    header = f"{'Ticker':<14}" + "".join(f"{TERM_LABELS[name]:>18}" for name in columns)
+    lines = [f"Explication du P&L : exécution {result['previous_run_id']} -> {result['run_id']} "
+             f"({result['new_instruments']} instruments ouverts, {result['closed_instruments']} fermés, non expliqués)",
+             header, "-" * len(header)]
+    for ticker, row in by_ticker.iterrows():
+        lines.append(f"{ticker:<14}" + "".join(f"{row[name]:>18,.2f}" for name in columns))
+    return "\n".join(lines)
+
+
+# Pour tester ce module indépendamment (deux exécutions synthétiques, sans réseau)
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+    from datetime import datetime, timedelta
+
+    from portfolio_analyzer import analyze_portfolio
+    from run_history import RunHistory
+    from synthetic_book import generate_synthetic_book
+
+    print("--- Test de pnl_explain.py ---")
+    book = generate_synthetic_book(2_000, seed=5)
+
+    def run(live_prices, live_option_data):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return analyze_portfolio(book["positions"], live_prices, 0.04, book["dividend_yields"], live_option_data,
+                                     historical_volatilities=dict(book["historical_volatilities"]))
+
+    start_time = time.perf_counter()
+    day_one = run(book["live_prices"], book["live_option_data"])
+    analysis_seconds = time.perf_counter() - start_time
+
+    # Lendemain : spots +2 %, cotations des options décalées en conséquence (delta approximé par le spot)
+    moved_prices = {ticker: spot * 1.02 for ticker, spot in book["live_prices"].items()}
+    moved_options = {}
+    for key, quote in book["live_option_data"].items():
+        ticker, strike, _, _, _, option_type = key.rsplit("-", 5)
+        spot = book["live_prices"][ticker]
+        shift = 0.02 * spot * (0.6 if option_type == "call" else -0.4)
+        bid, ask = max(quote["bid"] + shift, 0.01), max(quote["ask"] + shift, 0.02)
+        moved_options[key] = {"bid": bid, "ask": ask, "lastPrice": (bid + ask) / 2, "mid_price": (bid + ask) / 2, "found": True}
+    day_two = run(moved_prices, moved_options)
+
+    history = RunHistory(":memory:")
+    history.record_run(*day_one, run_time=datetime.now() - timedelta(days=1))
+    history.record_run(*day_two, run_time=datetime.now())
+
+    start_time = time.perf_counter()
+    result = explain_runs(history)
+    explain_seconds = time.perf_counter() - start_time
+    print(format_explain({**result, "by_ticker": result["by_ticker"].tail(6)}))
+    print(f"\n{len(result['positions'])} instruments expliqués en {explain_seconds * 1000:.0f} ms "
+          f"(analyse : {analysis_seconds:.1f}s, soit {explain_seconds / analysis_seconds:.1%} du temps d'exécution)")
@@ -3,30 +3,160 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 # from option_pricing import black_scholes_call # Nous n'avons plus besoin de black_scholes_call directement ici
-from option_pricing import binomial_tree_american_call
+from option_pricing import binomial_tree_american_shared
 from implied_volatility_calculator import get_implied_volatility_for_option
+from iv_index import ATM_TARGET_T
 from market_data_fetcher import calculate_historical_volatility # NOUVEL IMPORT : pour la volatilité historique
+from position_loader import parse_cost, format_expiry
+from records import CONTRACTS, OptionValuation
+from yield_curve import resolve_rate
+
+THEORETICAL_TREE_STEPS = 500 # Nombre de pas de l'arbre binomial du prix théorique
+
+
+def _historical_volatility(ticker, historical_volatilities):
+    """
+    HV du ticker (une seule par ticker, même si plusieurs positions portent sur le même sous-jacent),
+    0.20 par défaut si elle est indisponible ou nulle.
+    """
+    if ticker not in historical_volatilities:
+        historical_volatilities[ticker] = calculate_historical_volatility(ticker) # Récupération de la HV
+    historical_volatility = historical_volatilities[ticker]
+    if pd.isna(historical_volatility) or historical_volatility == 0:
+        print(f"Avertissement: Volatilité historique non disponible ou nulle pour {ticker}. Utilisation d'une valeur par défaut de 0.20.")
+        historical_volatility = 0.20 # Valeur par défaut si HV non disponible ou nulle
+    return historical_volatility
+
+
+def _theoretical_price_groups(positions, live_prices, live_option_data, pricing_cache, today):
+    """
+    Calls à valoriser (cotés, non expirés, absents du cache), regroupés par (sous-jacent, échéance).
+
+    Retourne:
+    dict: {(ticker, T): {contract_id: [strike, quantité absolue totale]}}.
+    """
+    groups = {}
+    for pos in positions:
+        ticker = pos["ticker"]
+        spot = live_prices.get(ticker)
+        if pos["type"] != "call" or spot is None or spot <= 0:
+            continue
+        strike = float(pos["strike"])
+        expiry_str = format_expiry(pos["expiry"])
+        T = (datetime.strptime(expiry_str, "%Y-%m-%d") - today).days / 365.0
+        contract_id = pos.get("contract_id")
+        if contract_id is None:
+            contract_id = CONTRACTS.intern(ticker, strike, expiry_str, pos["type"])
+        if T <= 0 or strike <= 0 or contract_id in pricing_cache or not live_option_data.get(CONTRACTS.label(contract_id)):
+            continue
+        contract = groups.setdefault((ticker, T), {}).setdefault(contract_id, [strike, 0.0])
+        contract[1] += abs(pos["qty"])
+    return groups
+
+
+def _shared_lattice_prices(groups, live_prices, risk_free_rate, dividend_yields_by_ticker, historical_volatilities):
+    """
+    Prix théoriques (arbre binomial américain, HV) des calls de _theoretical_price_groups : un seul arbre
+    par (sous-jacent, échéance) pour tous les strikes, au lieu d'un arbre par contrat.
+
+    Retourne:
+    dict: Prix théorique par identifiant de contrat.
+    """
+    prices = {}
+    for (ticker, T), contracts in groups.items():
+        try:
+            group_prices = binomial_tree_american_shared(
+                S=live_prices[ticker],
+                K=[strike for strike, _ in contracts.values()],
+                T=T,
+                r=resolve_rate(risk_free_rate, T),
+                sigma=_historical_volatility(ticker, historical_volatilities), # <<< UTILISATION DE LA VOLATILITÉ HISTORIQUE
+                q=dividend_yields_by_ticker.get(ticker, 0.00),
+                N=THEORETICAL_TREE_STEPS
+            )
+        except Exception as e:
+            print(f"Erreur lors du calcul des prix théoriques binomiaux pour {ticker} (T={T:.3f}): {e}")
+            continue
+        prices.update(zip(contracts, group_prices))
+    return prices
+
+
+def _progressive_prices(groups, live_prices, risk_free_rate, dividend_yields_by_ticker, historical_volatilities,
+                        deadline, tolerance):
+    """
+    Prix théoriques des mêmes calls, valorisés progressivement (progressive_pricing.ProgressivePricer) :
+    les contrats qui pèsent le plus dans l'incertitude du portefeuille sont raffinés en premier,
+    jusqu'à l'échéance `deadline` (time.perf_counter()) ou l'erreur `tolerance` (€).
+
+    Retourne:
+    dict: Prix théorique par identifiant de contrat.
+    dict: Erreur estimée du prix par identifiant de contrat.
+    """
+    from progressive_pricing import ProgressivePricer
+
+    contract_ids, columns = [], []
+    for (ticker, T), contracts in groups.items():
+        for contract_id, (strike, quantity) in contracts.items():
+            contract_ids.append(contract_id)
+            columns.append((live_prices[ticker], strike, T, resolve_rate(risk_free_rate, T),
+                            _historical_volatility(ticker, historical_volatilities),
+                            dividend_yields_by_ticker.get(ticker, 0.00), quantity))
+    if not contract_ids:
+        return {}, {}
+    S, K, T, r, sigma, q, quantities = np.array(columns, dtype=float).T
+    snapshot = ProgressivePricer(S, K, T, r, sigma, q, "call", quantities, max_steps=THEORETICAL_TREE_STEPS).run(
+        deadline=deadline, tolerance=tolerance)
+    return dict(zip(contract_ids, snapshot.prices)), dict(zip(contract_ids, snapshot.errors))
+
 
 # Modifier la signature de la fonction pour inclure live_option_data
-def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data):
+def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data, vol_surfaces=None,
+                      historical_volatilities=None, pricing_cache=None, as_of=None, pricing_deadline=None,
+                      pricing_tolerance=None):
     """
     Analyse les positions du portefeuille, calcule les valeurs de marché et le P&L.
 
     Paramètres:
-    positions (list): Liste des dictionnaires de positions.
+    positions (list): Liste des positions (dictionnaires ou records.Position).
     live_prices (dict): Dictionnaire des prix spot actuels.
-    risk_free_rate (float): Taux d'intérêt sans risque annuel.
+    risk_free_rate (float ou YieldCurve): Taux d'intérêt sans risque annuel, ou courbe des taux
+                                          (chaque option est alors actualisée au taux de sa maturité).
     dividend_yields_by_ticker (dict): Dictionnaire des rendements de dividende annuel par ticker.
     live_option_data (dict): Dictionnaire des données live des options (prix mid, bid, ask). 
+    vol_surfaces (dict): Surfaces de volatilité par ticker (VolSurface, optionnel). Si fournie,
+                         la volatilité de surface sigma(K, T) est ajoutée aux détails des options.
+    historical_volatilities (dict): Cache des volatilités historiques par ticker (optionnel). Les HV
+                                    manquantes sont calculées puis ajoutées au dictionnaire.
+    pricing_cache (dict): Cache (IV, prix théorique, erreur estimée) par identifiant de contrat (optionnel). Permet de partager
+                          le pricing entre plusieurs portefeuilles valorisés avec les mêmes données de marché.
+    as_of (datetime): Date de valorisation (maintenant par défaut), ex. date d'un instantané rejoué.
+    pricing_deadline (float): Instant limite (time.perf_counter()) du calcul des prix théoriques (optionnel).
+    pricing_tolerance (float): Erreur cible (€) sur la valeur théorique des options (optionnel).
+                               Avec l'un ou l'autre, les prix théoriques sont calculés progressivement
+                               (progressive_pricing) et leur erreur estimée est ajoutée aux détails.
 
     Retourne:
     pd.DataFrame: DataFrame détaillé du portefeuille.
     dict: Résumé global du portefeuille.
-    list: Détails de la valorisation des options pour le rapport séparé. 
+    list: Détails de la valorisation des options (records.OptionValuation) pour le rapport séparé.
     """
     data = []
-    today = datetime.today()
+    today = as_of or datetime.today()
     options_valuation_details = [] 
+    # Sans cache fourni, la HV et le pricing restent au moins dédupliqués au sein de ce portefeuille
+    historical_volatilities = {} if historical_volatilities is None else historical_volatilities
+    pricing_cache = {} if pricing_cache is None else pricing_cache
+    # Prix théoriques des calls : un arbre partagé par (sous-jacent, échéance) pour tous les strikes,
+    # ou une valorisation progressive sous contrainte de temps / de précision
+    price_groups = _theoretical_price_groups(positions, live_prices, live_option_data, pricing_cache, today)
+    if pricing_deadline is not None or pricing_tolerance is not None:
+        lattice_prices, lattice_errors = _progressive_prices(price_groups, live_prices, risk_free_rate,
+                                                             dividend_yields_by_ticker, historical_volatilities,
+                                                             pricing_deadline, pricing_tolerance)
+    else:
+        lattice_prices = _shared_lattice_prices(price_groups, live_prices, risk_free_rate, dividend_yields_by_ticker,
+                                                historical_volatilities)
+        lattice_errors = {}
 
     for pos in positions:
         ticker = pos["ticker"]
@@ -43,8 +173,9 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
         
         # Logique pour les actions (ajoutée pour compléter, elle manquait)
         if pos["type"] == "stock":
-            if pos["purchase_price"] != "XX":
-                purchase_value = float(pos["purchase_price"]) * pos["qty"]
+            purchase_price = parse_cost(pos.get("purchase_price"))
+            if purchase_price is not None:
+                purchase_value = purchase_price * pos["qty"]
             mkt_val = current_spot_price * pos["qty"]
             pnl_val = mkt_val - purchase_value if purchase_value is not None else np.nan
             data.append([
@@ -54,8 +185,9 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
             ])
         
         elif pos["type"] == "etf":
-            if pos["purchase_price"] != "XX":
-                purchase_value = float(pos["purchase_price"]) * pos["qty"] # Multiplier par la quantité
+            purchase_price = parse_cost(pos.get("purchase_price"))
+            if purchase_price is not None:
+                purchase_value = purchase_price * pos["qty"] # Multiplier par la quantité
             
             # Pour les ETF, le prix spot actuel est la valeur de marché par unité
             mkt_val = current_spot_price * pos["qty"]
@@ -69,20 +201,33 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
 
         elif pos["type"] in ["call", "put"]:
             strike = float(pos["strike"])
-            expiry = datetime.strptime(pos["expiry"], "%Y-%m-%d")
+            expiry_str = format_expiry(pos["expiry"])
+            expiry = datetime.strptime(expiry_str, "%Y-%m-%d")
             days_to_expiry = (expiry - today).days
             T = days_to_expiry / 365.0
+            contract_rate = resolve_rate(risk_free_rate, T) # Taux sans risque à la maturité de l'option
 
-            # Clé pour récupérer les données live de l'option
-            option_key = f"{ticker}-{strike}-{pos['expiry']}-{pos['type']}"
-            option_live_info = live_option_data.get(option_key)
+            # Identifiant interné du contrat (déjà attribué à l'ingestion pour les positions chargées
+            # depuis un fichier) ; la clé texte des données live n'est construite qu'une fois par contrat
+            contract_id = pos.get("contract_id")
+            if contract_id is None:
+                contract_id = CONTRACTS.intern(ticker, strike, expiry_str, pos["type"])
+            option_live_info = live_option_data.get(CONTRACTS.label(contract_id))
 
             live_option_premium = np.nan
             implied_volatility = np.nan
             theoretical_premium = np.nan
+            theoretical_error = np.nan
             over_under_value = np.nan
             over_under_percent = np.nan
             historical_volatility = np.nan # Initialisation de la volatilité historique
+            surface_volatility = np.nan
+            if vol_surfaces and vol_surfaces.get(ticker) is not None and T > 0:
+                surface_volatility = vol_surfaces[ticker].sigma(strike, T) # Lookup O(1) sur la surface
+            atm_surface_volatility = np.nan
+            if vol_surfaces and vol_surfaces.get(ticker) is not None:
+                # IV ATM du sous-jacent (K = S, 30 jours) pour l'index IV, indépendante des contrats détenus
+                atm_surface_volatility = vol_surfaces[ticker].sigma(current_spot_price, ATM_TARGET_T)
 
             if option_live_info: 
                 live_option_premium = option_live_info.get("mid")
@@ -90,47 +235,37 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
                     live_option_premium = option_live_info.get("bid", option_live_info.get("ask"))
                 
                 # --- Calcul de la Volatilité Historique (HV) ---
-                historical_volatility = calculate_historical_volatility(ticker) # Récupération de la HV
-                if pd.isna(historical_volatility) or historical_volatility == 0:
-                    print(f"Avertissement: Volatilité historique non disponible ou nulle pour {ticker}. Utilisation d'une valeur par défaut de 0.20.")
-                    historical_volatility = 0.20 # Valeur par défaut si HV non disponible ou nulle
+                historical_volatility = _historical_volatility(ticker, historical_volatilities)
                 
-                # --- Calcul de la Volatilité Implicite (IV) ---
-                # On ne calcule l'IV que pour les calls car le modèle binomial américain est un call
-                if pos["type"] == "call" and pd.notna(live_option_premium) and T > 0 and current_spot_price > 0 and strike > 0 and live_option_premium > 0:
-                    try:
-                        implied_volatility = get_implied_volatility_for_option(
-                            ticker=ticker,
-                            strike=strike,
-                            expiry=pos["expiry"], 
-                            spot_price=current_spot_price,
-                            risk_free_rate=risk_free_rate,
-                            dividend_yield=ticker_dividend_yield,
-                            option_type="call", # Toujours "call" pour l'IV
-                            market_price=live_option_premium
-                        )
-                    except Exception as e:
-                        print(f"Erreur lors du calcul de l'IV pour {ticker} {strike} {pos['expiry']}: {e}")
-                        implied_volatility = np.nan
-                
-                # --- Calcul du prix théorique avec le modèle binomial (utilisant la Volatilité Historique) ---
-                theoretical_premium = np.nan # Initialisation
-                # Nous utilisons la HV ici pour le prix théorique comme convenu
-                if pos["type"] == "call" and pd.notna(historical_volatility) and T > 0 and current_spot_price > 0 and strike > 0:
-                    try:
-                        theoretical_premium = binomial_tree_american_call(
-                            S=current_spot_price,
-                            K=strike,
-                            T=T,
-                            r=risk_free_rate,
-                            sigma=historical_volatility, # <<< UTILISATION DE LA VOLATILITÉ HISTORIQUE
-                            q=ticker_dividend_yield,
-                            N=500 # Nombre de pas pour l'arbre binomial
-                        )
-                    except Exception as e:
-                        print(f"Erreur lors du calcul du prix théorique binomial pour {ticker} {strike} {pos['expiry']}: {e}")
-                        theoretical_premium = np.nan
+                # --- IV et prix théorique : calculés une seule fois par contrat ---
+                cached_pricing = pricing_cache.get(contract_id)
+                if cached_pricing is not None:
+                    implied_volatility, theoretical_premium, theoretical_error = cached_pricing
+                else:
+                    # --- Calcul de la Volatilité Implicite (IV) ---
+                    # On ne calcule l'IV que pour les calls car le modèle binomial américain est un call
+                    if pos["type"] == "call" and pd.notna(live_option_premium) and T > 0 and current_spot_price > 0 and strike > 0 and live_option_premium > 0:
+                        try:
+                            implied_volatility = get_implied_volatility_for_option(
+                                ticker=ticker,
+                                strike=strike,
+                                expiry=expiry_str, 
+                                spot_price=current_spot_price,
+                                risk_free_rate=contract_rate,
+                                dividend_yield=ticker_dividend_yield,
+                                option_type="call", # Toujours "call" pour l'IV
+                                market_price=live_option_premium
+                            )
+                        except Exception as e:
+                            print(f"Erreur lors du calcul de l'IV pour {ticker} {strike} {expiry_str}: {e}")
+                            implied_volatility = np.nan
                 
+                    # --- Prix théorique avec le modèle binomial (utilisant la Volatilité Historique) ---
+                    # Calculé en amont sur l'arbre partagé du (sous-jacent, échéance), voir _shared_lattice_prices
+                    theoretical_premium = lattice_prices.get(contract_id, np.nan)
+                    theoretical_error = lattice_errors.get(contract_id, np.nan)
+                    pricing_cache[contract_id] = (implied_volatility, theoretical_premium, theoretical_error)
+
                 # --- Calcul de la sur/sous-évaluation ---
                 if pd.notna(live_option_premium) and pd.notna(theoretical_premium):
                     over_under_value = live_option_premium - theoretical_premium
@@ -140,27 +275,33 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
                         over_under_percent = np.nan 
 
             # Ajouter les détails de valorisation des options
-            options_valuation_details.append({
-                "ticker": ticker,
-                "strike": strike,
-                "expiry": pos["expiry"],
-                "type": pos["type"],
-                "market_price": live_option_premium,
-                "theoretical_price": theoretical_premium,
-                "implied_volatility": implied_volatility,
-                "historical_volatility": historical_volatility, # AJOUT DE LA VOLATILITÉ HISTORIQUE
-                "over_under_value": over_under_value,
-                "over_under_percent": over_under_percent,
-                "risk_free_rate": risk_free_rate, # Ajout pour être complet
-                "dividend_yield": ticker_dividend_yield, # Ajout pour être complet
-                "time_to_expiry": T # Ajout pour être complet
-            })
+            options_valuation_details.append(OptionValuation(
+                ticker=ticker,
+                strike=strike,
+                expiry=expiry_str,
+                type=pos["type"],
+                market_price=live_option_premium,
+                theoretical_price=theoretical_premium,
+                theoretical_error=theoretical_error,
+                implied_volatility=implied_volatility,
+                historical_volatility=historical_volatility, # AJOUT DE LA VOLATILITÉ HISTORIQUE
+                over_under_value=over_under_value,
+                over_under_percent=over_under_percent,
+                risk_free_rate=contract_rate, # Ajout pour être complet
+                dividend_yield=ticker_dividend_yield, # Ajout pour être complet
+                time_to_expiry=T, # Ajout pour être complet
+                surface_volatility=surface_volatility,
+                atm_surface_volatility=atm_surface_volatility,
+                spot_price=current_spot_price, # Spot de la valorisation (explication du P&L d'une exécution à l'autre)
+                contract_id=contract_id
+            ))
 
             # Calcul de la valeur de marché et P&L pour le DataFrame principal
             mkt_val = live_option_premium * pos["qty"] * 100 # Multiplier par 100 car une option contrôle 100 actions
             
             # Purchase value est le prix d'achat d'une option multiplié par 100 (pour 1 contrat)
-            purchase_premium_raw = float(pos["purchase_premium"]) if pos["purchase_premium"] != "XX" else np.nan
+            purchase_premium = parse_cost(pos.get("purchase_premium"))
+            purchase_premium_raw = purchase_premium if purchase_premium is not None else np.nan
             purchase_value_contract = purchase_premium_raw * 100 if pd.notna(purchase_premium_raw) else np.nan # Valeur par contrat
             
             pnl_val = (live_option_premium * 100 - purchase_value_contract) * pos["qty"] if pd.notna(purchase_value_contract) else np.nan
@@ -177,20 +318,53 @@ def analyze_portfolio(positions, live_prices, risk_free_rate, dividend_yields_by
         "Ticker", "Type", "Quantité", "Prix Achat (€/contrat)", "Prix Spot Actuel", "Strike", "Échéance", "Jours Restants", "Valeur Marché (€)", "P&L (€)"
     ])
 
-    # Résumé du portefeuille
-    total_value = df["Valeur Marché (€)"].sum() if not df["Valeur Marché (€)"].empty else 0
-    total_pnl = df["P&L (€)"].dropna().sum() if not df["P&L (€)"].dropna().empty else 0
+    return df, summarize_portfolio(portfolio_totals(df)), options_valuation_details
+
+
+def portfolio_totals(df):
+    """
+    Calcule les agrégats additifs d'un DataFrame de positions (sortie de analyze_portfolio).
+    Ces totaux peuvent être additionnés entre plusieurs lots de positions
+    (voir merge_portfolio_totals) puis convertis en résumé avec summarize_portfolio.
+
+    Retourne:
+    dict: Valeur totale, P&L total, valeur options/ETF, somme et nombre des jours restants des options.
+    """
+    is_option = df['Type'].isin(['call', 'put'])
+    option_days = pd.to_numeric(df.loc[is_option, 'Jours Restants'], errors='coerce').dropna()
+    return {
+        "total_value": df["Valeur Marché (€)"].sum() if not df["Valeur Marché (€)"].empty else 0,
+        "total_pnl": df["P&L (€)"].dropna().sum() if not df["P&L (€)"].dropna().empty else 0,
+        "options_value": df.loc[is_option, "Valeur Marché (€)"].sum(),
+        "etf_value": df.loc[df['Type'] == 'etf', "Valeur Marché (€)"].sum(),
+        "option_days_sum": float(option_days.sum()),
+        "option_count": int(option_days.count()),
+    }
+
+
+def merge_portfolio_totals(totals_a, totals_b):
+    """
+    Additionne deux dictionnaires de totaux produits par portfolio_totals.
+    """
+    return {key: totals_a[key] + totals_b[key] for key in totals_a}
+
+
+def summarize_portfolio(totals):
+    """
+    Construit le résumé du portefeuille (format attendu par le reporter) à partir des totaux.
+    """
+    total_value = totals["total_value"]
 
     summary = {
         "Valeur totale portefeuille ": total_value,
-        "P&L total portefeuille ": total_pnl,
-        "Exposition options ": df[df['Type'].isin(['call', 'put'])]["Valeur Marché (€)"].sum() / total_value * 100 if total_value > 0 else 0,
-        "Exposition ETF ": df[df['Type'] == 'etf']["Valeur Marché (€)"].sum() / total_value * 100 if total_value > 0 else 0,
-        "Durée moyenne (jours)": df[df['Type'].isin(['call', 'put'])]['Jours Restants'].replace('-', np.nan).dropna().mean() if not df[df['Type'].isin(['call', 'put'])].empty and 'Jours Restants' in df.columns else 0
+        "P&L total portefeuille ": totals["total_pnl"],
+        "Exposition options ": totals["options_value"] / total_value * 100 if total_value > 0 else 0,
+        "Exposition ETF ": totals["etf_value"] / total_value * 100 if total_value > 0 else 0,
+        "Durée moyenne (jours)": totals["option_days_sum"] / totals["option_count"] if totals["option_count"] > 0 else 0
     }
 
     # Assurez-vous que les pourcentages sont bien formatés dans le résumé final
     summary["Exposition options "] = f"{summary['Exposition options ']:.2f}%"
     summary["Exposition ETF "] = f"{summary['Exposition ETF ']:.2f}%"
 
-    return df, summary, options_valuation_details
+    return summary
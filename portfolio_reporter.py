@@ -3,7 +3,10 @@ import pandas as pd
 from datetime import datetime
 import numpy as np # Assurez-vous d'importer numpy car nous utilisons np.nan
 
-def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation_details):
+MAX_REPORTED_ALERTS = 50 # Les alertes les plus sévères d'abord ; le reste est résumé en une ligne
+
+def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation_details, pnl_explain=None, risk_alerts=None,
+                              strategies=None, portfolio_risk=None):
     """
     Génère un rapport de portefeuille formaté en HTML avec des styles inline
     pour une compatibilité maximale avec les clients de messagerie (y compris Gmail).
@@ -12,6 +15,10 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
     df_portfolio (pd.DataFrame): DataFrame détaillé du portefeuille.
     portfolio_summary (dict): Dictionnaire récapitulatif du portefeuille.
     options_valuation_details (list): Liste des dictionnaires avec les détails de valorisation des options. 
+    pnl_explain (dict): Explication du P&L depuis l'exécution précédente (voir pnl_explain.explain_runs), optionnelle.
+    risk_alerts (list): Alertes de risque actives (voir risk_rules.RiskEngine.active_alerts), optionnelles.
+    strategies (list): Stratégies multi-jambes (voir strategies.analyze_strategies), optionnelles.
+    portfolio_risk (dict): Volatilité et contributions au risque (voir portfolio_risk.risk_contributions), optionnelles.
 
     Retourne:
     str: Le rapport formaté en HTML.
@@ -82,6 +89,34 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
     html_parts.append("</div>") # Fin du padding
     html_parts.append("</div>") # Fin de la section
 
+    # --- Alertes de risque actives (moteur de règles, si fourni) ---
+    if risk_alerts is not None:
+        severity_colors = {"critical": "#c0392b", "warning": "#e67e22", "info": "#2980b9"}
+        html_parts.append(f"<div style=\"{section_style}\">")
+        html_parts.append("<h2 style=\"color: #2c3e50; text-align: center;\">Alertes de Risque</h2>")
+        if not risk_alerts:
+            html_parts.append("<p style=\"text-align: center; color: #27ae60;\">Aucune limite de risque dépassée.</p>")
+        else:
+            html_parts.append(f"<table style=\"{table_style}\">")
+            html_parts.append("<thead><tr>")
+            for header in ("Sévérité", "Règle", "Sujet", "Condition", "Valeur"):
+                html_parts.append(f"<th style=\"{th_td_style} {th_style}\">{header}</th>")
+            html_parts.append("</tr></thead>")
+            html_parts.append("<tbody>")
+            for rule_name, severity, subject, value, condition in risk_alerts[:MAX_REPORTED_ALERTS]:
+                html_parts.append("<tr>")
+                html_parts.append(f"<td style=\"{th_td_style} color: {severity_colors.get(severity, '#333')}; font-weight: bold;\">{severity.upper()}</td>")
+                html_parts.append(f"<td style=\"{th_td_style}\">{rule_name}</td>")
+                html_parts.append(f"<td style=\"{th_td_style}\">{subject}</td>")
+                html_parts.append(f"<td style=\"{th_td_style}\">{condition}</td>")
+                html_parts.append(f"<td style=\"{th_td_style}\">{value:,.2f}</td>" if value is not None and pd.notna(value) else f"<td style=\"{th_td_style}\">-</td>")
+                html_parts.append("</tr>")
+            html_parts.append("</tbody>")
+            html_parts.append("</table>")
+            if len(risk_alerts) > MAX_REPORTED_ALERTS:
+                html_parts.append(f"<p style=\"font-size: 0.85em; color: #7f8c8d;\">... et {len(risk_alerts) - MAX_REPORTED_ALERTS} autre(s) alerte(s) active(s).</p>")
+        html_parts.append("</div>")
+
     # --- Détail des Positions ---
     html_parts.append(f"<div style=\"{section_style}\">")
     html_parts.append("<h2 style=\"color: #2c3e50; text-align: center;\">Détail des Positions</h2>")
@@ -146,6 +181,7 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
             
             market_price = opt.get('market_price')
             theoretical_price = opt.get('theoretical_price')
+            theoretical_error = opt.get('theoretical_error') # Erreur estimée (valorisation progressive)
             implied_volatility = opt.get('implied_volatility')
             historical_volatility = opt.get('historical_volatility') # Récupérer la volatilité historique
             over_under_value = opt.get('over_under_value')
@@ -160,7 +196,8 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
                 html_parts.append(f"<p style=\"{option_item_style}\">Prix du marché (Live) : <span style=\"color: #e74c3c;\">Non disponible</span></p>")
 
             if pd.notna(theoretical_price):
-                html_parts.append(f"<p style=\"{option_item_style}\">Prix théorique (Modèle Binomial) : <strong style=\"color: #8e44ad;\">{theoretical_price:.2f}€</strong></p>")
+                error_text = f" <span style=\"color: #7f8c8d;\">± {theoretical_error:.2f}€</span>" if pd.notna(theoretical_error) else ""
+                html_parts.append(f"<p style=\"{option_item_style}\">Prix théorique (Modèle Binomial) : <strong style=\"color: #8e44ad;\">{theoretical_price:.2f}€</strong>{error_text}</p>")
             else:
                 html_parts.append(f"<p style=\"{option_item_style}\">Prix théorique (Modèle Binomial) : <span style=\"color: #e74c3c;\">Non calculé</span></p>")
             
@@ -169,12 +206,25 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
             else:
                 html_parts.append(f"<p style=\"{option_item_style}\">Volatilité Implicite : <span style=\"color: #7f8c8d;\">Non calculée</span></p>")
 
+            # Position de l'IV dans son propre historique sur un an (index IV, si fourni)
+            iv_rank = opt.get('iv_rank')
+            atm_iv_rank = opt.get('atm_iv_rank')
+            if iv_rank is not None and pd.notna(iv_rank):
+                html_parts.append(f"<p style=\"{option_item_style}\">IV Rank (1 an) : <strong style=\"color: #f39c12;\">{iv_rank:.0f}%</strong> | IV Percentile : <strong style=\"color: #f39c12;\">{opt.get('iv_percentile'):.0f}%</strong></p>")
+            if atm_iv_rank is not None and pd.notna(atm_iv_rank):
+                html_parts.append(f"<p style=\"{option_item_style}\">IV ATM {opt['ticker']} (1 an) : Rank <strong>{atm_iv_rank:.0f}%</strong> | Percentile <strong>{opt.get('atm_iv_percentile'):.0f}%</strong></p>")
+
             # Affichage de la volatilité historique
             if pd.notna(historical_volatility):
                 html_parts.append(f"<p style=\"{option_item_style}\">Volatilité Historique (passé) : <strong style=\"color: #16a085;\">{historical_volatility:.2%}</strong></p>")
             else:
                 html_parts.append(f"<p style=\"{option_item_style}\">Volatilité Historique : <span style=\"color: #7f8c8d;\">Non disponible</span></p>")
 
+            # Volatilité lue sur la surface du sous-jacent (si construite)
+            surface_volatility = opt.get('surface_volatility')
+            if surface_volatility is not None and pd.notna(surface_volatility):
+                html_parts.append(f"<p style=\"{option_item_style}\">Volatilité de Surface (SVI) : <strong style=\"color: #d35400;\">{surface_volatility:.2%}</strong></p>")
+
             interpretation = ""
             interpretation_style = ""
 
@@ -210,9 +260,106 @@ def get_portfolio_report_html(df_portfolio, portfolio_summary, options_valuation
                 interpretation = "Impossible de calculer la sur/sous-évaluation pour cette option."
                 interpretation_style = "color: #7f8c8d;"
 
+            # Niveau de l'IV par rapport à sa fourchette sur un an
+            if iv_rank is not None and pd.notna(iv_rank):
+                if iv_rank >= 80:
+                    interpretation += f"<br>L'IV est dans le haut de sa fourchette sur un an (IV rank {iv_rank:.0f}%) : les options sont chères par rapport à leur propre historique."
+                elif iv_rank <= 20:
+                    interpretation += f"<br>L'IV est dans le bas de sa fourchette sur un an (IV rank {iv_rank:.0f}%) : les options sont bon marché par rapport à leur propre historique."
+
             html_parts.append(f"<p style=\"{option_item_style} {interpretation_style}\">{interpretation}</p>")
             html_parts.append("</div>")
 
+    # --- Stratégies multi-jambes (jambes d'un même sous-jacent et d'une même échéance) ---
+    if strategies:
+        html_parts.append(f"<div style=\"{section_style}\">")
+        html_parts.append("<h2 style=\"color: #2c3e50; text-align: center;\">Stratégies Multi-Jambes</h2>")
+        html_parts.append(f"<table style=\"{table_style}\">")
+        html_parts.append("<thead><tr>")
+        for header in ("Sous-jacent", "Échéance", "Stratégie", "Prime nette", "Valeur marché", "Valeur théorique",
+                       "P&L", "Perte max", "Gain max", "Points morts"):
+            html_parts.append(f"<th style=\"{th_td_style} {th_style}\">{header}</th>")
+        html_parts.append("</tr></thead>")
+        html_parts.append("<tbody>")
+        for strategy in strategies:
+            def amount(value):
+                return "illimité" if np.isinf(value) else f"{value:,.2f}€"
+            pnl_color = "green" if strategy["pnl"] > 0 else "red" if strategy["pnl"] < 0 else "#333"
+            breakevens = ", ".join(f"{price:.2f}" for price in strategy["breakevens"]) or "-"
+            html_parts.append("<tr>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['ticker']}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['expiry']}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['label']} ({len(strategy['legs'])} jambes)</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['net_premium']:,.2f}€{'*' if strategy['estimated_cost'] else ''}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['market_value']:,.2f}€</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{strategy['theoretical_value']:,.2f}€</td>")
+            html_parts.append(f"<td style=\"{th_td_style} color: {pnl_color};\">{strategy['pnl']:,.2f}€</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{amount(strategy['max_loss'])}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{amount(strategy['max_gain'])}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{breakevens}</td>")
+            html_parts.append("</tr>")
+        html_parts.append("</tbody>")
+        html_parts.append("</table>")
+        html_parts.append("<p style=\"font-size: 0.85em; color: #7f8c8d;\">Perte et gain maximaux et points morts à l'échéance ; "
+                          "valeur théorique sur un arbre binomial américain partagé par les jambes (HV). "
+                          "* prime d'achat inconnue pour au moins une jambe, remplacée par le prix de marché.</p>")
+        html_parts.append("</div>")
+
+    # --- Volatilité du portefeuille et contributions au risque par sous-jacent ---
+    if portfolio_risk is not None and portfolio_risk["contributions"]:
+        html_parts.append(f"<div style=\"{section_style}\">")
+        html_parts.append("<h2 style=\"color: #2c3e50; text-align: center;\">Contributions au Risque</h2>")
+        html_parts.append(f"<p>Volatilité annuelle du portefeuille (expositions delta) : <strong>{portfolio_risk['volatility']:,.2f}€</strong></p>")
+        html_parts.append(f"<table style=\"{table_style}\">")
+        html_parts.append("<thead><tr>")
+        for header in ("Sous-jacent", "Exposition delta", "Volatilité", "Contribution marginale", "Contribution", "Part du risque"):
+            html_parts.append(f"<th style=\"{th_td_style} {th_style}\">{header}</th>")
+        html_parts.append("</tr></thead>")
+        html_parts.append("<tbody>")
+        for row in portfolio_risk["contributions"]:
+            html_parts.append("<tr>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['ticker']}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['exposure']:,.2f}€</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['volatility'] * 100:.2f}%</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['marginal']:.4f}</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['component']:,.2f}€</td>")
+            html_parts.append(f"<td style=\"{th_td_style}\">{row['component_pct']:.2f}%</td>")
+            html_parts.append("</tr>")
+        html_parts.append("</tbody>")
+        html_parts.append("</table>")
+        footnote = ("Covariance EWMA des rendements quotidiens, rétrécie vers la corrélation constante. "
+                    "Les contributions s'additionnent à la volatilité du portefeuille ; une contribution négative réduit le risque.")
+        if portfolio_risk["uncovered"]:
+            footnote += f" Sans historique suffisant (exclus) : {', '.join(portfolio_risk['uncovered'])}."
+        html_parts.append(f"<p style=\"font-size: 0.85em; color: #7f8c8d;\">{footnote}</p>")
+        html_parts.append("</div>")
+
+    # --- Explication du P&L depuis l'exécution précédente ---
+    if pnl_explain is not None:
+        from pnl_explain import TERM_LABELS, TERMS
+        explain_columns = list(TERMS) + ["total"]
+        html_parts.append(f"<div style=\"{section_style}\">")
+        html_parts.append("<h2 style=\"color: #2c3e50; text-align: center;\">Explication du P&L depuis la dernière exécution</h2>")
+        html_parts.append(f"<table style=\"{table_style}\">")
+        html_parts.append("<thead><tr>")
+        for header in ["Ticker"] + [TERM_LABELS[name] for name in explain_columns]:
+            html_parts.append(f"<th style=\"{th_td_style} {th_style}\">{header}</th>")
+        html_parts.append("</tr></thead>")
+        html_parts.append("<tbody>")
+        for ticker, row in pnl_explain["by_ticker"].iterrows():
+            row_style = " font-weight: bold;" if ticker == "Portefeuille" else ""
+            html_parts.append("<tr>")
+            html_parts.append(f"<td style=\"{th_td_style}{row_style}\">{ticker}</td>")
+            for name in explain_columns:
+                color = "green" if row[name] > 0 else "red" if row[name] < 0 else "#333"
+                html_parts.append(f"<td style=\"{th_td_style} color: {color};{row_style}\">{row[name]:,.2f}€</td>")
+            html_parts.append("</tr>")
+        html_parts.append("</tbody>")
+        html_parts.append("</table>")
+        html_parts.append(f"<p style=\"font-size: 0.85em; color: #7f8c8d;\">{pnl_explain['new_instruments']} instrument(s) ouvert(s) "
+                          f"et {pnl_explain['closed_instruments']} fermé(s) depuis l'exécution précédente (non expliqués).</p>")
+        html_parts.append("</div>")
+
     # --- Ajout de la signature ---
     footer_style = "margin-top: 30px; font-size: 0.85em; color: #777; text-align: center; border-top: 1px solid #eee; padding-top: 15px;"
     signature_style = "font-style: italic;"
@@ -0,0 +1,387 @@
+# portfolio_risk.py
+"""
+Volatilité du portefeuille et décomposition du risque par sous-jacent.
+
+EWMACovariance maintient la covariance des rendements logarithmiques quotidiens des
+sous-jacents, à pondération exponentielle et moyenne nulle (RiskMetrics) :
+    S_t = λ S_t-1 + (1 - λ) r_t r_tᵀ
+Chaque nouvelle barre est une mise à jour de rang 1 en O(n²) : l'historique complet n'est lu
+qu'à l'amorçage (un produit matriciel pondéré). La somme des poids est tenue par paire de
+tickers, ce qui accepte des historiques de longueurs différentes (ticker ajouté en cours de
+route, jour sans cotation) sans biaiser les autres paires.
+
+Avec quelques centaines de sous-jacents et une mémoire effective de quelques dizaines de
+séances, la covariance empirique est mal conditionnée : elle est rétrécie (shrinkage) vers une
+matrice à corrélation constante (mêmes variances, corrélation moyenne entre toutes les paires),
+d'autant plus que le nombre de tickers est grand devant le nombre effectif d'observations.
+
+risk_contributions combine la covariance et les expositions delta (€ par sous-jacent) :
+volatilité du portefeuille, contribution marginale (dσ/dw) et contribution de chaque
+sous-jacent (w x marginale, dont la somme est la volatilité du portefeuille).
+"""
+import math
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+from realized_volatility import TRADING_DAYS_PER_YEAR
+
+DEFAULT_LAMBDA = 0.97 # Mémoire effective d'environ 65 séances
+MIN_OBSERVATIONS = 20 # En dessous, la variance d'un ticker n'est pas utilisée
+SEED_PERIOD = "1y" # Historique téléchargé pour amorcer un ticker
+CATCH_UP_PERIOD = "1mo" # Historique téléchargé pour rattraper les barres manquantes
+CATCH_UP_DAYS = 25
+
+
+class EWMACovariance:
+    """
+    Covariance EWMA incrémentale des rendements quotidiens, persistée entre les exécutions (.npz).
+
+    Paramètres:
+    path (str): Fichier de persistance (chargé s'il existe), optionnel.
+    ewma_lambda (float): Facteur de décroissance λ.
+    shrinkage (float): Intensité du rétrécissement dans [0, 1]. Par défaut : k / (k + N_eff), où k est le
+                       nombre de tickers et N_eff = (1 + λ) / (1 - λ) le nombre effectif d'observations.
+    """
+
+    def __init__(self, path=None, ewma_lambda=DEFAULT_LAMBDA, shrinkage=None):
+        self.path = path
+        self.ewma_lambda = ewma_lambda
+        self.shrinkage = shrinkage
+        self.tickers = []
+        self._index = {}
+        self._cov = np.zeros((0, 0)) # Somme pondérée des r_i r_j
+        self._weight = np.zeros((0, 0)) # Somme des poids (1 - λ) λ^k des observations de chaque paire
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._last_close = np.zeros(0)
+        self.last_date = None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path, allow_pickle=False) as payload:
+                    if float(payload["ewma_lambda"]) != ewma_lambda:
+                        raise ValueError(f"λ enregistré {float(payload['ewma_lambda'])} différent de {ewma_lambda}")
+                    self.tickers = [str(ticker) for ticker in payload["tickers"]]
+                    self._cov, self._weight = payload["cov"], payload["weight"]
+                    self._counts, self._last_close = payload["counts"], payload["last_close"]
+                    last_date = str(payload["last_date"])
+                    self.last_date = date.fromisoformat(last_date) if last_date else None
+                self._index = {ticker: i for i, ticker in enumerate(self.tickers)}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Avertissement: Modèle de covariance illisible ({path}) : {e}. Nouveau modèle.")
+                self.__init__(None, ewma_lambda, shrinkage)
+                self.path = path
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def effective_observations(self):
+        return (1 + self.ewma_lambda) / (1 - self.ewma_lambda)
+
+    def _add_tickers(self, tickers):
+        """
+        Agrandit les matrices pour de nouveaux tickers (lignes et colonnes nulles : aucune observation).
+        """
+        tickers = [ticker for ticker in dict.fromkeys(tickers) if ticker not in self._index]
+        if not tickers:
+            return
+        n, size = len(self.tickers), len(self.tickers) + len(tickers)
+        for name in ("_cov", "_weight"):
+            grown = np.zeros((size, size))
+            grown[:n, :n] = getattr(self, name)
+            setattr(self, name, grown)
+        self._counts = np.concatenate((self._counts, np.zeros(len(tickers), dtype=np.int64)))
+        self._last_close = np.concatenate((self._last_close, np.full(len(tickers), np.nan)))
+        for ticker in tickers:
+            self._index[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+
+    def update(self, day, closes):
+        """
+        Ajoute la barre du jour `day` : mise à jour de rang 1 en O(n²).
+
+        Paramètres:
+        day (date): Date de la barre (ignorée si elle n'est pas postérieure à last_date).
+        closes (dict ou pd.Series): Ticker -> cours de clôture. Les tickers absents n'ont pas d'observation ce jour-là.
+
+        Retourne:
+        bool: True si la barre a été appliquée.
+        """
+        day = day.date() if isinstance(day, datetime) else day
+        if self.last_date is not None and day <= self.last_date:
+            return False
+        closes = {ticker: float(close) for ticker, close in closes.items() if close is not None and close > 0}
+        self._add_tickers(closes)
+        index = np.array([self._index[ticker] for ticker in closes], dtype=np.int64)
+        values = np.array(list(closes.values()), dtype=float)
+        previous = self._last_close[index]
+        observed = previous > 0 # Faux pour un ticker sans clôture précédente (NaN)
+
+        lam = self.ewma_lambda
+        self._cov *= lam # Les paires non observées vieillissent aussi : leur ratio cov / poids ne change pas
+        self._weight *= lam
+        rows, returns = index[observed], np.log(values[observed] / previous[observed])
+        if rows.size == len(self.tickers): # Cas courant : tous les tickers cotés, pas de copie indexée
+            order = np.argsort(rows)
+            returns = returns[order]
+            self._cov += (1 - lam) * np.multiply.outer(returns, returns)
+            self._weight += 1 - lam
+        elif rows.size:
+            block = np.ix_(rows, rows)
+            self._cov[block] += (1 - lam) * np.multiply.outer(returns, returns)
+            self._weight[block] += 1 - lam
+        self._counts[rows] += 1
+        self._last_close[index] = values
+        self.last_date = day
+        return True
+
+    def add_history(self, closes):
+        """
+        Intègre un historique de clôtures. Les tickers inconnus sont amorcés en une fois sur les barres
+        antérieures ou égales à last_date (produit matriciel pondéré par l'âge de chaque barre, leurs
+        covariances avec les tickers déjà suivis comprises) ; les barres postérieures sont ensuite
+        appliquées une à une par update.
+
+        Paramètres:
+        closes (pd.DataFrame): Clôtures (index : dates croissantes, colonnes : tickers).
+
+        Retourne:
+        int: Nombre de barres appliquées par update.
+        """
+        closes = closes.sort_index()
+        dates = [day.date() if isinstance(day, datetime) else day for day in closes.index]
+        new_tickers = [ticker for ticker in closes.columns if ticker not in self._index]
+        cutoff = self.last_date if self.last_date is not None else (dates[-1] if dates else None)
+        seed_rows = sum(day <= cutoff for day in dates) if cutoff is not None else 0
+
+        if new_tickers and seed_rows > 1:
+            seed = closes.iloc[:seed_rows]
+            self._add_tickers(new_tickers)
+            columns = [self._index[ticker] for ticker in seed.columns]
+            new_columns = [seed.columns.get_loc(ticker) for ticker in new_tickers]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.diff(np.log(seed.to_numpy(dtype=float)), axis=0)
+            known = np.isfinite(returns)
+            returns = np.where(known, returns, 0.0)
+            # Barre la plus récente : poids (1 - λ), comme la dernière mise à jour du modèle
+            weights = (1 - self.ewma_lambda) * self.ewma_lambda ** np.arange(len(returns) - 1, -1, -1)
+            cov_block = (returns[:, new_columns] * weights[:, None]).T @ returns
+            weight_block = (known[:, new_columns] * weights[:, None]).T @ known
+            rows = [self._index[ticker] for ticker in new_tickers]
+            for matrix, block in ((self._cov, cov_block), (self._weight, weight_block)):
+                matrix[np.ix_(rows, columns)] = block
+                matrix[np.ix_(columns, rows)] = block.T
+            self._counts[rows] = known[:, new_columns].sum(axis=0)
+            last_close = seed.iloc[:, new_columns].ffill().iloc[-1].to_numpy(dtype=float)
+            self._last_close[rows] = last_close
+            self.last_date = cutoff
+
+        applied = 0
+        for day, (_, row) in zip(dates, closes.iterrows()):
+            if self.last_date is None or day > self.last_date:
+                applied += self.update(day, row.dropna())
+        return applied
+
+    def refresh(self, tickers):
+        """
+        Met le modèle à jour pour `tickers` auprès du fournisseur de données courant (voir market_data_provider) :
+        un an d'historique si un ticker est nouveau ou si le modèle n'a pas été mis à jour depuis plus d'un mois,
+        sinon le dernier mois (seules les barres postérieures à last_date sont appliquées).
+
+        Retourne:
+        int: Nombre de barres appliquées.
+        """
+        import pandas as pd
+        from market_data_provider import get_provider
+
+        tickers = sorted(set(tickers))
+        if not tickers:
+            return 0
+        stale = self.last_date is None or (date.today() - self.last_date).days > CATCH_UP_DAYS
+        period = SEED_PERIOD if stale or any(ticker not in self._index for ticker in tickers) else CATCH_UP_PERIOD
+        data = get_provider().history(tickers, period=period, auto_adjust=True, group_by="column")
+        if data is None or data.empty:
+            raise ValueError(f"Aucun historique de cours trouvé pour {', '.join(tickers)}.")
+        closes = data["Close"]
+        closes = closes.to_frame(tickers[0]) if isinstance(closes, pd.Series) else closes
+        return self.add_history(closes.dropna(how="all"))
+
+    def covariance(self, tickers=None):
+        """
+        Covariance quotidienne rétrécie vers la corrélation constante.
+
+        Paramètres:
+        tickers (list): Tickers voulus (tous par défaut). Ceux qui ont moins de MIN_OBSERVATIONS rendements sont écartés.
+
+        Retourne:
+        list: Tickers retenus, dans l'ordre des lignes de la matrice.
+        np.ndarray: Matrice de covariance (k x k).
+        """
+        tickers = self.tickers if tickers is None else [ticker for ticker in dict.fromkeys(tickers) if ticker in self._index]
+        tickers = [ticker for ticker in tickers if self._counts[self._index[ticker]] >= MIN_OBSERVATIONS]
+        index = np.array([self._index[ticker] for ticker in tickers], dtype=np.int64)
+        k = index.size
+        if k == 0:
+            return tickers, np.zeros((0, 0))
+
+        block = np.ix_(index, index)
+        weight = self._weight[block]
+        paired = weight > 1e-12
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sample = np.where(paired, self._cov[block] / weight, np.nan)
+            volatility = np.sqrt(np.diag(sample))
+            correlation = np.clip(sample / np.multiply.outer(volatility, volatility), -1.0, 1.0)
+        off_diagonal = paired & ~np.eye(k, dtype=bool)
+        mean_correlation = float(np.mean(correlation[off_diagonal])) if off_diagonal.any() else 0.0
+        if k > 1: # Cible semi-définie positive : corrélation constante >= -1 / (k - 1)
+            mean_correlation = max(mean_correlation, -1.0 / (k - 1))
+        intensity = self.shrinkage if self.shrinkage is not None else k / (k + self.effective_observations)
+
+        # Paires jamais observées ensemble : la cible seule
+        shrunk = np.where(paired, (1 - intensity) * correlation + intensity * mean_correlation, mean_correlation)
+        np.fill_diagonal(shrunk, 1.0)
+        return tickers, shrunk * np.multiply.outer(volatility, volatility)
+
+    def volatilities(self, tickers=None):
+        """
+        Volatilités annualisées (dict ticker -> volatilité), ex. à comparer aux HV de l'analyse.
+        """
+        tickers, covariance = self.covariance(tickers)
+        return dict(zip(tickers, np.sqrt(np.diag(covariance) * TRADING_DAYS_PER_YEAR)))
+
+    def portfolio_risk(self, df_portfolio, options_valuation_details):
+        """
+        Décomposition du risque d'un portefeuille analysé (expositions delta de risk_rules.RiskFrame).
+
+        Retourne:
+        dict: Voir risk_contributions.
+        """
+        from risk_rules import RiskFrame
+
+        frame = RiskFrame(df_portfolio, options_valuation_details)
+        exposures = dict(zip(frame.ticker_names, frame.ticker_metric("delta_dollars")))
+        tickers, covariance = self.covariance(list(exposures))
+        return risk_contributions(tickers, covariance, exposures)
+
+    def save(self, path=None):
+        """
+        Écrit le modèle (.npz compressé : matrices, dernières clôtures, nombre d'observations).
+        """
+        path = path or self.path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp.npz" # np.savez ajoute l'extension .npz si elle manque
+        np.savez_compressed(tmp_path, tickers=np.array(self.tickers, dtype=str), cov=self._cov, weight=self._weight,
+                            counts=self._counts, last_close=self._last_close, ewma_lambda=self.ewma_lambda,
+                            last_date=self.last_date.isoformat() if self.last_date else "")
+        os.replace(tmp_path, path)
+
+
+def risk_contributions(tickers, covariance, exposures):
+    """
+    Volatilité du portefeuille et contributions au risque par sous-jacent.
+
+    Paramètres:
+    tickers (list): Tickers des lignes de `covariance`.
+    covariance (np.ndarray): Covariance quotidienne des rendements (EWMACovariance.covariance).
+    exposures (dict): Exposition delta en € par ticker (les tickers hors de `tickers` sont non couverts).
+
+    Retourne:
+    dict: 'volatility' (écart-type annualisé de la valeur, en €), 'contributions' (liste de dicts par ticker :
+          'ticker', 'exposure', 'volatility' du sous-jacent, 'marginal' dσ/dw, 'component' w x marginale en €,
+          'component_pct' en % de la volatilité, triée par contribution décroissante) et 'uncovered'
+          (tickers exposés sans historique suffisant, exclus du calcul).
+    """
+    exposure = np.array([exposures[ticker] for ticker in tickers], dtype=float)
+    covariance = covariance * TRADING_DAYS_PER_YEAR
+    covariance_exposure = covariance @ exposure # O(k²) : une seule multiplication matrice-vecteur
+    volatility = math.sqrt(max(float(exposure @ covariance_exposure), 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        marginal = covariance_exposure / volatility if volatility > 0 else np.zeros_like(exposure)
+    component = exposure * marginal
+    contributions = [
+        {"ticker": ticker, "exposure": float(exposure[i]), "volatility": float(math.sqrt(covariance[i, i])),
+         "marginal": float(marginal[i]), "component": float(component[i]),
+         "component_pct": float(component[i] / volatility * 100) if volatility > 0 else 0.0}
+        for i, ticker in enumerate(tickers)
+    ]
+    contributions.sort(key=lambda row: -row["component"])
+    covered = set(tickers)
+    uncovered = [ticker for ticker, value in exposures.items() if ticker not in covered and value]
+    return {"volatility": volatility, "contributions": contributions, "uncovered": uncovered}
+
+
+def format_risk_contributions(risk, limit=20):
+    """
+    Tableau texte des contributions au risque (les `limit` premières).
+    """
+    header = (f"{'Ticker':<8} {'Exposition delta':>17} {'Vol. sous-jacent':>17} {'Marginale':>10} "
+              f"{'Contribution':>14} {'Part':>8}")
+    lines = [f"Volatilité annuelle du portefeuille : {risk['volatility']:,.2f}€", header, "-" * len(header)]
+    for row in risk["contributions"][:limit]:
+        lines.append(f"{row['ticker']:<8} {row['exposure']:>17,.2f} {row['volatility'] * 100:>16.2f}% "
+                     f"{row['marginal']:>10.4f} {row['component']:>14,.2f} {row['component_pct']:>7.2f}%")
+    if risk["uncovered"]:
+        lines.append(f"Sans historique suffisant (exclus) : {', '.join(risk['uncovered'])}")
+    return "\n".join(lines)
+
+
+# Pour tester ce module indépendamment : 500 sous-jacents synthétiques (modèle à un facteur),
+# amorçage, mise à jour incrémentale contre ré-estimation complète, puis décomposition
+if __name__ == "__main__":
+    import time
+
+    import pandas as pd
+
+    print("--- Test de portfolio_risk.py (données synthétiques) ---")
+    rng = np.random.default_rng(11)
+    n_dates, n_tickers = 300, 500
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.offsets.BDay(1), periods=n_dates)
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    betas = rng.uniform(0.5, 1.5, n_tickers)
+    idiosyncratic = rng.uniform(0.15, 0.45, n_tickers) / np.sqrt(TRADING_DAYS_PER_YEAR)
+    market_sigma = 0.18 / np.sqrt(TRADING_DAYS_PER_YEAR)
+    true_covariance = np.multiply.outer(betas, betas) * market_sigma**2 + np.diag(idiosyncratic**2)
+
+    def simulate(count):
+        return (rng.normal(0, market_sigma, (count, 1)) * betas
+                + rng.normal(0, 1, (count, n_tickers)) * idiosyncratic)
+
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(simulate(n_dates), axis=0)), index=dates, columns=tickers)
+    closes.iloc[:200, 450:] = np.nan # 50 tickers cotés depuis peu
+
+    start = time.perf_counter()
+    model = EWMACovariance()
+    model.add_history(closes.iloc[:-20]) # Amorçage en un produit matriciel...
+    seed_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for day, row in closes.iloc[-20:].iterrows(): # ... puis 20 barres incrémentales
+        model.update(day.date(), row.dropna())
+    update_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f"Amorçage ({n_tickers} tickers x {n_dates - 20} dates) : {seed_seconds * 1000:.0f} ms ; "
+          f"mise à jour d'une barre : {update_ms:.2f} ms ; mémoire : {(model._cov.nbytes + model._weight.nbytes) / 1e6:.1f} Mo")
+
+    start = time.perf_counter()
+    reference = EWMACovariance()
+    for day, row in closes.iterrows(): # Ré-estimation complète, barre par barre
+        reference.update(day.date(), row.dropna())
+    print(f"Ré-estimation complète : {(time.perf_counter() - start) * 1000:.0f} ms ; écart maximal avec l'incrémental : "
+          f"{np.nanmax(np.abs(model.covariance()[1] - reference.covariance()[1])):.2e}")
+
+    def relative_error(estimate):
+        return np.linalg.norm(estimate - true_covariance) / np.linalg.norm(true_covariance)
+
+    sample = EWMACovariance(shrinkage=0.0)
+    sample.add_history(closes)
+    print(f"Erreur relative (Frobenius) à la vraie covariance : empirique {relative_error(sample.covariance()[1]):.3f}, "
+          f"rétrécie {relative_error(model.covariance()[1]):.3f} (intensité {n_tickers / (n_tickers + model.effective_observations):.2f})")
+
+    exposures = dict(zip(tickers, rng.normal(0, 20_000, n_tickers)))
+    start = time.perf_counter()
+    risk = risk_contributions(*model.covariance(), exposures)
+    decomposition_ms = (time.perf_counter() - start) * 1000
+    total = sum(row["component"] for row in risk["contributions"])
+    print(f"Décomposition : {decomposition_ms:.1f} ms, somme des contributions {total:,.2f}€ "
+          f"pour une volatilité de {risk['volatility']:,.2f}€")
+    print(format_risk_contributions(risk, limit=5))
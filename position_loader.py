@@ -0,0 +1,269 @@
+# position_loader.py
+import csv
+import json
+import os
+from datetime import date, datetime
+
+from records import CONTRACTS, Position
+
+
+def parse_cost(value):
+    """
+    Normalise un prix d'achat (purchase_price / purchase_premium).
+    Accepte un float, une chaîne numérique, ou un marqueur de valeur inconnue
+    ("XX", "", None, NaN). Retourne un float, ou None si le coût est inconnu.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "" or value.upper() == "XX":
+            return None
+    value = float(value)
+    return None if value != value else value # NaN
+
+
+def format_expiry(expiry):
+    """
+    Retourne l'échéance au format 'YYYY-MM-DD', qu'elle soit fournie
+    sous forme de chaîne, de date ou de datetime.
+    """
+    if isinstance(expiry, str):
+        return expiry
+    return expiry.strftime("%Y-%m-%d")
+
+
+OPTION_TYPES = ("call", "put")
+POSITION_TYPES = ("stock", "etf") + OPTION_TYPES
+SUPPORTED_FORMATS = ("csv", "jsonl", "parquet")
+
+
+def _detect_format(path):
+    """
+    Déduit le format du fichier à partir de son extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"Format de fichier non reconnu pour {path}. Formats supportés : {', '.join(SUPPORTED_FORMATS)}.")
+
+
+def _iter_raw_records(path, fmt, chunk_size):
+    """
+    Itère sur les enregistrements bruts (dictionnaires) d'un fichier, sans jamais
+    charger plus d'un lot (chunk_size lignes) en mémoire.
+    """
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("La lecture de fichiers Parquet nécessite pyarrow (pip install pyarrow).") from e
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Format '{fmt}' non supporté. Formats supportés : {', '.join(SUPPORTED_FORMATS)}.")
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, str) and value.strip() == "") or (isinstance(value, float) and value != value)
+
+
+def _parse_expiry(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").date()
+
+
+def normalize_position(record):
+    """
+    Valide et normalise un enregistrement brut de position (une seule fois, à l'ingestion).
+
+    - ticker en majuscules, type en minuscules ('stock', 'etf', 'call' ou 'put')
+    - qty en nombre (int si entier)
+    - strike en float et expiry en datetime.date pour les options
+    - coût d'achat inconnu ("XX", vide, NaN) normalisé en None
+
+    Paramètres:
+    record (dict): Enregistrement brut (CSV, JSON Lines ou Parquet).
+
+    Retourne:
+    Position: Position normalisée (enregistrement compact, accessible par clé comme un dictionnaire).
+
+    Lève:
+    ValueError: Si l'enregistrement est invalide.
+    """
+    ticker = record.get("ticker")
+    position_type = record.get("type")
+    if _is_missing(ticker) or _is_missing(position_type):
+        raise ValueError(f"Champs 'ticker' et 'type' obligatoires : {record}")
+    ticker = str(ticker).strip().upper()
+    position_type = str(position_type).strip().lower()
+    if position_type not in POSITION_TYPES:
+        raise ValueError(f"Type de position inconnu '{position_type}' pour {ticker}.")
+
+    qty = float(record.get("qty"))
+    if qty.is_integer():
+        qty = int(qty)
+
+    if position_type in OPTION_TYPES:
+        if _is_missing(record.get("strike")) or _is_missing(record.get("expiry")):
+            raise ValueError(f"Champs 'strike' et 'expiry' obligatoires pour l'option {ticker}.")
+        strike = float(record["strike"])
+        expiry = _parse_expiry(record["expiry"])
+        return Position(ticker=ticker, type=position_type, qty=qty, strike=strike, expiry=expiry,
+                        purchase_premium=parse_cost(record.get("purchase_premium")),
+                        contract_id=CONTRACTS.intern(ticker, strike, expiry.strftime("%Y-%m-%d"), position_type))
+    return Position(ticker=ticker, type=position_type, qty=qty, purchase_price=parse_cost(record.get("purchase_price")))
+
+
+class PositionLoader:
+    """
+    Lecteur en flux de positions depuis un fichier CSV, JSON Lines ou Parquet.
+
+    L'itération produit des lots (listes) d'au plus `chunk_size` positions normalisées.
+    Pendant ce même passage, le lecteur accumule les tickers uniques (`tickers`)
+    et les contrats d'options uniques (`option_contracts`, tuples
+    (ticker, strike, expiry 'YYYY-MM-DD', type)).
+
+    Les enregistrements invalides sont signalés et ignorés (compteur `invalid_records`).
+    """
+
+    def __init__(self, path, chunk_size=10_000, fmt=None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size doit être strictement positif.")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.fmt = fmt or _detect_format(path)
+        self.tickers = set()
+        self.option_contracts = set()
+        self.invalid_records = 0
+        self.position_count = 0
+
+    def __iter__(self):
+        # Chaque passage repart de zéro (le fichier peut être relu après scan_universe)
+        self.tickers = set()
+        self.option_contracts = set()
+        self.invalid_records = 0
+        self.position_count = 0
+        chunk = []
+        for line_number, record in enumerate(_iter_raw_records(self.path, self.fmt, self.chunk_size), start=1):
+            try:
+                position = normalize_position(record)
+            except (ValueError, TypeError) as e:
+                self.invalid_records += 1
+                print(f"Avertissement: Position invalide ignorée (enregistrement {line_number}) : {e}")
+                continue
+
+            self.tickers.add(position.ticker)
+            if position.contract_id is not None:
+                self.option_contracts.add(CONTRACTS.contract(position.contract_id))
+            self.position_count += 1
+            chunk.append(position)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def option_positions_details(self):
+        """
+        Contrats d'options uniques au format attendu par fetch_live_option_data.
+        """
+        return [{"ticker": ticker, "strike": strike, "expiry": expiry, "type": option_type}
+                for ticker, strike, expiry, option_type in sorted(self.option_contracts)]
+
+
+def scan_universe(path, chunk_size=10_000, fmt=None):
+    """
+    Parcourt le fichier une fois (mémoire bornée) pour extraire l'univers à récupérer.
+
+    Retourne:
+    PositionLoader: Le lecteur, dont `tickers` et `option_contracts` sont remplis.
+    """
+    loader = PositionLoader(path, chunk_size=chunk_size, fmt=fmt)
+    for _ in loader:
+        pass
+    return loader
+
+
+def load_positions(path, fmt=None):
+    """
+    Charge toutes les positions d'un fichier en mémoire (pour les petits portefeuilles).
+    """
+    return [position for chunk in PositionLoader(path, fmt=fmt) for position in chunk]
+
+
+def analyze_portfolio_in_chunks(position_chunks, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data, on_chunk=None):
+    """
+    Analyse un portefeuille lot par lot : chaque lot passe par analyze_portfolio,
+    puis seuls les totaux additifs sont conservés. La mémoire maximale dépend
+    donc de la taille d'un lot et non de la taille du portefeuille.
+
+    Paramètres:
+    position_chunks (iterable): Lots de positions (ex: un PositionLoader).
+    live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data: voir analyze_portfolio.
+    on_chunk (callable): Appelée avec (df, options_valuation_details) pour chaque lot (optionnel).
+
+    Retourne:
+    dict: Résumé global du portefeuille (même format que analyze_portfolio).
+    """
+    from portfolio_analyzer import analyze_portfolio, portfolio_totals, merge_portfolio_totals, summarize_portfolio
+
+    totals = None
+    # HV et pricing partagés entre les lots : chaque ticker / contrat n'est traité qu'une fois
+    historical_volatilities = {}
+    pricing_cache = {}
+    for chunk in position_chunks:
+        df, _, options_valuation_details = analyze_portfolio(
+            chunk, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data,
+            historical_volatilities=historical_volatilities, pricing_cache=pricing_cache
+        )
+        chunk_totals = portfolio_totals(df)
+        totals = chunk_totals if totals is None else merge_portfolio_totals(totals, chunk_totals)
+        if on_chunk is not None:
+            on_chunk(df, options_valuation_details)
+
+    if totals is None:
+        totals = {"total_value": 0, "total_pnl": 0, "options_value": 0, "etf_value": 0,
+                  "option_days_sum": 0.0, "option_count": 0}
+    return summarize_portfolio(totals)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    print("--- Test de position_loader.py ---")
+    sample = (
+        "ticker,type,qty,strike,expiry,purchase_premium,purchase_price\n"
+        "LDOS,call,50,180,2025-12-19,4.4,\n"
+        "BAH,call,16,120.0,2025-12-19,XX,\n"
+        "DFEN,etf,1800,,,,45.00\n"
+        "KTOS,put,12,abc,2026-01-16,3.60,\n"
+    )
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+        f.write(sample)
+        sample_path = f.name
+
+    loader = PositionLoader(sample_path, chunk_size=2)
+    for i, chunk in enumerate(loader):
+        print(f"Lot {i}: {chunk}")
+    print(f"Tickers: {sorted(loader.tickers)}")
+    print(f"Contrats: {sorted(loader.option_contracts)}")
+    print(f"Positions valides: {loader.position_count}, invalides: {loader.invalid_records}")
+    os.remove(sample_path)
@@ -0,0 +1,272 @@
+# realized_volatility.py
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_WINDOWS = (20, 60, 252) # 20 séances, 60 séances, 1 an
+ESTIMATORS = ("close_to_close", "ewma", "parkinson", "garman_klass", "rogers_satchell", "yang_zhang")
+
+# Termes calculés pour chaque barre (une ligne par terme) ; toutes les estimations
+# glissantes se déduisent de leurs sommes sur la fenêtre.
+_TERMS = ("r", "r2", "o", "o2", "c", "c2", "parkinson", "garman_klass", "rogers_satchell")
+_TERM_INDEX = {name: i for i, name in enumerate(_TERMS)}
+
+
+def _bar_terms(prev_close, open_, high, low, close):
+    """
+    Termes par barre pour tous les estimateurs (tableaux de même forme, ex: dates x tickers).
+
+    Retourne:
+    np.ndarray: Tableau (n_termes, *forme) dans l'ordre de _TERMS.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.log(close / prev_close)             # close-to-close
+        o = np.log(open_ / prev_close)             # overnight (Yang-Zhang)
+        c = np.log(close / open_)                  # open-to-close
+        hl = np.log(high / low)
+        hc, ho = np.log(high / close), np.log(high / open_)
+        lc, lo = np.log(low / close), np.log(low / open_)
+    return np.stack((
+        r, r ** 2, o, o ** 2, c, c ** 2,
+        hl ** 2 / (4 * np.log(2)),                         # Parkinson
+        0.5 * hl ** 2 - (2 * np.log(2) - 1) * c ** 2,      # Garman-Klass
+        hc * ho + lc * lo,                                 # Rogers-Satchell
+    ))
+
+
+def _variance_from_sums(sums, counts, estimator):
+    """
+    Variance quotidienne d'un estimateur à partir des sommes glissantes des termes.
+    `sums` et `counts` ont la forme (n_termes, ...).
+    """
+    n = counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if estimator == "close_to_close":
+            i, j = _TERM_INDEX["r"], _TERM_INDEX["r2"]
+            return (sums[j] - sums[i] ** 2 / n[i]) / (n[i] - 1)
+        if estimator in ("parkinson", "garman_klass", "rogers_satchell"):
+            i = _TERM_INDEX[estimator]
+            return sums[i] / n[i]
+        if estimator == "yang_zhang":
+            io, io2, ic, ic2, irs = (_TERM_INDEX[t] for t in ("o", "o2", "c", "c2", "rogers_satchell"))
+            var_overnight = (sums[io2] - sums[io] ** 2 / n[io]) / (n[io] - 1)
+            var_open_close = (sums[ic2] - sums[ic] ** 2 / n[ic]) / (n[ic] - 1)
+            var_rs = sums[irs] / n[irs]
+            k = 0.34 / (1.34 + (n[io] + 1) / (n[io] - 1))
+            return var_overnight + k * var_open_close + (1 - k) * var_rs
+    raise ValueError(f"Estimateur inconnu '{estimator}'. Estimateurs disponibles : {', '.join(ESTIMATORS)}.")
+
+
+def _annualize(daily_variance):
+    return np.sqrt(np.maximum(daily_variance, 0.0) * TRADING_DAYS_PER_YEAR)
+
+
+class _RollingState:
+    """
+    État incrémental d'une fenêtre glissante : tampon circulaire des termes des
+    `window` dernières barres et sommes courantes. Une mise à jour coûte O(n_tickers).
+    """
+
+    def __init__(self, window, n_tickers):
+        self.window = window
+        self.buffer = np.full((window, len(_TERMS), n_tickers), np.nan)
+        self.sums = np.zeros((len(_TERMS), n_tickers))
+        self.counts = np.zeros((len(_TERMS), n_tickers))
+        self.position = 0
+
+    def push(self, terms):
+        oldest = self.buffer[self.position]
+        old_valid = np.isfinite(oldest)
+        self.sums -= np.where(old_valid, oldest, 0.0)
+        self.counts -= old_valid
+        new_valid = np.isfinite(terms)
+        self.sums += np.where(new_valid, terms, 0.0)
+        self.counts += new_valid
+        self.buffer[self.position] = terms
+        self.position = (self.position + 1) % self.window
+
+
+class RealizedVolatilityEngine:
+    """
+    Moteur de volatilité réalisée multi-estimateurs sur des données OHLC (dates x tickers).
+
+    Estimateurs : close-to-close, EWMA (RiskMetrics), Parkinson, Garman-Klass,
+    Rogers-Satchell et Yang-Zhang, pour plusieurs fenêtres glissantes à la fois.
+
+    - `volatility(estimator, window)` : historique complet (dates x tickers), calculé en une
+      passe vectorisée (sommes cumulées des termes par barre) puis mis en cache.
+    - `latest(estimator, window)` : dernière valeur par ticker, lue sur l'état incrémental.
+    - `update(bars)` : ajoute une nouvelle barre en O(1) par ticker et par fenêtre.
+
+    Changer d'estimateur ou de fenêtre ne déclenche ni téléchargement ni recalcul des autres.
+    """
+
+    def __init__(self, open_, high, low, close, windows=DEFAULT_WINDOWS, ewma_lambda=0.94):
+        self.tickers = list(close.columns)
+        self.windows = tuple(windows)
+        self.ewma_lambda = ewma_lambda
+        self._dates = list(close.index)
+        self._ohlc = [frame.reindex(index=close.index, columns=self.tickers).to_numpy(dtype=float)
+                      for frame in (open_, high, low, close)]
+        self._pending_bars = []
+        self._cache = {}
+        self._initialize_state()
+
+    @classmethod
+    def from_yfinance(cls, tickers, period="2y", windows=DEFAULT_WINDOWS, ewma_lambda=0.94):
+        """
+        Construit le moteur à partir d'un seul téléchargement OHLC groupé (tous les tickers),
+        auprès du fournisseur de données courant (voir market_data_provider).
+        """
+        from market_data_provider import get_provider
+
+        tickers = sorted(set(tickers))
+        data = get_provider().history(tickers, period=period, auto_adjust=True, group_by="column")
+        if data is None or data.empty:
+            raise ValueError(f"Aucune donnée OHLC trouvée pour {', '.join(tickers)}.")
+
+        def field(name):
+            frame = data[name]
+            return frame.to_frame(tickers[0]) if isinstance(frame, pd.Series) else frame
+
+        return cls(field("Open"), field("High"), field("Low"), field("Close"), windows=windows, ewma_lambda=ewma_lambda)
+
+    def _terms_history(self):
+        open_, high, low, close = self._ohlc
+        prev_close = np.vstack((np.full((1, close.shape[1]), np.nan), close[:-1]))
+        return _bar_terms(prev_close, open_, high, low, close)
+
+    def _initialize_state(self):
+        terms = self._terms_history()
+        self._states = {}
+        for window in self.windows:
+            state = _RollingState(window, len(self.tickers))
+            for t in range(max(0, terms.shape[1] - window), terms.shape[1]):
+                state.push(terms[:, t, :])
+            self._states[window] = state
+
+        # EWMA des rendements au carré (récursion O(1) par nouvelle barre)
+        ewma = np.full(len(self.tickers), np.nan)
+        for t in range(terms.shape[1]):
+            ewma = self._ewma_step(ewma, terms[_TERM_INDEX["r2"], t])
+        self._ewma_variance = ewma
+
+    def _ewma_step(self, ewma, squared_return):
+        seeded = np.where(np.isfinite(ewma), ewma, squared_return) # La première observation initialise la récursion
+        updated = self.ewma_lambda * seeded + (1 - self.ewma_lambda) * squared_return
+        return np.where(np.isfinite(squared_return), updated, ewma)
+
+    def _flush_pending(self):
+        if not self._pending_bars:
+            return
+        new_rows = [np.array(rows) for rows in zip(*(bar for _, bar in self._pending_bars))]
+        self._ohlc = [np.vstack((history, rows)) for history, rows in zip(self._ohlc, new_rows)]
+        self._dates.extend(date for date, _ in self._pending_bars)
+        self._pending_bars = []
+        self._cache = {}
+
+    def volatility(self, estimator="close_to_close", window=60):
+        """
+        Historique de volatilité annualisée (dates x tickers) pour un estimateur et une fenêtre.
+        Pour 'ewma', la fenêtre est ignorée (décroissance exponentielle de paramètre ewma_lambda).
+        """
+        self._flush_pending()
+        key = (estimator, None if estimator == "ewma" else window)
+        if key in self._cache:
+            return self._cache[key]
+
+        if estimator == "ewma":
+            terms = self._terms_history()
+            ewma = np.full(len(self.tickers), np.nan)
+            history = np.full(terms.shape[1:], np.nan)
+            for t in range(terms.shape[1]):
+                ewma = self._ewma_step(ewma, terms[_TERM_INDEX["r2"], t])
+                history[t] = ewma
+            result = _annualize(history)
+        else:
+            terms = self._terms_history()
+            valid = np.isfinite(terms)
+            zeros = np.zeros((terms.shape[0], 1, terms.shape[2]))
+            cum_sums = np.concatenate((zeros, np.cumsum(np.where(valid, terms, 0.0), axis=1)), axis=1)
+            cum_counts = np.concatenate((zeros, np.cumsum(valid, axis=1)), axis=1)
+            end = np.arange(1, terms.shape[1] + 1)
+            begin = np.maximum(end - window, 0)
+            sums = cum_sums[:, end] - cum_sums[:, begin]
+            counts = cum_counts[:, end] - cum_counts[:, begin]
+            result = _annualize(_variance_from_sums(sums, counts, estimator))
+            result[counts[_TERM_INDEX["r"]] < window] = np.nan
+
+        frame = pd.DataFrame(result, index=pd.Index(self._dates), columns=self.tickers)
+        self._cache[key] = frame
+        return frame
+
+    def latest(self, estimator="close_to_close", window=60):
+        """
+        Dernière volatilité annualisée par ticker, lue en O(1) sur l'état incrémental.
+
+        Retourne:
+        pd.Series: Volatilité par ticker.
+        """
+        if estimator == "ewma":
+            return pd.Series(_annualize(self._ewma_variance), index=self.tickers)
+        if window not in self._states:
+            raise ValueError(f"Fenêtre {window} non suivie par le moteur (fenêtres : {self.windows}).")
+        state = self._states[window]
+        result = _annualize(_variance_from_sums(state.sums, state.counts, estimator))
+        result = np.where(state.counts[_TERM_INDEX["r"]] < window, np.nan, result)
+        return pd.Series(result, index=self.tickers)
+
+    def update(self, bar_date, bars):
+        """
+        Ajoute une nouvelle barre quotidienne et met à jour tous les estimateurs en O(1) par ticker.
+
+        Paramètres:
+        bar_date: Date de la barre.
+        bars (dict): Ticker -> (open, high, low, close). Les tickers absents sont traités comme manquants.
+        """
+        nan_bar = (np.nan, np.nan, np.nan, np.nan)
+        rows = np.array([bars.get(ticker, nan_bar) for ticker in self.tickers], dtype=float).T
+        open_, high, low, close = rows
+
+        previous_close = self._pending_bars[-1][1][3] if self._pending_bars else self._ohlc[3][-1]
+        terms = _bar_terms(previous_close, open_, high, low, close)
+        for state in self._states.values():
+            state.push(terms)
+        self._ewma_variance = self._ewma_step(self._ewma_variance, terms[_TERM_INDEX["r2"]])
+        self._pending_bars.append((bar_date, (open_, high, low, close)))
+        self._cache = {}
+
+
+# Pour tester ce module indépendamment (données synthétiques, sans réseau)
+if __name__ == "__main__":
+    import time
+
+    print("--- Test de realized_volatility.py (données synthétiques) ---")
+    rng = np.random.default_rng(7)
+    n_dates, n_tickers = 600, 500
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_dates)
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    daily_sigma = 0.25 / np.sqrt(TRADING_DAYS_PER_YEAR)
+    log_close = np.cumsum(rng.normal(0, daily_sigma, (n_dates, n_tickers)), axis=0)
+    close = 100 * np.exp(log_close)
+    open_ = close * np.exp(rng.normal(0, daily_sigma / 3, close.shape))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, daily_sigma / 2, close.shape)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, daily_sigma / 2, close.shape)))
+    frames = [pd.DataFrame(x, index=dates, columns=tickers) for x in (open_, high, low, close)]
+
+    start = time.perf_counter()
+    engine = RealizedVolatilityEngine(*frames)
+    print(f"Initialisation ({n_tickers} tickers x {n_dates} dates) : {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for estimator in ESTIMATORS:
+        start = time.perf_counter()
+        history = engine.volatility(estimator, 60)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{estimator:>16} (60j) : {history.iloc[-1].mean():.4f} en moyenne, historique en {elapsed:.0f} ms")
+
+    start = time.perf_counter()
+    engine.update(dates[-1] + pd.offsets.BDay(1), {ticker: (100.0, 101.0, 99.0, 100.5) for ticker in tickers})
+    print(f"Mise à jour incrémentale d'une barre : {(time.perf_counter() - start) * 1000:.2f} ms")
+    incremental = engine.latest("yang_zhang", 20)
+    batch = engine.volatility("yang_zhang", 20).iloc[-1]
+    print(f"Écart incrémental / batch (Yang-Zhang 20j) : {np.nanmax(np.abs(incremental - batch)):.2e}")
@@ -0,0 +1,157 @@
+# records.py
+"""
+Enregistrements compacts (__slots__) pour les positions et les détails de valorisation,
+et registre des contrats d'options (identifiants entiers internés).
+
+Les enregistrements restent compatibles avec l'accès par clé des anciens dictionnaires
+(`pos["ticker"]`, `opt.get("market_price")`), ce qui permet au reporter, au backtest et
+au mode batch de les utiliser sans modification.
+"""
+import threading
+
+
+class _Record:
+    """
+    Base des enregistrements à slots : accès par attribut ou par clé, comme un dictionnaire.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Champs inconnus pour {type(self).__name__} : {', '.join(fields)}")
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if isinstance(key, str) else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return [name for name in self.__slots__ if getattr(self, name) is not None]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+class Position(_Record):
+    """
+    Position normalisée (voir position_loader.normalize_position).
+    `contract_id` est l'identifiant interné du contrat pour les options, None sinon.
+    """
+    __slots__ = ("ticker", "type", "qty", "strike", "expiry", "purchase_price", "purchase_premium", "contract_id")
+
+
+class OptionValuation(_Record):
+    """
+    Détails de valorisation d'une option (une ligne de options_valuation_details).
+    """
+    __slots__ = ("ticker", "strike", "expiry", "type", "market_price", "theoretical_price", "implied_volatility",
+                 "historical_volatility", "over_under_value", "over_under_percent", "risk_free_rate",
+                 "dividend_yield", "time_to_expiry", "surface_volatility", "spot_price", "iv_rank", "iv_percentile",
+                 "atm_iv_rank", "atm_iv_percentile", "contract_id", "theoretical_error",
+                 "atm_surface_volatility")
+
+
+class ContractRegistry:
+    """
+    Registre des contrats d'options : chaque contrat (ticker, strike, échéance 'YYYY-MM-DD', type)
+    reçoit un identifiant entier unique. La clé texte utilisée par fetch_live_option_data
+    ("TICKER-strike-échéance-type") n'est construite qu'une fois par contrat.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._contracts = []
+        self._labels = []
+        self._lock = threading.Lock()
+
+    def intern(self, ticker, strike, expiry, option_type):
+        """
+        Retourne l'identifiant du contrat, en l'enregistrant s'il est nouveau.
+        """
+        contract = (ticker, float(strike), expiry, option_type)
+        contract_id = self._ids.get(contract)
+        if contract_id is None:
+            with self._lock: # Étapes du pipeline exécutées en parallèle : un identifiant par contrat
+                contract_id = self._ids.get(contract)
+                if contract_id is None:
+                    contract_id = len(self._contracts)
+                    self._contracts.append(contract)
+                    self._labels.append(f"{ticker}-{contract[1]}-{expiry}-{option_type}")
+                    self._ids[contract] = contract_id
+        return contract_id
+
+    def contract(self, contract_id):
+        return self._contracts[contract_id]
+
+    def label(self, contract_id):
+        return self._labels[contract_id]
+
+    def __len__(self):
+        return len(self._contracts)
+
+
+# Registre partagé par tout le processus : un même contrat a le même identifiant
+# dans tous les portefeuilles, lots et caches de pricing.
+CONTRACTS = ContractRegistry()
+
+
+# Mesure de l'empreinte mémoire (dictionnaires vs enregistrements à slots)
+if __name__ == "__main__":
+    import tracemalloc
+
+    n_rows = 100_000
+    print(f"--- Test de records.py ({n_rows} lignes) ---")
+
+    def measure(build):
+        tracemalloc.start()
+        rows = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return rows, current / n_rows
+
+    def valuation_fields(i):
+        return {"ticker": "LDOS", "strike": 100.0 + i % 50, "expiry": "2026-12-18", "type": "call",
+                "market_price": 4.4 + i * 1e-6, "theoretical_price": 4.1 + i * 1e-6, "implied_volatility": 0.31,
+                "historical_volatility": 0.27, "over_under_value": 0.3, "over_under_percent": 7.3,
+                "risk_free_rate": 0.045, "dividend_yield": 0.01, "time_to_expiry": 0.2, "surface_volatility": 0.3}
+
+    _, dict_bytes = measure(lambda: [valuation_fields(i) for i in range(n_rows)])
+    _, record_bytes = measure(lambda: [OptionValuation(**valuation_fields(i), contract_id=i % 50) for i in range(n_rows)])
+    print(f"Détails de valorisation : {dict_bytes:.0f} octets/ligne (dict) -> {record_bytes:.0f} octets/ligne "
+          f"(OptionValuation), soit {(1 - record_bytes / dict_bytes):.0%} de moins")
+
+    def position_fields(i):
+        return {"ticker": "LDOS", "type": "call", "qty": 50, "strike": 100.0 + i % 50,
+                "expiry": "2026-12-18", "purchase_premium": 4.4}
+
+    _, dict_bytes = measure(lambda: [position_fields(i) for i in range(n_rows)])
+    registry = ContractRegistry()
+    _, record_bytes = measure(lambda: [Position(**position_fields(i), contract_id=registry.intern(
+        "LDOS", 100.0 + i % 50, "2026-12-18", "call")) for i in range(n_rows)])
+    print(f"Positions : {dict_bytes:.0f} octets/ligne (dict) -> {record_bytes:.0f} octets/ligne (Position), "
+          f"soit {(1 - record_bytes / dict_bytes):.0%} de moins ({len(registry)} contrats internés)")
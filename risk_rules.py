@@ -0,0 +1,530 @@
+# risk_rules.py
+"""
+Moteur de règles de limites de risque et d'alertes, évalué à chaque revalorisation.
+
+Les règles sont déclaratives (JSON) : une métrique, une portée (position, ticker ou
+portefeuille), un opérateur, un seuil et des filtres optionnels (tickers, types). Les
+métriques sont calculées une fois par revalorisation sous forme de tableaux numpy
+(RiskFrame) ; chaque règle est ensuite un simple masque vectorisé, sans boucle Python
+par position. Les notifications ne partent que sur changement d'état (déclenchement ou
+levée d'une alerte), l'état étant conservé entre les évaluations (et entre les exécutions
+si un fichier d'état est fourni).
+
+Exemple de fichier de règles :
+    [
+      {"name": "Delta LDOS", "scope": "ticker", "metric": "delta_dollars", "op": ">", "threshold": 50000,
+       "tickers": ["LDOS"], "abs": true, "severity": "critical"},
+      {"name": "Échéance proche", "scope": "position", "metric": "days_to_expiry", "op": "<", "threshold": 7}
+    ]
+"""
+import json
+import operator
+import os
+
+import numpy as np
+
+SCOPES = ("position", "ticker", "portfolio")
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq, "!=": operator.ne}
+SEVERITIES = ("info", "warning", "critical")
+POSITION_METRICS = ("market_value", "pnl", "pnl_pct", "days_to_expiry", "over_under_percent", "implied_volatility",
+                    "historical_volatility", "iv_rank", "delta", "delta_dollars")
+TICKER_METRICS = ("market_value", "pnl", "delta", "delta_dollars", "exposure_pct")
+PORTFOLIO_METRICS = ("total_value", "total_pnl", "options_exposure_pct", "etf_exposure_pct", "delta_dollars", "drawdown_pct")
+CONTRACT_MULTIPLIER = 100
+MAX_PRINTED_EVENTS = 20 # Au-delà, print_notifier résume le reste en une ligne
+
+# Équivalent des seuils codés en dur jusqu'ici dans le reporter (écart de 5 %), plus quelques limites usuelles
+DEFAULT_RULES = [
+    {"name": "Sur/sous-évaluation > 5%", "scope": "position", "metric": "over_under_percent", "op": ">",
+     "threshold": 5, "abs": True, "types": ["call", "put"], "severity": "info"},
+    {"name": "Échéance < 7 jours", "scope": "position", "metric": "days_to_expiry", "op": "<", "threshold": 7,
+     "types": ["call", "put"], "severity": "warning"},
+    {"name": "Exposition options > 50%", "scope": "portfolio", "metric": "options_exposure_pct", "op": ">",
+     "threshold": 50, "severity": "warning"},
+    {"name": "Concentration ticker > 40%", "scope": "ticker", "metric": "exposure_pct", "op": ">", "threshold": 40,
+     "severity": "warning"},
+    {"name": "Drawdown > 10%", "scope": "portfolio", "metric": "drawdown_pct", "op": ">", "threshold": 10,
+     "severity": "critical"},
+]
+
+
+class RiskRule:
+    """
+    Une limite déclarative. Voir le docstring du module pour le format.
+    """
+
+    def __init__(self, name, metric, op, threshold, scope="position", tickers=None, types=None, abs=False,
+                 severity="warning"):
+        allowed = {"position": POSITION_METRICS, "ticker": TICKER_METRICS, "portfolio": PORTFOLIO_METRICS}
+        if scope not in SCOPES:
+            raise ValueError(f"Règle '{name}' : portée inconnue '{scope}' (attendu : {', '.join(SCOPES)}).")
+        if metric not in allowed[scope]:
+            raise ValueError(f"Règle '{name}' : métrique '{metric}' indisponible pour la portée '{scope}' "
+                             f"(disponibles : {', '.join(allowed[scope])}).")
+        if op not in OPERATORS:
+            raise ValueError(f"Règle '{name}' : opérateur inconnu '{op}' (attendu : {', '.join(OPERATORS)}).")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Règle '{name}' : sévérité inconnue '{severity}'.")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = float(threshold)
+        self.scope = scope
+        self.tickers = tuple(tickers) if tickers else None
+        self.types = tuple(types) if types else None
+        self.abs = bool(abs)
+        self.severity = severity
+
+    @classmethod
+    def from_dict(cls, payload):
+        try:
+            return cls(**payload)
+        except TypeError as e:
+            raise ValueError(f"Règle invalide {payload}: {e}") from None
+
+    def describe(self):
+        value = f"|{self.metric}|" if self.abs else self.metric
+        return f"{value} {self.op} {self.threshold:g}"
+
+
+def load_rules(path):
+    """
+    Charge les règles d'un fichier JSON (liste de règles, ou objet avec une clé 'rules').
+    """
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = payload.get("rules", [])
+    return [RiskRule.from_dict(rule) for rule in payload]
+
+
+class RiskFrame:
+    """
+    Métriques de risque du portefeuille sous forme de tableaux, calculées une fois par revalorisation.
+
+    Paramètres:
+    df_portfolio (pd.DataFrame): DataFrame des positions (sortie de analyze_portfolio, trié ou non).
+    options_valuation_details (list): Détails de valorisation des options, dans l'ordre de l'analyse.
+    """
+
+    def __init__(self, df_portfolio, options_valuation_details):
+        import pandas as pd
+
+        df = df_portfolio.sort_index() # Ordre de l'analyse : la i-ème ligne d'option correspond au i-ème détail
+        self.tickers = df["Ticker"].to_numpy()
+        self.types = df["Type"].to_numpy()
+        self.ticker_codes, self.ticker_names = pd.factorize(df["Ticker"])
+        self.qty = df["Quantité"].to_numpy(dtype=float)
+        self.market_value = pd.to_numeric(df["Valeur Marché (€)"], errors="coerce").to_numpy(dtype=float)
+        self.pnl = pd.to_numeric(df["P&L (€)"], errors="coerce").to_numpy(dtype=float)
+        purchase_value = pd.to_numeric(df["Prix Achat (€/contrat)"], errors="coerce").to_numpy(dtype=float)
+        self.is_option = np.isin(self.types, ("call", "put"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Prix d'achat par contrat pour les options (x quantité), valeur totale pour les actions et ETF
+            cost = np.where(self.is_option, purchase_value * self.qty, purchase_value)
+            self.pnl_pct = self.pnl / np.abs(cost) * 100
+        self.days_to_expiry = pd.to_numeric(df["Jours Restants"], errors="coerce").to_numpy(dtype=float)
+        self.strikes = df["Strike"].to_numpy()
+        self.expiries = df["Échéance"].to_numpy()
+
+        n = len(df)
+        option_rows = np.flatnonzero(self.is_option)
+        if len(option_rows) != len(options_valuation_details):
+            raise ValueError(f"{len(option_rows)} lignes d'options pour {len(options_valuation_details)} détails de valorisation.")
+
+        def detail_array(field):
+            values = np.full(n, np.nan)
+            values[option_rows] = [np.nan if (v := option.get(field)) is None else v for option in options_valuation_details]
+            return values
+
+        self.over_under_percent = detail_array("over_under_percent")
+        self.implied_volatility = detail_array("implied_volatility")
+        self.historical_volatility = detail_array("historical_volatility")
+        self.iv_rank = detail_array("iv_rank")
+
+        # Delta en équivalent actions : Black-Scholes en lot (IV si disponible, sinon HV)
+        from option_pricing import black_scholes_greeks_vectorized
+
+        spot = detail_array("spot_price")
+        sigma = np.where(self.implied_volatility > 0, self.implied_volatility, self.historical_volatility)
+        option_delta = black_scholes_greeks_vectorized(
+            spot[option_rows], pd.to_numeric(df["Strike"].iloc[option_rows], errors="coerce").to_numpy(dtype=float),
+            detail_array("time_to_expiry")[option_rows], np.nan_to_num(detail_array("risk_free_rate")[option_rows]),
+            sigma[option_rows], np.nan_to_num(detail_array("dividend_yield")[option_rows]), self.types[option_rows]
+        )["delta"]
+        self.delta = np.where(self.is_option, np.nan, self.qty) # Actions et ETF : delta de 1 par titre
+        self.delta[option_rows] = option_delta * self.qty[option_rows] * CONTRACT_MULTIPLIER
+        with np.errstate(invalid="ignore"):
+            stock_spot = self.market_value / self.qty
+        spot[~self.is_option] = stock_spot[~self.is_option]
+        self.delta_dollars = self.delta * spot
+
+        self.ticker_index = {name: code for code, name in enumerate(self.ticker_names)}
+        # Empreinte de la composition du portefeuille : tant qu'elle ne change pas, les masques
+        # d'une évaluation à l'autre sont comparables position par position
+        self.layout = hash((self.ticker_codes.tobytes(), self.types.astype(str).tobytes(), self.qty.tobytes(),
+                            pd.to_numeric(df["Strike"], errors="coerce").to_numpy(dtype=float).tobytes()))
+        self._ticker_metrics = {}
+        self._type_masks = {}
+        self._subject_codes = None
+        self._subject_rows = None
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def position_metric(self, metric):
+        return getattr(self, metric)
+
+    def ticker_metric(self, metric):
+        """
+        Agrégat par ticker (tableau indexé par code de ticker), calculé à la première demande.
+        """
+        if metric not in self._ticker_metrics:
+            if metric == "exposure_pct":
+                total = np.nansum(self.market_value)
+                values = self.ticker_metric("market_value") / total * 100 if total > 0 else np.zeros(len(self.ticker_names))
+            else:
+                values = np.bincount(self.ticker_codes, weights=np.nan_to_num(getattr(self, metric)),
+                                     minlength=len(self.ticker_names))
+            self._ticker_metrics[metric] = values
+        return self._ticker_metrics[metric]
+
+    def portfolio_metrics(self, peak_value=None):
+        total_value = float(np.nansum(self.market_value))
+        metrics = {
+            "total_value": total_value,
+            "total_pnl": float(np.nansum(self.pnl)),
+            "options_exposure_pct": float(np.nansum(self.market_value[self.is_option])) / total_value * 100 if total_value > 0 else 0.0,
+            "etf_exposure_pct": float(np.nansum(self.market_value[self.types == "etf"])) / total_value * 100 if total_value > 0 else 0.0,
+            "delta_dollars": float(np.nansum(self.delta_dollars)),
+        }
+        peak = max(peak_value or 0.0, total_value)
+        metrics["drawdown_pct"] = (peak - total_value) / peak * 100 if peak > 0 else 0.0
+        return metrics
+
+    def type_mask(self, types):
+        """
+        Masque des positions des types donnés (mis en cache : les règles partagent souvent les mêmes filtres).
+        """
+        if types not in self._type_masks:
+            self._type_masks[types] = np.ones(len(self), dtype=bool) if types is None else np.isin(self.types, types)
+        return self._type_masks[types]
+
+    def position_label(self, index):
+        if self.is_option[index]:
+            return f"{self.tickers[index]} {self.types[index]} {self.strikes[index]} {self.expiries[index]}"
+        return f"{self.tickers[index]} {self.types[index]}"
+
+    def subject_codes(self):
+        """
+        Code de sujet d'alerte par position : les lots d'un même instrument (même libellé) partagent un code.
+        """
+        if self._subject_codes is None:
+            import pandas as pd
+
+            keys = pd.DataFrame({
+                "ticker": self.ticker_codes,
+                "type": self.types.astype(str),
+                "strike": np.where(self.is_option, self.strikes.astype(str), ""),
+                "expiry": np.where(self.is_option, self.expiries.astype(str), ""),
+            })
+            self._subject_codes = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+        return self._subject_codes
+
+    def by_subject(self, mask):
+        """
+        Regroupe un masque de dépassements par sujet d'alerte : un sujet est en alerte tant qu'un
+        de ses lots dépasse le seuil.
+
+        Retourne:
+        tuple: (masque par sujet, position représentative de chaque sujet : le premier lot en
+               dépassement, ou à défaut le premier lot).
+        """
+        codes = self.subject_codes()
+        if self._subject_rows is None:
+            self._subject_rows = np.unique(codes, return_index=True)[1]
+        rows = self._subject_rows.copy()
+        breaching = np.flatnonzero(mask)[::-1] # Ordre inverse : la dernière affectation (premier lot) l'emporte
+        rows[codes[breaching]] = breaching
+        subject_mask = np.zeros(len(rows), dtype=bool)
+        subject_mask[codes[breaching]] = True
+        return subject_mask, rows
+
+
+class _RuleGroup:
+    """
+    Règles de même portée, métrique, opérateur et filtre de types, portant sur des tickers
+    disjoints : elles sont évaluées en une seule passe, avec un seuil par ticker.
+    """
+
+    def __init__(self, rule):
+        self.scope, self.metric, self.op, self.abs, self.types = rule.scope, rule.metric, rule.op, rule.abs, rule.types
+        self.rules = []
+        self.claimed = set() # Tickers couverts (None : tous)
+
+    def accepts(self, rule):
+        if (rule.scope, rule.metric, rule.op, rule.abs, rule.types) != (self.scope, self.metric, self.op, self.abs, self.types):
+            return False
+        if rule.tickers is None or None in self.claimed:
+            return not self.rules
+        return self.claimed.isdisjoint(rule.tickers)
+
+    def add(self, rule):
+        self.rules.append(rule)
+        self.claimed.update(rule.tickers if rule.tickers is not None else (None,))
+
+    def thresholds(self, frame):
+        """
+        Seuil et indice de règle par code de ticker du RiskFrame (NaN / -1 : ticker non couvert).
+        """
+        thresholds = np.full(len(frame.ticker_names), np.nan)
+        rule_index = np.full(len(frame.ticker_names), -1)
+        for index, rule in enumerate(self.rules):
+            codes = (slice(None) if rule.tickers is None
+                     else [frame.ticker_index[t] for t in rule.tickers if t in frame.ticker_index])
+            thresholds[codes] = rule.threshold
+            rule_index[codes] = index
+        return thresholds, rule_index
+
+    def evaluate(self, frame):
+        """
+        Retourne:
+        tuple: (masque des dépassements, valeurs de la métrique, indice de règle par élément).
+        """
+        thresholds, rule_index = self.thresholds(frame)
+        if self.scope == "ticker":
+            values = frame.ticker_metric(self.metric)
+            row_rules = rule_index
+            mask_filter = True
+        else:
+            values = frame.position_metric(self.metric)
+            thresholds = thresholds[frame.ticker_codes]
+            row_rules = rule_index[frame.ticker_codes]
+            mask_filter = frame.type_mask(self.types)
+        with np.errstate(invalid="ignore"):
+            mask = OPERATORS[self.op](np.abs(values) if self.abs else values, thresholds) & mask_filter # NaN : pas d'alerte
+        return mask, values, row_rules
+
+
+class RiskEngine:
+    """
+    Évalue un ensemble de règles à chaque revalorisation et notifie les changements d'état.
+
+    Les règles compatibles sont regroupées (une passe vectorisée par groupe, quel que soit le
+    nombre de tickers couverts). Entre deux évaluations d'un même portefeuille, seules les
+    positions dont l'état a changé sont examinées une par une.
+
+    Paramètres:
+    rules (list): Règles (RiskRule ou dictionnaires) ; DEFAULT_RULES par défaut.
+    state_path (str): Fichier JSON où conserver les alertes actives et le plus haut de valeur
+                      entre les exécutions (optionnel, écrit par save_state).
+    notifiers (list): Fonctions appelées avec la liste des événements quand l'état change
+                      (par défaut : print_notifier).
+    """
+
+    def __init__(self, rules=None, state_path=None, notifiers=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.rules = [rule if isinstance(rule, RiskRule) else RiskRule.from_dict(rule) for rule in rules]
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Les noms de règles doivent être uniques.")
+        self.state_path = state_path
+        self.notifiers = [print_notifier] if notifiers is None else notifiers
+        self.active = {} # nom de règle -> {sujet: valeur au déclenchement}
+        self.peak_value = None
+        self._previous_masks = {} # groupe -> (empreinte du portefeuille, masque)
+
+        self._portfolio_rules = [rule for rule in self.rules if rule.scope == "portfolio"]
+        self._groups = []
+        for rule in self.rules:
+            if rule.scope == "portfolio":
+                continue
+            group = next((group for group in self._groups if group.accepts(rule)), None)
+            if group is None:
+                group = _RuleGroup(rule)
+                self._groups.append(group)
+            group.add(rule)
+
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    state = json.load(f)
+                self.active = state.get("active", {})
+                self.peak_value = state.get("peak_value")
+            except (OSError, ValueError) as e:
+                print(f"Avertissement: État des alertes illisible ({state_path}) : {e}")
+
+    def _transition(self, events, rule, subject, value, triggered):
+        subjects = self.active.setdefault(rule.name, {})
+        if triggered and subject not in subjects:
+            subjects[subject] = value
+        elif not triggered and subject in subjects:
+            value = subjects.pop(subject)
+        else:
+            return
+        events.append({"rule": rule.name, "severity": rule.severity, "subject": subject, "value": value,
+                       "condition": rule.describe(), "state": "déclenchée" if triggered else "levée"})
+
+    def evaluate(self, df_portfolio=None, options_valuation_details=None, frame=None):
+        """
+        Évalue les règles, met à jour les alertes actives et notifie les changements d'état.
+
+        Paramètres:
+        df_portfolio, options_valuation_details : Sorties de analyze_portfolio (ignorées si `frame` est fourni).
+        frame (RiskFrame): Métriques déjà calculées pour cette revalorisation.
+
+        Retourne:
+        list: Événements (dict) 'rule', 'severity', 'subject', 'value', 'condition' et 'state'
+              ('déclenchée' ou 'levée') ; vide si aucune alerte n'a changé d'état.
+        """
+        if frame is None: # Un RiskFrame vide est faux (__len__), il reste néanmoins le cadre fourni
+            frame = RiskFrame(df_portfolio, options_valuation_details)
+        events = []
+
+        portfolio = frame.portfolio_metrics(self.peak_value)
+        for rule in self._portfolio_rules:
+            value = portfolio[rule.metric]
+            breached = OPERATORS[rule.op](abs(value) if rule.abs else value, rule.threshold)
+            self._transition(events, rule, "Portefeuille", value, breached)
+
+        for group_id, group in enumerate(self._groups):
+            mask, values, row_rules = group.evaluate(frame)
+            if group.scope == "ticker":
+                rows = None
+            else:
+                # Plusieurs lots du même instrument partagent un sujet : l'alerte n'est levée que
+                # lorsqu'aucun d'eux ne dépasse plus le seuil
+                mask, rows = frame.by_subject(mask)
+                values, row_rules = values[rows], row_rules[rows]
+            layout = tuple(frame.ticker_names) if group.scope == "ticker" else frame.layout
+            previous = self._previous_masks.get(group_id)
+            if previous is not None and previous[0] == layout:
+                candidates = np.flatnonzero(mask ^ previous[1]) # Seules les positions qui changent d'état
+            else:
+                # Première évaluation (ou portefeuille modifié) : comparaison complète avec les alertes actives
+                candidates = np.flatnonzero(mask)
+                current = {}
+                for i in candidates:
+                    current.setdefault(group.rules[row_rules[i]].name, set()).add(self._subject(frame, rows, i))
+                for rule in group.rules:
+                    for subject in list(self.active.get(rule.name, {}).keys() - current.get(rule.name, set())):
+                        self._transition(events, rule, subject, None, False)
+            for i in candidates:
+                self._transition(events, group.rules[row_rules[i]], self._subject(frame, rows, i), float(values[i]), bool(mask[i]))
+            self._previous_masks[group_id] = (layout, mask)
+
+        self.active = {name: subjects for name, subjects in self.active.items() if subjects}
+        self.peak_value = max(self.peak_value or 0.0, portfolio["total_value"])
+        if events:
+            for notifier in self.notifiers:
+                notifier(events)
+        return events
+
+    @staticmethod
+    def _subject(frame, rows, index):
+        return str(frame.ticker_names[index]) if rows is None else frame.position_label(rows[index])
+
+    def active_alerts(self):
+        """
+        Alertes actives : liste de (règle, sévérité, sujet, valeur au déclenchement, condition), les plus sévères d'abord.
+        """
+        rules = {rule.name: rule for rule in self.rules}
+        alerts = [(name, rules[name].severity, subject, value, rules[name].describe())
+                  for name, subjects in self.active.items() if name in rules for subject, value in subjects.items()]
+        return sorted(alerts, key=lambda alert: (-SEVERITIES.index(alert[1]), alert[0], alert[2]))
+
+    def save_state(self):
+        """
+        Écrit les alertes actives et le plus haut de valeur dans state_path (pour la prochaine exécution).
+        """
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"active": self.active, "peak_value": self.peak_value}, f)
+        os.replace(tmp_path, self.state_path)
+
+
+def format_event(event):
+    return (f"[{event['severity'].upper()}] {event['rule']} {event['state']} : {event['subject']} "
+            f"({event['condition']}, valeur {event['value']:,.2f})")
+
+
+def print_notifier(events):
+    ordered = sorted(events, key=lambda event: -SEVERITIES.index(event["severity"]))
+    for event in ordered[:MAX_PRINTED_EVENTS]:
+        print(format_event(event))
+    if len(events) > MAX_PRINTED_EVENTS:
+        print(f"... et {len(events) - MAX_PRINTED_EVENTS} autre(s) changement(s) d'état d'alerte.")
+
+
+def email_notifier(email_config):
+    """
+    Notificateur envoyant les changements d'état par email (email_config : voir main_portfolio.get_email_config).
+    """
+    def notify(events):
+        from email_reporter import send_email
+
+        sender_email, sender_password, receiver_email = email_config
+        triggered = sum(event["state"] == "déclenchée" for event in events)
+        subject = f"Iron Dome - {triggered} alerte(s) déclenchée(s), {len(events) - triggered} levée(s)"
+        send_email(subject, "\n".join(format_event(event) for event in events), receiver_email, sender_email, sender_password)
+    return notify
+
+
+# Pour tester ce module indépendamment (portefeuille synthétique de 100k positions, sans réseau)
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+
+    from portfolio_analyzer import analyze_portfolio
+    from synthetic_book import generate_synthetic_book
+
+    print("--- Test de risk_rules.py ---")
+    book = generate_synthetic_book(100_000, seed=7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, summary, details = analyze_portfolio(book["positions"], book["live_prices"], 0.04, book["dividend_yields"],
+                                                 book["live_option_data"], historical_volatilities=dict(book["historical_volatilities"]))
+
+    # Quelques centaines de règles : défauts + limites de delta et de P&L par ticker
+    rules = list(DEFAULT_RULES)
+    for ticker in list(book["live_prices"])[:100]:
+        rules.append({"name": f"Delta {ticker}", "scope": "ticker", "metric": "delta_dollars", "op": ">",
+                      "threshold": 5e6, "abs": True, "tickers": [ticker], "severity": "critical"})
+        rules.append({"name": f"Perte {ticker}", "scope": "position", "metric": "pnl_pct", "op": "<",
+                      "threshold": -60, "tickers": [ticker], "severity": "warning"})
+    engine = RiskEngine(rules, notifiers=[])
+
+    start_time = time.perf_counter()
+    frame = RiskFrame(df, details)
+    frame_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    events = engine.evaluate(frame=frame)
+    first_seconds = time.perf_counter() - start_time
+    print(f"{len(df)} positions, {len(engine.rules)} règles en {len(engine._groups)} groupes : métriques en "
+          f"{frame_seconds * 1000:.0f} ms, première évaluation en {first_seconds * 1000:.1f} ms ({len(events)} déclenchements)")
+
+    # Tick suivant : le premier ticker perd 30 points de P&L %, le reste est inchangé
+    frame.pnl_pct = np.where(frame.ticker_codes == 0, frame.pnl_pct - 30, frame.pnl_pct)
+    start_time = time.perf_counter()
+    tick_events = engine.evaluate(frame=frame)
+    tick_seconds = time.perf_counter() - start_time
+    print(f"Réévaluation (un ticker en baisse) en {tick_seconds * 1000:.1f} ms : {len(tick_events)} changements d'état")
+    for alert in engine.active_alerts()[:5]:
+        print(alert)
+
+    # Deux lots de la même action en perte : l'alerte reste active tant qu'un des lots dépasse le seuil
+    import pandas as pd
+
+    lots = pd.DataFrame({"Ticker": ["LDOS", "LDOS"], "Type": ["stock", "stock"], "Quantité": [10, 10],
+                         "Valeur Marché (€)": [700.0, 700.0], "P&L (€)": [-300.0, -300.0],
+                         "Prix Achat (€/contrat)": [1000.0, 1000.0], "Jours Restants": [None, None],
+                         "Strike": [None, None], "Échéance": [None, None]})
+    lot_engine = RiskEngine([{"name": "Perte lot", "scope": "position", "metric": "pnl_pct", "op": "<",
+                              "threshold": -10}], notifiers=[])
+    lot_engine.evaluate(lots, [])
+    lots.loc[0, ["Valeur Marché (€)", "P&L (€)"]] = [1000.0, 0.0] # Le premier lot se redresse
+    lot_events = lot_engine.evaluate(lots, [])
+    print(f"Lots d'un même instrument : {len(lot_events)} changement d'état, alertes actives "
+          f"{[alert[2] for alert in lot_engine.active_alerts()]} {'OK' if not lot_events and lot_engine.active_alerts() else 'ÉCHEC'}")
@@ -0,0 +1,351 @@
+# run_history.py
+"""
+Historique des exécutions dans une base SQLite embarquée : valorisation de chaque position,
+analytique de chaque option (prix de marché et théorique, IV, HV, sur/sous-évaluation) et
+résumé du portefeuille, pour suivre les tendances d'une exécution à l'autre.
+
+Chaque exécution est écrite en une seule transaction (insertions groupées). Les horodatages
+sont dupliqués dans les tables de détail pour que les requêtes par ticker ou par contrat sur
+une plage de dates soient servies par un seul index (ticker/contrat, horodatage).
+"""
+import json
+import math
+import sqlite3
+import time
+from datetime import date, datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_ts INTEGER NOT NULL,
+    total_value REAL,
+    total_pnl REAL,
+    options_exposure_pct REAL,
+    etf_exposure_pct REAL,
+    average_days REAL,
+    summary_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs (run_ts);
+
+CREATE TABLE IF NOT EXISTS contracts (
+    contract_id INTEGER PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    strike REAL NOT NULL,
+    expiry TEXT NOT NULL,
+    type TEXT NOT NULL,
+    UNIQUE (ticker, strike, expiry, type)
+);
+
+CREATE TABLE IF NOT EXISTS position_valuations (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    run_ts INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    type TEXT NOT NULL,
+    contract_id INTEGER REFERENCES contracts (contract_id),
+    qty REAL,
+    purchase_value REAL,
+    market_value REAL,
+    pnl REAL,
+    days_to_expiry INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_positions_ticker_ts ON position_valuations (ticker, run_ts);
+CREATE INDEX IF NOT EXISTS idx_positions_contract_ts ON position_valuations (contract_id, run_ts);
+CREATE INDEX IF NOT EXISTS idx_positions_run ON position_valuations (run_id);
+
+CREATE TABLE IF NOT EXISTS option_analytics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    run_ts INTEGER NOT NULL,
+    contract_id INTEGER NOT NULL REFERENCES contracts (contract_id),
+    ticker TEXT NOT NULL,
+    market_price REAL,
+    theoretical_price REAL,
+    implied_volatility REAL,
+    historical_volatility REAL,
+    surface_volatility REAL,
+    over_under_value REAL,
+    over_under_percent REAL,
+    risk_free_rate REAL,
+    dividend_yield REAL,
+    time_to_expiry REAL,
+    spot_price REAL
+);
+CREATE INDEX IF NOT EXISTS idx_analytics_contract_ts ON option_analytics (contract_id, run_ts);
+CREATE INDEX IF NOT EXISTS idx_analytics_ticker_ts ON option_analytics (ticker, run_ts);
+CREATE INDEX IF NOT EXISTS idx_analytics_run ON option_analytics (run_id);
+"""
+
+_ANALYTICS_FIELDS = ("market_price", "theoretical_price", "implied_volatility", "historical_volatility",
+                     "surface_volatility", "over_under_value", "over_under_percent", "risk_free_rate",
+                     "dividend_yield", "time_to_expiry", "spot_price")
+
+
+def _number(value):
+    """
+    Convertit une valeur du DataFrame ou du résumé en float SQLite ('-', NaN, '12.5%' gérés).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, date):
+        return int(datetime(value.year, value.month, value.day).timestamp())
+    return int(datetime.fromisoformat(str(value)).timestamp())
+
+
+class RunHistory:
+    """
+    Base d'historique des exécutions.
+
+    Paramètres:
+    path (str): Fichier SQLite (créé avec son schéma si nécessaire), ou ':memory:'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL") # Lectures possibles pendant l'écriture d'une exécution
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+        self._migrate()
+        self._contract_ids = {}
+
+    def _migrate(self):
+        """
+        Ajoute aux bases existantes les colonnes apparues depuis leur création.
+        """
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(option_analytics)")}
+        if "spot_price" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE option_analytics ADD COLUMN spot_price REAL")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _contract_id(self, ticker, strike, expiry, option_type):
+        key = (ticker, float(strike), expiry, option_type)
+        contract_id = self._contract_ids.get(key)
+        if contract_id is None:
+            self.connection.execute("INSERT OR IGNORE INTO contracts (ticker, strike, expiry, type) VALUES (?, ?, ?, ?)", key)
+            contract_id = self.connection.execute(
+                "SELECT contract_id FROM contracts WHERE ticker = ? AND strike = ? AND expiry = ? AND type = ?", key
+            ).fetchone()[0]
+            self._contract_ids[key] = contract_id
+        return contract_id
+
+    def record_run(self, df_portfolio, portfolio_summary, options_valuation_details, run_time=None):
+        """
+        Enregistre une exécution (sortie de analyze_portfolio) en une seule transaction.
+
+        Paramètres:
+        df_portfolio (pd.DataFrame): DataFrame des positions.
+        portfolio_summary (dict): Résumé du portefeuille.
+        options_valuation_details (list): Détails de valorisation des options.
+        run_time (datetime): Horodatage de l'exécution (maintenant par défaut).
+
+        Retourne:
+        int: Identifiant de l'exécution.
+        """
+        run_ts = _timestamp(run_time or datetime.now())
+        summary_values = {key.strip(): _number(value) for key, value in portfolio_summary.items()}
+
+        # Identifiants de contrats connus avant la transaction : ceux insérés par une transaction annulée
+        # n'existent plus en base (leur rowid sera réattribué), le cache est donc restauré en cas d'échec
+        committed_contract_ids = dict(self._contract_ids)
+        try:
+            with self.connection: # Une transaction : tout ou rien
+                cursor = self.connection.execute(
+                    "INSERT INTO runs (run_ts, total_value, total_pnl, options_exposure_pct, etf_exposure_pct, average_days, summary_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_ts, summary_values.get("Valeur totale portefeuille"), summary_values.get("P&L total portefeuille"),
+                     summary_values.get("Exposition options"), summary_values.get("Exposition ETF"),
+                     summary_values.get("Durée moyenne (jours)"),
+                     json.dumps({key.strip(): str(value) for key, value in portfolio_summary.items()}))
+                )
+                run_id = cursor.lastrowid
+
+                position_rows = []
+                columns = ["Ticker", "Type", "Quantité", "Prix Achat (€/contrat)", "Strike", "Échéance",
+                           "Jours Restants", "Valeur Marché (€)", "P&L (€)"]
+                for row in df_portfolio[columns].itertuples(index=False):
+                    ticker, position_type, qty, purchase_value, strike, expiry, days, market_value, pnl = row
+                    contract_id = None
+                    if position_type in ("call", "put"):
+                        contract_id = self._contract_id(ticker, strike, expiry, position_type)
+                    days = _number(days)
+                    position_rows.append((run_id, run_ts, ticker, position_type, contract_id, _number(qty),
+                                          _number(purchase_value), _number(market_value), _number(pnl),
+                                          int(days) if days is not None else None))
+                self.connection.executemany(
+                    "INSERT INTO position_valuations (run_id, run_ts, ticker, type, contract_id, qty, purchase_value, "
+                    "market_value, pnl, days_to_expiry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", position_rows
+                )
+
+                analytics_rows = []
+                recorded_contracts = set()
+                for option in options_valuation_details:
+                    contract_id = self._contract_id(option["ticker"], option["strike"], option["expiry"], option["type"])
+                    if contract_id in recorded_contracts: # Plusieurs positions sur le même contrat : une seule ligne
+                        continue
+                    recorded_contracts.add(contract_id)
+                    analytics_rows.append((run_id, run_ts, contract_id, option["ticker"])
+                                          + tuple(_number(option.get(field)) for field in _ANALYTICS_FIELDS))
+                self.connection.executemany(
+                    f"INSERT INTO option_analytics (run_id, run_ts, contract_id, ticker, {', '.join(_ANALYTICS_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (4 + len(_ANALYTICS_FIELDS)))})", analytics_rows
+                )
+        except BaseException:
+            self._contract_ids = committed_contract_ids
+            raise
+        return run_id
+
+    def _query(self, sql, parameters):
+        import pandas as pd
+
+        frame = pd.read_sql_query(sql, self.connection, params=parameters)
+        if "run_ts" in frame.columns:
+            frame["run_ts"] = pd.to_datetime(frame["run_ts"], unit="s")
+        return frame
+
+    @staticmethod
+    def _range(start, end):
+        return _timestamp(start) if start is not None else 0, _timestamp(end) if end is not None else 2 ** 62
+
+    def runs(self, start=None, end=None):
+        """
+        Résumés des exécutions sur une plage de dates.
+        """
+        return self._query(
+            "SELECT run_id, run_ts, total_value, total_pnl, options_exposure_pct, etf_exposure_pct, average_days "
+            "FROM runs WHERE run_ts BETWEEN ? AND ? ORDER BY run_ts", self._range(start, end)
+        )
+
+    def position_history(self, ticker, start=None, end=None):
+        """
+        Valeur de marché et P&L des positions d'un ticker au fil des exécutions.
+        """
+        return self._query(
+            "SELECT p.run_id, p.run_ts, p.ticker, p.type, c.strike, c.expiry, p.qty, p.purchase_value, "
+            "p.market_value, p.pnl, p.days_to_expiry FROM position_valuations p "
+            "LEFT JOIN contracts c ON c.contract_id = p.contract_id "
+            "WHERE p.ticker = ? AND p.run_ts BETWEEN ? AND ? ORDER BY p.run_ts",
+            (ticker,) + self._range(start, end)
+        )
+
+    def latest_run_ids(self, count=2):
+        """
+        Identifiants des `count` dernières exécutions, de la plus récente à la plus ancienne.
+        """
+        rows = self.connection.execute("SELECT run_id FROM runs ORDER BY run_ts DESC, run_id DESC LIMIT ?", (count,))
+        return [row[0] for row in rows]
+
+    def snapshot(self, run_id):
+        """
+        Instantané d'une exécution, une ligne par instrument : une par contrat d'option
+        (quantité agrégée, spot, prix de marché, volatilités, taux, dividende, maturité) et
+        une par ticker pour les actions et ETF (quantité et spot déduit de la valeur de marché).
+
+        Retourne:
+        pd.DataFrame: Colonnes 'instrument' ('option' ou 'stock'), 'contract_id', 'ticker', 'strike',
+                      'expiry', 'type', 'qty', 'market_value', puis les champs d'analytique.
+        """
+        import pandas as pd
+
+        options = pd.read_sql_query(
+            f"SELECT 'option' AS instrument, a.contract_id, c.ticker, c.strike, c.expiry, c.type, "
+            f"q.qty, q.market_value, {', '.join('a.' + field for field in _ANALYTICS_FIELDS)} "
+            "FROM option_analytics a JOIN contracts c ON c.contract_id = a.contract_id "
+            "JOIN (SELECT contract_id, SUM(qty) AS qty, SUM(market_value) AS market_value FROM position_valuations "
+            "      WHERE run_id = ? AND contract_id IS NOT NULL GROUP BY contract_id) q ON q.contract_id = a.contract_id "
+            "WHERE a.run_id = ?", self.connection, params=(run_id, run_id)
+        )
+        stocks = pd.read_sql_query(
+            "SELECT 'stock' AS instrument, ticker, SUM(qty) AS qty, SUM(market_value) AS market_value "
+            "FROM position_valuations WHERE run_id = ? AND contract_id IS NULL GROUP BY ticker",
+            self.connection, params=(run_id,)
+        )
+        stocks["spot_price"] = stocks["market_value"] / stocks["qty"].where(stocks["qty"] != 0)
+        stocks["market_price"] = stocks["spot_price"]
+        return pd.concat([options, stocks], ignore_index=True) if len(stocks) else options
+
+    def contract_history(self, ticker, strike, expiry, option_type="call", start=None, end=None):
+        """
+        Analytique d'un contrat (prix de marché et théorique, IV, HV...) au fil des exécutions.
+        """
+        if isinstance(expiry, (date, datetime)):
+            expiry = expiry.strftime("%Y-%m-%d")
+        row = self.connection.execute(
+            "SELECT contract_id FROM contracts WHERE ticker = ? AND strike = ? AND expiry = ? AND type = ?",
+            (ticker, float(strike), expiry, option_type)
+        ).fetchone()
+        contract_id = row[0] if row else -1
+        return self._query(
+            f"SELECT run_id, run_ts, {', '.join(_ANALYTICS_FIELDS)} FROM option_analytics "
+            "WHERE contract_id = ? AND run_ts BETWEEN ? AND ? ORDER BY run_ts",
+            (contract_id,) + self._range(start, end)
+        )
+
+
+# Pour tester ce module indépendamment (exécutions synthétiques, sans réseau)
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from datetime import timedelta
+
+    from portfolio_analyzer import analyze_portfolio
+    from synthetic_book import generate_synthetic_book
+
+    print("--- Test de run_history.py ---")
+    book = generate_synthetic_book(200, n_tickers=20, seed=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, summary, details = analyze_portfolio(book["positions"], book["live_prices"], 0.04, book["dividend_yields"],
+                                                 book["live_option_data"], historical_volatilities=book["historical_volatilities"])
+
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    with RunHistory(path) as history:
+        # Un an d'exécutions toutes les heures de séance (7 par jour ouvré), même portefeuille
+        first_run = datetime.now() - timedelta(days=365)
+        run_times = [first_run + timedelta(days=d, hours=h) for d in range(365)
+                     if (first_run + timedelta(days=d)).weekday() < 5 for h in range(7)]
+        start_time = time.perf_counter()
+        for run_time in run_times:
+            history.record_run(df, summary, details, run_time=run_time)
+        elapsed = time.perf_counter() - start_time
+        print(f"{len(run_times)} exécutions de {len(df)} positions enregistrées en {elapsed:.1f}s "
+              f"({elapsed / len(run_times) * 1000:.1f} ms par exécution), base de {os.path.getsize(path) / 1e6:.0f} Mo")
+
+        option = details[0]
+        last_month = datetime.now() - timedelta(days=30)
+        start_time = time.perf_counter()
+        contract = history.contract_history(option["ticker"], option["strike"], option["expiry"], option["type"], start=last_month)
+        print(f"IV du contrat {option['ticker']} {option['strike']} {option['expiry']} sur 30 jours : "
+              f"{len(contract)} lignes en {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        start_time = time.perf_counter()
+        positions = history.position_history(option["ticker"], start=last_month)
+        print(f"Positions {option['ticker']} sur 30 jours : {len(positions)} lignes en "
+              f"{(time.perf_counter() - start_time) * 1000:.1f} ms")
@@ -0,0 +1,140 @@
+# scale_benchmark.py
+"""
+Test de montée en charge de bout en bout (génération -> analyse -> rapport HTML)
+sur des portefeuilles synthétiques de 1k, 10k et 100k positions.
+
+Pour chaque étape : temps écoulé, pic de mémoire résidente (RSS) et taille produite.
+L'exposant de croissance entre deux tailles consécutives (log(t2/t1) / log(n2/n1))
+signale les étapes qui ne passent plus à l'échelle linéairement.
+"""
+import contextlib
+import io
+import math
+import resource
+import sys
+import time
+
+from synthetic_book import generate_synthetic_book
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+SUPERLINEAR_EXPONENT = 1.2 # Au-delà, la croissance est signalée comme super-linéaire
+
+
+def _reset_peak_rss():
+    """
+    Remet à zéro le pic de RSS du processus (Linux : /proc/self/clear_refs).
+    Retourne False si la plateforme ne le permet pas (le pic est alors cumulatif).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # octets sur macOS, Ko ailleurs
+
+
+def _measure(stage, size, function, *args):
+    """
+    Exécute une étape en masquant ses impressions ; retourne (résultat, mesure).
+    """
+    _reset_peak_rss()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args)
+    return result, {"positions": size, "stage": stage, "seconds": time.perf_counter() - start,
+                    "peak_rss_mb": _peak_rss_mb()}
+
+
+def run_scale_benchmark(sizes=DEFAULT_SIZES, seed=0, risk_free_rate=0.04):
+    """
+    Exécute génération, analyse et rapport pour chaque taille de portefeuille.
+
+    Retourne:
+    list: Une mesure (dict) par (taille, étape) : 'seconds', 'peak_rss_mb', 'output_size'
+          (positions, lignes ou octets selon l'étape) et 'unique_contracts'.
+    """
+    from portfolio_analyzer import analyze_portfolio
+    from portfolio_reporter import get_portfolio_report_html
+
+    results = []
+    for size in sizes:
+        book, generation = _measure("generate", size, generate_synthetic_book, size, None, seed)
+        generation["output_size"] = len(book["positions"])
+
+        (df, summary, details), analysis = _measure(
+            "analyze", size, lambda: analyze_portfolio(
+                book["positions"], book["live_prices"], risk_free_rate, book["dividend_yields"],
+                book["live_option_data"], historical_volatilities=dict(book["historical_volatilities"])
+            )
+        )
+        analysis["output_size"] = len(df)
+
+        html, report = _measure("report", size, get_portfolio_report_html,
+                                df.sort_values(by="Valeur Marché (€)", ascending=False), summary, details)
+        report["output_size"] = len(html.encode("utf-8"))
+
+        for measurement in (generation, analysis, report):
+            measurement["unique_contracts"] = len(book["live_option_data"])
+            results.append(measurement)
+        del book, df, details, html
+    return results
+
+
+def growth_exponents(results):
+    """
+    Exposant de croissance du temps de chaque étape entre tailles consécutives.
+
+    Retourne:
+    list: (étape, taille précédente, taille, exposant, super-linéaire ?)
+    """
+    exponents = []
+    by_stage = {}
+    for row in results:
+        by_stage.setdefault(row["stage"], []).append(row)
+    for stage, rows in by_stage.items():
+        for previous, current in zip(rows, rows[1:]):
+            if previous["seconds"] <= 0 or current["positions"] == previous["positions"]:
+                continue
+            exponent = (math.log(current["seconds"] / previous["seconds"])
+                        / math.log(current["positions"] / previous["positions"]))
+            exponents.append((stage, previous["positions"], current["positions"], exponent,
+                              exponent > SUPERLINEAR_EXPONENT))
+    return exponents
+
+
+def format_results(results):
+    """
+    Tableau texte des mesures et des exposants de croissance.
+    """
+    header = f"{'Positions':>10} {'Étape':<10} {'Temps (s)':>10} {'µs/position':>12} {'Pic RSS (Mo)':>13} {'Taille':>12} {'Contrats':>9}"
+    lines = [header, "-" * len(header)]
+    for row in results:
+        lines.append(f"{row['positions']:>10} {row['stage']:<10} {row['seconds']:>10.2f} "
+                     f"{row['seconds'] / row['positions'] * 1e6:>12.1f} {row['peak_rss_mb']:>13.1f} "
+                     f"{row['output_size']:>12} {row['unique_contracts']:>9}")
+    exponents = growth_exponents(results)
+    if exponents:
+        lines.append("")
+        lines.append("Exposants de croissance (1.0 = linéaire) :")
+        for stage, previous, current, exponent, superlinear in exponents:
+            flag = "  <-- SUPER-LINÉAIRE" if superlinear else ""
+            lines.append(f"  {stage:<10} {previous:>8} -> {current:<8} {exponent:5.2f}{flag}")
+    return "\n".join(lines)
+
+
+# Pour tester ce module indépendamment (tailles réduites)
+if __name__ == "__main__":
+    print("--- Test de montée en charge (analyse -> rapport) ---")
+    print(format_results(run_scale_benchmark(sizes=(200, 2_000))))
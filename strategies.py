@@ -0,0 +1,266 @@
+# strategies.py
+"""
+Valorisation des stratégies multi-jambes : les options d'un même sous-jacent et d'une même
+échéance (spreads verticaux, straddles, strangles, papillons, condors...) sont regroupées en
+une stratégie, valorisée sur un seul arbre binomial américain partagé par toutes ses jambes
+(option_pricing.binomial_tree_american_shared), avec le test d'exercice anticipé de chaque jambe.
+
+Pour chaque stratégie : prime nette, valeurs de marché et théorique, P&L, perte et gain
+maximaux, points morts, et courbe de P&L à l'échéance sur une grille de prix du sous-jacent.
+"""
+import math
+
+import numpy as np
+
+from option_pricing import binomial_tree_american_shared
+from position_loader import format_expiry, parse_cost
+from records import CONTRACTS
+
+CONTRACT_MULTIPLIER = 100
+DEFAULT_TREE_STEPS = 500 # Comme le prix théorique de portfolio_analyzer
+DEFAULT_GRID_POINTS = 101
+DEFAULT_VOLATILITY = 0.20 # Comme portfolio_analyzer quand la HV est indisponible
+
+
+def group_strategies(positions, min_legs=2):
+    """
+    Regroupe les positions d'options par (sous-jacent, échéance) ; les positions sur un même
+    contrat sont fusionnées en une jambe (quantités additionnées, prime moyenne pondérée).
+
+    Paramètres:
+    positions (list): Positions (dictionnaires ou records.Position).
+    min_legs (int): Nombre minimal de jambes distinctes pour former une stratégie.
+
+    Retourne:
+    dict: {(ticker, échéance 'YYYY-MM-DD'): liste des jambes}, chaque jambe étant un dictionnaire
+          'contract_id', 'strike', 'type', 'qty', 'purchase_premium' (None si inconnue).
+    """
+    groups = {}
+    for pos in positions:
+        if pos["type"] not in ("call", "put") or not pos["qty"]:
+            continue
+        expiry = format_expiry(pos["expiry"])
+        contract_id = pos.get("contract_id")
+        if contract_id is None:
+            contract_id = CONTRACTS.intern(pos["ticker"], float(pos["strike"]), expiry, pos["type"])
+        legs = groups.setdefault((pos["ticker"], expiry), {})
+        premium = parse_cost(pos.get("purchase_premium"))
+        leg = legs.get(contract_id)
+        if leg is None:
+            legs[contract_id] = {"contract_id": contract_id, "strike": float(pos["strike"]), "type": pos["type"],
+                                 "qty": pos["qty"], "purchase_premium": premium}
+            continue
+        if leg["purchase_premium"] is not None and premium is not None and leg["qty"] + pos["qty"] != 0:
+            leg["purchase_premium"] = (leg["purchase_premium"] * leg["qty"] + premium * pos["qty"]) / (leg["qty"] + pos["qty"])
+        else:
+            leg["purchase_premium"] = None
+        leg["qty"] += pos["qty"]
+
+    strategies = {}
+    for key, legs in groups.items():
+        legs = [leg for leg in legs.values() if leg["qty"]]
+        if len(legs) >= min_legs:
+            strategies[key] = sorted(legs, key=lambda leg: (leg["strike"], leg["type"]))
+    return strategies
+
+
+def classify_strategy(legs):
+    """
+    Nom usuel de la stratégie d'après ses jambes (types, strikes et sens).
+    """
+    calls = [leg for leg in legs if leg["type"] == "call"]
+    puts = [leg for leg in legs if leg["type"] == "put"]
+    signs = {np.sign(leg["qty"]) for leg in legs}
+    if len(legs) == 2:
+        if len(calls) == 2 or len(puts) == 2:
+            kind = "call" if calls else "put"
+            return f"Spread vertical ({kind})" if len(signs) == 2 else f"Double {kind}"
+        if len(signs) == 1:
+            return "Straddle" if calls[0]["strike"] == puts[0]["strike"] else "Strangle"
+        return "Risk reversal"
+    if len(legs) == 3 and (len(calls) == 3 or len(puts) == 3) and len(signs) == 2:
+        return "Papillon"
+    if len(legs) == 4 and len(calls) == 2 and len(puts) == 2 and len(signs) == 2:
+        return "Condor / papillon de fer"
+    return f"Combinaison ({len(legs)} jambes)"
+
+
+def payoff_at_expiry(prices, strikes, signs, quantities, net_premium):
+    """
+    P&L de la stratégie à l'échéance pour chaque prix du sous-jacent (en €, contrats de 100).
+    """
+    prices = np.asarray(prices, dtype=float)[:, None]
+    intrinsic = np.maximum(0, signs * (prices - strikes))
+    return intrinsic @ (quantities * CONTRACT_MULTIPLIER) - net_premium
+
+
+def payoff_profile(strikes, signs, quantities, net_premium):
+    """
+    Perte et gain maximaux et points morts du P&L à l'échéance, calculés exactement : le profil
+    est linéaire par morceaux, avec des points anguleux aux strikes.
+
+    Retourne:
+    tuple: (perte maximale, gain maximal, liste des points morts) ; ±inf si la perte ou le gain
+           n'est pas borné (pente non nulle au-delà du dernier strike).
+    """
+    breakpoints = np.unique(np.concatenate(([0.0], strikes)))
+    values = payoff_at_expiry(breakpoints, strikes, signs, quantities, net_premium)
+    slope = float(np.sum(quantities[signs > 0])) * CONTRACT_MULTIPLIER # Pente au-delà du dernier strike (calls)
+
+    max_loss = -math.inf if slope < 0 else float(values.min())
+    max_gain = math.inf if slope > 0 else float(values.max())
+
+    breakevens = []
+    for left, right, value_left, value_right in zip(breakpoints[:-1], breakpoints[1:], values[:-1], values[1:]):
+        if value_left == 0:
+            breakevens.append(float(left))
+        elif value_left * value_right < 0:
+            breakevens.append(float(left + (right - left) * value_left / (value_left - value_right)))
+    if values[-1] == 0:
+        breakevens.append(float(breakpoints[-1]))
+    elif slope != 0 and values[-1] * slope < 0:
+        breakevens.append(float(breakpoints[-1] - values[-1] / slope))
+    return max_loss, max_gain, breakevens
+
+
+def analyze_strategies(positions, options_valuation_details, tree_steps=DEFAULT_TREE_STEPS,
+                       grid_points=DEFAULT_GRID_POINTS, min_legs=2):
+    """
+    Valorise les stratégies du portefeuille à partir des données de marché de l'analyse
+    (spot, taux, dividendes, échéance, HV et prix de marché de chaque contrat).
+
+    Paramètres:
+    positions (list): Positions du portefeuille.
+    options_valuation_details (list): Détails de valorisation produits par analyze_portfolio.
+    tree_steps (int): Pas de l'arbre binomial partagé.
+    grid_points (int): Nombre de prix du sous-jacent de la courbe de P&L.
+    min_legs (int): Nombre minimal de jambes d'une stratégie.
+
+    Retourne:
+    list: Une stratégie (dict) par (sous-jacent, échéance) : 'ticker', 'expiry', 'label', 'legs'
+          (avec 'market_price' et 'theoretical_price'), 'spot', 'net_premium' (payée si positive),
+          'market_value', 'theoretical_value', 'pnl', 'max_loss', 'max_gain', 'breakevens',
+          'price_grid' et 'payoff' (P&L à l'échéance sur la grille).
+          Les primes inconnues sont remplacées par le prix de marché ('estimated_cost').
+    """
+    details_by_contract = {option["contract_id"]: option for option in options_valuation_details
+                           if option.get("contract_id") is not None}
+    results = []
+    for (ticker, expiry), legs in group_strategies(positions, min_legs=min_legs).items():
+        details = [details_by_contract.get(leg["contract_id"]) for leg in legs]
+        reference = next((option for option in details if option is not None and option.get("spot_price")), None)
+        if reference is None:
+            print(f"Avertissement: Données de marché indisponibles pour la stratégie {ticker} {expiry}, ignorée.")
+            continue
+
+        spot, T = reference["spot_price"], reference["time_to_expiry"]
+        sigma = reference.get("historical_volatility")
+        sigma = sigma if sigma is not None and sigma == sigma and sigma > 0 else DEFAULT_VOLATILITY
+        strikes = np.array([leg["strike"] for leg in legs])
+        signs = np.array([1.0 if leg["type"] == "call" else -1.0 for leg in legs])
+        quantities = np.array([leg["qty"] for leg in legs], dtype=float)
+
+        # Une seule remontée pour toutes les jambes de la stratégie
+        theoretical = binomial_tree_american_shared(spot, strikes, T, reference["risk_free_rate"], sigma,
+                                                    reference.get("dividend_yield") or 0.0, tree_steps,
+                                                    [leg["type"] for leg in legs])
+        market = np.array([option.get("market_price", np.nan) if option is not None else np.nan for option in details],
+                          dtype=float)
+        premiums = np.array([leg["purchase_premium"] if leg["purchase_premium"] is not None else np.nan for leg in legs])
+        estimated_cost = bool(np.isnan(premiums).any())
+        premiums = np.where(np.isnan(premiums), market, premiums)
+
+        net_premium = float(premiums @ quantities) * CONTRACT_MULTIPLIER
+        market_value = float(market @ quantities) * CONTRACT_MULTIPLIER
+        max_loss, max_gain, breakevens = payoff_profile(strikes, signs, quantities, net_premium)
+        low = 0.5 * min(strikes.min(), spot)
+        high = 1.5 * max(strikes.max(), spot)
+        price_grid = np.linspace(low, high, grid_points)
+
+        results.append({
+            "ticker": ticker,
+            "expiry": expiry,
+            "label": classify_strategy(legs),
+            "legs": [{**leg, "market_price": m, "theoretical_price": t} for leg, m, t in zip(legs, market, theoretical)],
+            "spot": spot,
+            "time_to_expiry": T,
+            "net_premium": net_premium,
+            "market_value": market_value,
+            "theoretical_value": float(theoretical @ quantities) * CONTRACT_MULTIPLIER,
+            "pnl": market_value - net_premium,
+            "max_loss": max_loss,
+            "max_gain": max_gain,
+            "breakevens": breakevens,
+            "estimated_cost": estimated_cost,
+            "price_grid": price_grid,
+            "payoff": payoff_at_expiry(price_grid, strikes, signs, quantities, net_premium),
+        })
+    return results
+
+
+def _amount(value):
+    return "illimité" if math.isinf(value) else f"{value:,.2f}€"
+
+
+def format_strategies(results):
+    """
+    Tableau texte des stratégies (une ligne par stratégie).
+    """
+    header = (f"{'Ticker':<8} {'Échéance':<11} {'Stratégie':<26} {'Prime nette':>13} {'Valeur marché':>14} "
+              f"{'Théorique':>13} {'Perte max':>13} {'Gain max':>13}  Points morts")
+    lines = [header, "-" * len(header)]
+    for strategy in results:
+        breakevens = ", ".join(f"{price:.2f}" for price in strategy["breakevens"]) or "-"
+        lines.append(f"{strategy['ticker']:<8} {strategy['expiry']:<11} {strategy['label']:<26} "
+                     f"{strategy['net_premium']:>13,.2f} {strategy['market_value']:>14,.2f} "
+                     f"{strategy['theoretical_value']:>13,.2f} {_amount(strategy['max_loss']):>13} "
+                     f"{_amount(strategy['max_gain']):>13}  {breakevens}")
+    return "\n".join(lines)
+
+
+# Pour tester ce module indépendamment (portefeuille synthétique, sans réseau)
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+    from datetime import date, timedelta
+
+    from option_pricing import binomial_tree_american_vectorized
+    from portfolio_analyzer import analyze_portfolio
+
+    print("--- Test de strategies.py ---")
+    expiry = (date.today() + timedelta(days=60)).strftime("%Y-%m-%d")
+    test_positions = [
+        # Spread vertical call 100/110 et strangle 90/115 sur AAA, iron condor sur BBB
+        {"ticker": "AAA", "type": "call", "qty": 10, "strike": 100.0, "expiry": expiry, "purchase_premium": "6.1"},
+        {"ticker": "AAA", "type": "call", "qty": -10, "strike": 110.0, "expiry": expiry, "purchase_premium": "2.4"},
+        {"ticker": "BBB", "type": "put", "qty": 5, "strike": 40.0, "expiry": expiry, "purchase_premium": "0.6"},
+        {"ticker": "BBB", "type": "put", "qty": -5, "strike": 45.0, "expiry": expiry, "purchase_premium": "1.5"},
+        {"ticker": "BBB", "type": "call", "qty": -5, "strike": 55.0, "expiry": expiry, "purchase_premium": "1.4"},
+        {"ticker": "BBB", "type": "call", "qty": 5, "strike": 60.0, "expiry": expiry, "purchase_premium": "0.5"},
+    ]
+    spots = {"AAA": 104.0, "BBB": 50.0}
+    live_quotes = {}
+    for pos in test_positions:
+        key = f"{pos['ticker']}-{pos['strike']}-{expiry}-{pos['type']}"
+        price = float(pos["purchase_premium"]) * 1.1
+        live_quotes[key] = {"bid": price * 0.98, "ask": price * 1.02, "lastPrice": price, "mid": price, "found": True}
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, test_details = analyze_portfolio(test_positions, spots, 0.04, {"AAA": 0.01, "BBB": 0.0}, live_quotes,
+                                               historical_volatilities={"AAA": 0.30, "BBB": 0.25})
+    strategies = analyze_strategies(test_positions, test_details)
+    print(format_strategies(strategies))
+
+    # Coût : un arbre partagé par (sous-jacent, échéance) contre un arbre par jambe
+    n_legs = 40
+    strikes_test = np.linspace(80, 120, n_legs)
+    types_test = np.where(np.arange(n_legs) % 2 == 0, "call", "put")
+    start_time = time.perf_counter()
+    shared = binomial_tree_american_shared(100.0, strikes_test, 0.5, 0.04, 0.3, 0.01, DEFAULT_TREE_STEPS, types_test)
+    shared_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    per_leg = [binomial_tree_american_vectorized(100.0, k, 0.5, 0.04, 0.3, 0.01, DEFAULT_TREE_STEPS, t)
+               for k, t in zip(strikes_test, types_test)]
+    per_leg_seconds = time.perf_counter() - start_time
+    print(f"\n{n_legs} jambes : arbre partagé {shared_seconds * 1000:.1f} ms, un arbre par jambe "
+          f"{per_leg_seconds * 1000:.1f} ms (écart max {np.max(np.abs(shared - np.array(per_leg).ravel())):.1e})")
@@ -0,0 +1,134 @@
+# synthetic_book.py
+"""
+Générateur déterministe de grands portefeuilles synthétiques (actions, ETF, calls et puts
+sur de nombreux tickers, échéances et niveaux de moneyness), avec les données de marché
+correspondantes au format des fonctions de market_data_fetcher : prix spot, rendements
+de dividende, cotations d'options et volatilités historiques.
+
+Le tout peut être passé directement à analyze_portfolio, sans réseau.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from option_pricing import black_scholes_call_vectorized
+
+POSITION_MIX = {"stock": 0.10, "etf": 0.10, "call": 0.45, "put": 0.35}
+EXPIRY_COUNT = 8
+MONEYNESS_RANGE = (0.7, 1.3)
+SYNTHETIC_RATE = 0.04
+
+
+def monthly_expiries(as_of, count=EXPIRY_COUNT):
+    """
+    Troisièmes vendredis des `count` prochains mois (échéances mensuelles standard).
+    """
+    expiries = []
+    year, month = as_of.year, as_of.month
+    while len(expiries) < count:
+        first = date(year, month, 1)
+        third_friday = first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+        if third_friday > as_of:
+            expiries.append(third_friday)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return expiries
+
+
+def _strike_step(spot):
+    return 1.0 if spot < 50 else 2.5 if spot < 150 else 5.0
+
+
+def generate_synthetic_book(n_positions, n_tickers=None, seed=0, as_of=None, unknown_cost_rate=0.05):
+    """
+    Génère un portefeuille synthétique et ses données de marché.
+
+    Paramètres:
+    n_positions (int): Nombre de positions.
+    n_tickers (int): Nombre de sous-jacents (par défaut : une position sur 500, au moins 10).
+    seed (int): Graine ; deux appels avec les mêmes paramètres produisent le même portefeuille.
+    as_of (date): Date de valorisation (aujourd'hui par défaut), pour le calcul des échéances.
+    unknown_cost_rate (float): Proportion de positions au coût d'achat inconnu ("XX").
+
+    Retourne:
+    dict: 'positions' (liste de dictionnaires au format de main_portfolio.positions),
+          'live_prices', 'dividend_yields', 'live_option_data' (clés "TICKER-strike-échéance-type",
+          valeurs bid/ask/lastPrice/mid_price/found comme fetch_live_option_data) et
+          'historical_volatilities'.
+    """
+    rng = np.random.default_rng(seed)
+    as_of = as_of or date.today()
+    n_tickers = n_tickers or max(10, n_positions // 500)
+
+    tickers = [f"SYN{i:04d}" for i in range(n_tickers)]
+    spots = np.round(rng.lognormal(np.log(100), 0.8, n_tickers), 2).clip(5, 2000)
+    volatilities = rng.uniform(0.15, 0.65, n_tickers)
+    dividend_yields = np.where(rng.random(n_tickers) < 0.6, np.round(rng.uniform(0.0, 0.04, n_tickers), 4), 0.0)
+    expiries = monthly_expiries(as_of)
+
+    types = rng.choice(list(POSITION_MIX), size=n_positions, p=list(POSITION_MIX.values()))
+    ticker_index = rng.integers(0, n_tickers, n_positions)
+    expiry_index = rng.integers(0, len(expiries), n_positions)
+    moneyness = rng.uniform(*MONEYNESS_RANGE, n_positions)
+    quantities = rng.integers(1, 100, n_positions)
+    unknown_cost = rng.random(n_positions) < unknown_cost_rate
+    cost_noise = rng.lognormal(0.0, 0.15, n_positions)
+
+    # Strikes arrondis au pas de cotation du sous-jacent
+    position_spots = spots[ticker_index]
+    steps = np.array([_strike_step(spot) for spot in spots])[ticker_index]
+    strikes = np.maximum(np.round(position_spots * moneyness / steps) * steps, steps)
+
+    # Cotations des options : Black-Scholes à la volatilité du sous-jacent, fourchette de 4 %
+    T = np.array([(expiries[i] - as_of).days / 365.0 for i in expiry_index])
+    calls = black_scholes_call_vectorized(position_spots, strikes, T, SYNTHETIC_RATE,
+                                          volatilities[ticker_index], dividend_yields[ticker_index])
+    puts = (calls - position_spots * np.exp(-dividend_yields[ticker_index] * T)
+            + strikes * np.exp(-SYNTHETIC_RATE * T)) # Parité call-put
+    premiums = np.maximum(np.where(types == "call", calls, puts), 0.01)
+    half_spreads = np.maximum(np.round(premiums * 0.02, 2), 0.01)
+
+    positions = []
+    live_option_data = {}
+    for i in range(n_positions):
+        ticker = tickers[ticker_index[i]]
+        position_type = str(types[i])
+        if position_type in ("stock", "etf"):
+            cost = "XX" if unknown_cost[i] else f"{position_spots[i] * cost_noise[i]:.2f}"
+            positions.append({"ticker": ticker, "type": position_type, "qty": int(quantities[i]) * 10,
+                              "purchase_price": cost})
+            continue
+
+        strike = float(strikes[i])
+        expiry = expiries[expiry_index[i]].strftime("%Y-%m-%d")
+        cost = "XX" if unknown_cost[i] else f"{premiums[i] * cost_noise[i]:.2f}"
+        positions.append({"ticker": ticker, "type": position_type, "qty": int(quantities[i]), "strike": strike,
+                          "expiry": expiry, "purchase_premium": cost})
+
+        option_key = f"{ticker}-{strike}-{expiry}-{position_type}"
+        if option_key not in live_option_data:
+            bid = round(max(premiums[i] - half_spreads[i], 0.0), 2)
+            ask = round(premiums[i] + half_spreads[i], 2)
+            live_option_data[option_key] = {"bid": bid, "ask": ask, "lastPrice": round(float(premiums[i]), 2),
+                                            "mid_price": (bid + ask) / 2, "found": True}
+
+    return {
+        "positions": positions,
+        "live_prices": dict(zip(tickers, spots.tolist())),
+        "dividend_yields": dict(zip(tickers, dividend_yields.tolist())),
+        "live_option_data": live_option_data,
+        # HV légèrement différente de la volatilité des cotations : les écarts de valorisation ne sont pas nuls
+        "historical_volatilities": dict(zip(tickers, (volatilities * rng.uniform(0.8, 1.2, n_tickers)).tolist())),
+    }
+
+
+# Pour tester ce module indépendamment
+if __name__ == "__main__":
+    print("--- Test de synthetic_book.py ---")
+    book = generate_synthetic_book(2_000, seed=1)
+    counts = {}
+    for pos in book["positions"]:
+        counts[pos["type"]] = counts.get(pos["type"], 0) + 1
+    print(f"{len(book['positions'])} positions {counts}, {len(book['live_prices'])} tickers, "
+          f"{len(book['live_option_data'])} contrats d'options uniques")
+    print(book["positions"][:3])
+    assert generate_synthetic_book(2_000, seed=1)["positions"] == book["positions"] # Déterministe
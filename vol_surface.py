@@ -0,0 +1,326 @@
+# vol_surface.py
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+from implied_volatility_calculator import find_implied_volatility_bisection_vectorized
+from yield_curve import resolve_rate
+
+# Cache des surfaces construites : une surface par (ticker, jour)
+_SURFACE_CACHE = {}
+
+# Grille de lookup (log-moneyness k = ln(K/F) et maturité T en années)
+K_GRID_MIN, K_GRID_MAX, K_GRID_POINTS = -1.5, 1.5, 121
+T_GRID_POINTS = 64
+LEE_MAX_WING_SLOPE = 2.0 # Pente asymptotique maximale de w(k) = sigma^2 * T (formule des moments de Lee)
+# Prix minimum (un tick) : en dessous, l'IV est mal déterminée (prix ~ 0 pour une large plage de sigma)
+MIN_OPTION_PRICE = 0.01
+
+
+def svi_total_variance(k, a, b, rho, m, s):
+    """
+    Paramétrisation SVI « raw » de la variance totale w(k) = sigma(k)^2 * T :
+    w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + s^2))
+    """
+    return a + b * (rho * (k - m) + np.sqrt((k - m) ** 2 + s ** 2))
+
+
+def fit_svi_slice(k, total_variance, weights=None):
+    """
+    Ajuste une tranche SVI (une échéance) sur des variances totales observées.
+
+    Contraintes anti-arbitrage imposées :
+    - b >= 0, |rho| < 1, s > 0 ;
+    - b * (1 + |rho|) <= 2 (formule des moments de Lee : pente asymptotique des ailes
+      de la variance totale au plus 2) ;
+    - variance totale minimale a + b * s * sqrt(1 - rho^2) >= 0.
+    Avec moins de 5 points, la tranche est plate (variance totale ATM).
+
+    Retourne:
+    tuple: Paramètres (a, b, rho, m, s).
+    """
+    k = np.asarray(k, dtype=float)
+    total_variance = np.asarray(total_variance, dtype=float)
+    weights = np.ones_like(k) if weights is None else np.asarray(weights, dtype=float)
+
+    atm_variance = float(np.interp(0.0, k[np.argsort(k)], total_variance[np.argsort(k)]))
+    if k.size < 5:
+        return (atm_variance, 0.0, 0.0, 0.0, 0.1)
+
+    from scipy.optimize import least_squares
+
+    sqrt_weights = np.sqrt(weights)
+
+    def residuals(params):
+        return sqrt_weights * (svi_total_variance(k, *params) - total_variance)
+
+    def jacobian(params):
+        # Jacobien analytique (évite les différences finies, ~3x plus rapide)
+        _, b, rho, m, s = params
+        km = k - m
+        root = np.sqrt(km ** 2 + s ** 2)
+        columns = (np.ones_like(k), rho * km + root, b * km, -b * (rho + km / root), b * s / root)
+        return sqrt_weights[:, None] * np.column_stack(columns)
+
+    initial = np.array([max(atm_variance * 0.5, 1e-6), 0.1, -0.3, 0.0, 0.1])
+    lower = np.array([-np.max(total_variance), 0.0, -0.999, np.min(k) - 0.5, 1e-3])
+    upper = np.array([np.max(total_variance), 2.0, 0.999, np.max(k) + 0.5, 2.0])
+    initial = np.clip(initial, lower + 1e-9, upper - 1e-9)
+    fit = least_squares(residuals, initial, jac=jacobian, bounds=(lower, upper), method="trf", max_nfev=200)
+    a, b, rho, m, s = fit.x
+
+    # Formule des moments de Lee : la pente des ailes ne peut dépasser 2 en variance totale
+    wing_slope = b * (1 + abs(rho))
+    if wing_slope > LEE_MAX_WING_SLOPE:
+        b *= LEE_MAX_WING_SLOPE / wing_slope
+    # Variance totale minimale positive (pas de variance négative)
+    min_variance = a + b * s * np.sqrt(1 - rho ** 2)
+    if min_variance < 0:
+        a -= min_variance
+    return (float(a), float(b), float(rho), float(m), float(s))
+
+
+class VolSurface:
+    """
+    Surface de volatilité implicite d'un sous-jacent, ajustée par tranche SVI.
+
+    La variance totale est précalculée sur une grille uniforme (k = ln(K/F), T) :
+    entre deux échéances, elle est interpolée linéairement en T et rendue croissante
+    en T (absence d'arbitrage calendaire). Un lookup sigma(K, T) se réduit à un
+    calcul d'indices et une interpolation bilinéaire : coût O(1), vectorisable.
+    """
+
+    def __init__(self, ticker, spot, risk_free_rate, dividend_yield, expiries_T, slice_params, as_of=None):
+        self.ticker = ticker
+        self.spot = float(spot)
+        self.risk_free_rate = risk_free_rate
+        self.dividend_yield = float(dividend_yield)
+        self.expiries_T = np.asarray(expiries_T, dtype=float)
+        self.slice_params = list(slice_params)
+        self.as_of = as_of or date.today()
+        self._build_grid()
+
+    def _build_grid(self):
+        self._k_grid = np.linspace(K_GRID_MIN, K_GRID_MAX, K_GRID_POINTS)
+        self._k_step = self._k_grid[1] - self._k_grid[0]
+        self._T_max = float(self.expiries_T.max())
+        self._T_grid = np.linspace(0.0, self._T_max, T_GRID_POINTS)
+        self._T_step = self._T_grid[1] - self._T_grid[0]
+
+        slice_variance = np.array([svi_total_variance(self._k_grid, *params) for params in self.slice_params])
+        slice_variance = np.maximum.accumulate(np.maximum(slice_variance, 0.0), axis=0)
+        # Avant la première échéance : variance totale proportionnelle à T (volatilité constante)
+        anchors_T = np.concatenate(([0.0], self.expiries_T))
+        anchors_w = np.vstack((np.zeros(K_GRID_POINTS), slice_variance))
+        grid = np.empty((T_GRID_POINTS, K_GRID_POINTS))
+        for j in range(K_GRID_POINTS):
+            grid[:, j] = np.interp(self._T_grid, anchors_T, anchors_w[:, j])
+        self._w_grid = grid
+
+    def forward(self, T):
+        r = resolve_rate(self.risk_free_rate, T)
+        return self.spot * np.exp((r - self.dividend_yield) * np.asarray(T, dtype=float))
+
+    def total_variance(self, K, T):
+        """
+        Variance totale interpolée w(K, T), en O(1) par point (scalaires ou tableaux).
+        """
+        K = np.asarray(K, dtype=float)
+        T = np.clip(np.asarray(T, dtype=float), 1e-6, None)
+        k = np.log(K / self.forward(T))
+
+        # Au-delà de la dernière échéance : volatilité de la dernière échéance
+        T_lookup = np.minimum(T, self._T_max)
+        k_pos = np.clip((k - K_GRID_MIN) / self._k_step, 0, K_GRID_POINTS - 1 - 1e-9)
+        t_pos = np.clip(T_lookup / self._T_step, 0, T_GRID_POINTS - 1 - 1e-9)
+        k_idx = k_pos.astype(int)
+        t_idx = t_pos.astype(int)
+        k_frac = k_pos - k_idx
+        t_frac = t_pos - t_idx
+
+        grid = self._w_grid
+        w = ((1 - t_frac) * ((1 - k_frac) * grid[t_idx, k_idx] + k_frac * grid[t_idx, k_idx + 1])
+             + t_frac * ((1 - k_frac) * grid[t_idx + 1, k_idx] + k_frac * grid[t_idx + 1, k_idx + 1]))
+        return w * np.where(T > self._T_max, T / np.maximum(T_lookup, 1e-6), 1.0)
+
+    def sigma(self, K, T):
+        """
+        Volatilité implicite sigma(K, T) lue sur la surface.
+        """
+        T_arr = np.clip(np.asarray(T, dtype=float), 1e-6, None)
+        result = np.sqrt(np.maximum(self.total_variance(K, T), 0.0) / T_arr)
+        return float(result) if np.ndim(result) == 0 else result
+
+
+def _chain_mid_prices(bid, ask, last_price):
+    mid = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, np.nan)
+    return np.where(np.isnan(mid) & (last_price > 0), last_price, mid)
+
+
+def build_vol_surface_from_chain(ticker, chain, spot, risk_free_rate, dividend_yield, as_of=None):
+    """
+    Construit la surface de volatilité d'un sous-jacent à partir de sa chaîne complète.
+
+    Les IV de tous les strikes et échéances sont résolues en une seule passe vectorisée.
+    Seules les options hors de la monnaie sont retenues (calls au-dessus du forward,
+    puts en dessous) ; les puts sont convertis en calls équivalents par parité call-put
+    (approximation européenne, la prime d'exercice anticipé est négligée).
+
+    Paramètres:
+    ticker (str): Symbole du sous-jacent.
+    chain (pd.DataFrame): Colonnes 'expiry' ('YYYY-MM-DD'), 'type' ('call'/'put'), 'strike', 'bid', 'ask', 'lastPrice'.
+    spot (float): Prix spot du sous-jacent.
+    risk_free_rate (float ou YieldCurve): Taux sans risque.
+    dividend_yield (float): Rendement des dividendes annuel.
+    as_of (date): Date de valorisation (aujourd'hui par défaut).
+
+    Retourne:
+    VolSurface: La surface ajustée, ou None si la chaîne ne contient aucune IV exploitable.
+    """
+    as_of = as_of or date.today()
+    expiry_dates = np.array([datetime.strptime(e, "%Y-%m-%d").date() for e in chain["expiry"]])
+    T = np.array([(e - as_of).days for e in expiry_dates], dtype=float) / 365.0
+    K = chain["strike"].to_numpy(dtype=float)
+    is_call = (chain["type"] == "call").to_numpy()
+    prices = _chain_mid_prices(chain["bid"].to_numpy(dtype=float), chain["ask"].to_numpy(dtype=float),
+                               chain["lastPrice"].to_numpy(dtype=float))
+
+    r = np.asarray(resolve_rate(risk_free_rate, np.maximum(T, 0.0)), dtype=float) * np.ones_like(T)
+    forward = spot * np.exp((r - dividend_yield) * T)
+    out_of_the_money = np.where(is_call, K >= forward, K < forward)
+    keep = (T > 0) & out_of_the_money & np.isfinite(prices) & (prices >= MIN_OPTION_PRICE)
+    if not keep.any():
+        print(f"Avertissement: Aucune option exploitable dans la chaîne de {ticker} pour construire la surface.")
+        return None
+
+    T, K, is_call, prices, r, forward = T[keep], K[keep], is_call[keep], prices[keep], r[keep], forward[keep]
+    # Parité call-put : C = P + S*exp(-qT) - K*exp(-rT)
+    call_prices = np.where(is_call, prices, prices + spot * np.exp(-dividend_yield * T) - K * np.exp(-r * T))
+    implied_vols = find_implied_volatility_bisection_vectorized(call_prices, spot, K, T, r, dividend_yield)
+
+    solved = np.isfinite(implied_vols)
+    if not solved.any():
+        print(f"Avertissement: Aucune volatilité implicite n'a pu être résolue pour {ticker}.")
+        return None
+    T, K, forward, implied_vols = T[solved], K[solved], forward[solved], implied_vols[solved]
+    log_moneyness = np.log(K / forward)
+    total_variance = implied_vols ** 2 * T
+
+    expiries_T, slice_params = [], []
+    for expiry_T in np.unique(T):
+        in_slice = T == expiry_T
+        slice_params.append(fit_svi_slice(log_moneyness[in_slice], total_variance[in_slice]))
+        expiries_T.append(expiry_T)
+
+    return VolSurface(ticker, spot, risk_free_rate, dividend_yield, expiries_T, slice_params, as_of=as_of)
+
+
+FULL_CHAIN_COLUMNS = ("strike", "bid", "ask", "lastPrice", "openInterest", "volume", "impliedVolatility", "contractSymbol")
+
+
+def fetch_full_option_chain(ticker):
+    """
+    Télécharge la chaîne d'options complète (toutes échéances, calls et puts) d'un ticker.
+
+    Retourne:
+    pd.DataFrame: Colonnes 'expiry', 'type', 'strike', 'bid', 'ask', 'lastPrice', 'openInterest',
+                  'volume', 'impliedVolatility' et 'contractSymbol'.
+    """
+    import pandas as pd
+    from market_data_provider import get_provider
+
+    provider = get_provider()
+    frames = []
+    for expiry in provider.option_expiries(ticker):
+        option_chain = provider.option_chain(ticker, expiry)
+        for option_type, options_df in (("call", option_chain.calls), ("put", option_chain.puts)):
+            frame = options_df.reindex(columns=list(FULL_CHAIN_COLUMNS)).copy()
+            frame["expiry"] = expiry
+            frame["type"] = option_type
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["expiry", "type"] + list(FULL_CHAIN_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_vol_surface(ticker, spot, risk_free_rate, dividend_yield, chain=None, force_refresh=False, chain_store=None):
+    """
+    Retourne la surface de volatilité du jour pour un ticker, construite une seule fois
+    puis servie depuis le cache.
+
+    Paramètres:
+    chain (pd.DataFrame): Chaîne déjà téléchargée (optionnel, sinon téléchargée via yfinance).
+    chain_store (OptionChainStore): Si fourni, la chaîne téléchargée y est archivée (optionnel).
+
+    Retourne:
+    VolSurface: La surface, ou None si elle n'a pas pu être construite.
+    """
+    cache_key = (ticker, date.today())
+    if not force_refresh and cache_key in _SURFACE_CACHE:
+        return _SURFACE_CACHE[cache_key]
+
+    try:
+        if chain is None:
+            chain = fetch_full_option_chain(ticker)
+            if chain_store is not None:
+                chain_store.archive(ticker, chain)
+        from market_data_provider import get_provider
+
+        start = time.perf_counter()
+        as_of = get_provider().as_of # Date de l'instantané en cas de rejeu
+        surface = build_vol_surface_from_chain(ticker, chain, spot, risk_free_rate, dividend_yield,
+                                               as_of=as_of.date() if as_of is not None else None)
+        if surface is not None:
+            print(f"Surface de volatilité {ticker} : {len(chain)} contrats, {len(surface.expiries_T)} échéances, "
+                  f"construite en {(time.perf_counter() - start) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"Erreur lors de la construction de la surface de volatilité pour {ticker}: {e}")
+        return None
+
+    if surface is not None:
+        _SURFACE_CACHE[cache_key] = surface
+    return surface
+
+
+# Pour tester ce module indépendamment
+if __name__ == "__main__":
+    import pandas as pd
+    from datetime import timedelta
+    from option_pricing import black_scholes_call_vectorized
+
+    print("--- Test de vol_surface.py (chaîne synthétique) ---")
+    test_spot, test_r, test_q = 100.0, 0.04, 0.01
+    rows = []
+    for days in (14, 30, 60, 91, 182, 273, 365, 547, 730):
+        expiry = (date.today() + timedelta(days=days)).strftime("%Y-%m-%d")
+        T_test = days / 365.0
+        for strike in np.arange(40.0, 200.0, 0.5):
+            k_test = np.log(strike / (test_spot * np.exp((test_r - test_q) * T_test)))
+            vol = 0.25 - 0.1 * k_test + 0.15 * k_test ** 2 # Smile synthétique
+            call = float(black_scholes_call_vectorized(test_spot, strike, T_test, test_r, vol, test_q))
+            put = call - test_spot * np.exp(-test_q * T_test) + strike * np.exp(-test_r * T_test)
+            for option_type, price in (("call", call), ("put", put)):
+                rows.append({"expiry": expiry, "type": option_type, "strike": strike,
+                             "bid": price * 0.99, "ask": price * 1.01, "lastPrice": price})
+    test_chain = pd.DataFrame(rows)
+
+    start_time = time.perf_counter()
+    test_surface = build_vol_surface_from_chain("TEST", test_chain, test_spot, test_r, test_q)
+    print(f"{len(test_chain)} contrats -> surface en {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+    for strike_test, days_test in ((80, 30), (100, 30), (120, 90), (100, 400)):
+        T_check = days_test / 365.0
+        k_check = np.log(strike_test / (test_spot * np.exp((test_r - test_q) * T_check)))
+        expected = 0.25 - 0.1 * k_check + 0.15 * k_check ** 2
+        print(f"sigma(K={strike_test}, {days_test}j) = {test_surface.sigma(strike_test, T_check):.4f} (attendu ~{expected:.4f})")
+
+    wing_slopes = [b * (1 + abs(rho)) for _, b, rho, _, _ in test_surface.slice_params]
+    print(f"Pente maximale des ailes : {max(wing_slopes):.3f} "
+          f"({'OK' if max(wing_slopes) <= LEE_MAX_WING_SLOPE + 1e-12 else 'ÉCHEC'}, borne de Lee {LEE_MAX_WING_SLOPE:g})")
+
+    strikes = np.random.default_rng(0).uniform(60, 160, 1_000_000)
+    maturities = np.random.default_rng(1).uniform(0.05, 2.0, 1_000_000)
+    start_time = time.perf_counter()
+    test_surface.sigma(strikes, maturities)
+    print(f"1 000 000 lookups en {(time.perf_counter() - start_time) * 1000:.0f} ms")
@@ -0,0 +1,575 @@
+# work_queue.py
+"""
+File de travaux de valorisation répartie sur plusieurs machines.
+
+Un coordinateur écoute sur une adresse TCP (multiprocessing.connection, authentification par clé
+partagée) ; les workers sont de simples processus, lancés sur n'importe quel hôte qui dispose du
+dépôt (`python cli.py worker --connect hôte:port`, clé dans PORTFOLIO_WORKER_AUTHKEY), ou en local
+pour les tests (start_local_workers).
+
+    Découpage par sous-jacent : chaque tâche appartient à un shard (le ticker). Un worker garde les
+    shards qu'il a commencés et ne prend un shard libre, puis une tâche d'un shard d'un autre worker
+    (vol de travail), que lorsque les siens sont vides.
+    Instantanés de marché : les données d'un sous-jacent (spot, dividende, HV, taux, cotations) sont
+    sérialisées une fois (pickle + zlib) et envoyées au plus une fois à chaque worker ; les tâches
+    ne transportent ensuite que des bornes ou des lots de positions.
+    Pannes : un worker dont la connexion tombe (ou qui dépasse task_timeout) est retiré ; sa tâche en
+    cours est redistribuée (max_attempts tentatives) et ses shards sont libérés.
+
+Protocole :
+    worker -> coordinateur : ("hello", hôte, pid), puis ("result", task_id, ok, valeur ou message d'erreur)
+    coordinateur -> worker : ("snapshot", id, données), ("forget", id), ("task", task_id, nom, id d'instantané, args), ("stop",)
+"""
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+AUTHKEY_ENV = "PORTFOLIO_WORKER_AUTHKEY"
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_WORKER_GRACE = 60.0 # Secondes sans aucun worker actif avant l'échec des tâches en attente
+DEFAULT_CONTRACT_CHUNK = 512 # Contrats par tâche de valorisation de chaîne
+DEFAULT_POSITION_CHUNK = 200 # Positions par tâche d'analyse
+COMPRESSION_LEVEL = 1 # Rapide : les instantanés sont surtout des tableaux de flottants
+
+
+def pack_snapshot(snapshot):
+    """
+    Sérialisation compacte d'un instantané de marché (dict de scalaires, tableaux numpy, cotations).
+    """
+    return zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+
+
+def unpack_snapshot(blob):
+    return pickle.loads(zlib.decompress(blob))
+
+
+def _task_price_contracts(snapshot, start, stop, tree_steps):
+    """
+    Prix théoriques (arbre binomial américain, HV) et IV des contrats [start, stop) de l'instantané.
+    """
+    from option_screener import _price_chunk
+    from yield_curve import resolve_rate
+
+    contracts = {name: values[start:stop] for name, values in snapshot["contracts"].items()}
+    T = contracts["T"]
+    count = T.size
+    r = np.asarray(resolve_rate(snapshot["rate"], T), dtype=float) * np.ones(count)
+    return _price_chunk((np.full(count, snapshot["spot"]), contracts["strike"], T, r,
+                         np.full(count, snapshot["historical_volatility"]), np.full(count, snapshot["dividend_yield"]),
+                         contracts["is_call"], contracts["mid"], tree_steps))
+
+
+def _task_analyze_positions(snapshot, positions):
+    """
+    analyze_portfolio sur un lot de positions d'un même sous-jacent.
+    """
+    import contextlib
+
+    from portfolio_analyzer import analyze_portfolio
+
+    ticker = snapshot["ticker"]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        df, _, details = analyze_portfolio(positions, {ticker: snapshot["spot"]}, snapshot["rate"],
+                                           {ticker: snapshot["dividend_yield"]}, snapshot["quotes"],
+                                           historical_volatilities={ticker: snapshot["historical_volatility"]},
+                                           as_of=snapshot["as_of"])
+    return df, details
+
+
+TASKS = {
+    "price_contracts": _task_price_contracts,
+    "analyze_positions": _task_analyze_positions,
+}
+
+
+def run_worker(address, authkey):
+    """
+    Boucle d'un worker : se connecte au coordinateur et exécute les tâches reçues jusqu'à l'ordre d'arrêt
+    (ou la fermeture de la connexion).
+
+    Paramètres:
+    address (tuple): (hôte, port) du coordinateur.
+    authkey (bytes): Clé partagée.
+
+    Retourne:
+    int: Nombre de tâches exécutées.
+    """
+    connection = Client(tuple(address), authkey=authkey)
+    connection.send(("hello", socket.gethostname(), os.getpid()))
+    snapshots, completed = {}, 0
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            kind = message[0]
+            if kind == "snapshot":
+                snapshots[message[1]] = unpack_snapshot(message[2])
+            elif kind == "forget":
+                snapshots.pop(message[1], None)
+            elif kind == "task":
+                _, task_id, name, snapshot_id, args = message
+                try:
+                    value = TASKS[name](snapshots.get(snapshot_id), *args)
+                    connection.send(("result", task_id, True, value))
+                except Exception as e:
+                    connection.send(("result", task_id, False, f"{type(e).__name__}: {e}"))
+                completed += 1
+            elif kind == "stop":
+                break
+    finally:
+        connection.close()
+    return completed
+
+
+class Task:
+    __slots__ = ("task_id", "name", "args", "shard", "snapshot_id", "attempts")
+
+    def __init__(self, task_id, name, args, shard, snapshot_id):
+        self.task_id = task_id
+        self.name = name
+        self.args = tuple(args)
+        self.shard = shard
+        self.snapshot_id = snapshot_id
+        self.attempts = 0
+
+
+class WorkQueueCoordinator:
+    """
+    Coordinateur de la file de travaux (utilisable comme gestionnaire de contexte).
+
+    Paramètres:
+    address (tuple): (hôte, port) d'écoute ; port 0 = port libre choisi par le système (voir .address).
+                     Écouter sur "0.0.0.0" pour accepter des workers d'autres machines.
+    authkey (bytes): Clé partagée (PORTFOLIO_WORKER_AUTHKEY, sinon clé aléatoire pour les workers locaux).
+    max_attempts (int): Nombre maximal d'envois d'une tâche (le premier compris) en cas de perte de worker.
+    task_timeout (float): Secondes au-delà desquelles un worker qui n'a pas répondu est considéré perdu (optionnel).
+    worker_grace (float): Secondes sans aucun worker actif (aucun connecté, ou tous perdus) au-delà desquelles
+                          map abandonne les tâches en attente au lieu d'attendre indéfiniment.
+    """
+
+    def __init__(self, address=("127.0.0.1", 0), authkey=None, max_attempts=DEFAULT_MAX_ATTEMPTS, task_timeout=None,
+                 worker_grace=DEFAULT_WORKER_GRACE):
+        authkey = authkey or os.environ.get(AUTHKEY_ENV, "").encode()
+        self.authkey = authkey or os.urandom(16).hex().encode()
+        self.max_attempts = max_attempts
+        self.task_timeout = task_timeout
+        self.worker_grace = worker_grace
+        self._listener = Listener(tuple(address), authkey=self.authkey)
+        self.address = self._listener.address
+        self._condition = threading.Condition()
+        self._snapshots = {}
+        self._pending = OrderedDict() # shard -> deque de tâches, dans l'ordre de soumission
+        self._owners = {} # shard -> worker
+        self._results = {}
+        self._errors = {}
+        self._next_id = 0
+        self._closed = False
+        self._processes = []
+        self.workers = {} # nom -> {'host', 'pid', 'alive', 'completed'}
+        self.redispatched = 0
+        self.snapshot_bytes_sent = 0
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def alive_workers(self):
+        with self._condition:
+            return sum(worker["alive"] for worker in self.workers.values())
+
+    def start_local_workers(self, count):
+        """
+        Lance `count` workers locaux (processus indépendants, comme sur un autre hôte).
+        """
+        host, port = self.address
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py"),
+                   "worker", "--connect", f"{host}:{port}"]
+        environment = {**os.environ, AUTHKEY_ENV: self.authkey.decode()}
+        for _ in range(count):
+            self._processes.append(subprocess.Popen(command, env=environment, stdout=subprocess.DEVNULL))
+        return self._processes[-count:]
+
+    def wait_for_workers(self, count, timeout=30.0):
+        """
+        Attend que `count` workers soient connectés (False si le délai expire).
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while sum(worker["alive"] for worker in self.workers.values()) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def put_snapshot(self, snapshot_id, snapshot):
+        """
+        Enregistre un instantané de marché (sérialisé une seule fois, envoyé à la demande).
+
+        Retourne:
+        int: Taille sérialisée en octets.
+        """
+        blob = pack_snapshot(snapshot)
+        with self._condition:
+            self._snapshots[snapshot_id] = blob
+        return len(blob)
+
+    def release_snapshots(self, snapshot_ids):
+        """
+        Oublie des instantanés (les workers les libèrent avant leur tâche suivante).
+        """
+        with self._condition:
+            for snapshot_id in snapshot_ids:
+                self._snapshots.pop(snapshot_id, None)
+
+    def map(self, tasks, timeout=None):
+        """
+        Exécute des tâches sur les workers et attend leurs résultats.
+
+        Paramètres:
+        tasks (iterable): Tuples (nom de tâche, args, shard, id d'instantané), le nom étant une clé de TASKS.
+        timeout (float): Délai maximal en secondes (optionnel). Indépendamment, map échoue (RuntimeError)
+                         si aucun worker n'est actif pendant plus de worker_grace secondes.
+
+        Retourne:
+        list: Résultats, dans l'ordre des tâches.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            ids = []
+            for name, args, shard, snapshot_id in tasks:
+                if name not in TASKS:
+                    raise ValueError(f"Tâche inconnue : {name!r} (attendu : {', '.join(TASKS)})")
+                task = Task(self._next_id, name, args, shard, snapshot_id)
+                self._next_id += 1
+                self._pending.setdefault(shard, deque()).append(task)
+                ids.append(task.task_id)
+            self._condition.notify_all()
+
+            waiting, orphaned_since = set(ids), None
+            while True:
+                waiting = {task_id for task_id in waiting if task_id not in self._results and task_id not in self._errors}
+                if not waiting:
+                    break
+                now = time.monotonic()
+                remaining = deadline - now if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._cancel(waiting)
+                    raise TimeoutError(f"{len(waiting)} tâche(s) non terminée(s) dans le délai.")
+                if any(worker["alive"] for worker in self.workers.values()):
+                    orphaned_since = None
+                else: # Personne pour exécuter les tâches (redistribuées ou non) : échec après le délai de grâce
+                    orphaned_since = now if orphaned_since is None else orphaned_since
+                    orphaned = now - orphaned_since
+                    if orphaned >= self.worker_grace:
+                        self._cancel(waiting)
+                        raise RuntimeError(f"Aucun worker actif depuis {orphaned:.0f}s : "
+                                           f"{len(waiting)} tâche(s) non exécutée(s).")
+                    remaining = min(remaining, self.worker_grace - orphaned) if remaining is not None \
+                        else self.worker_grace - orphaned
+                self._condition.wait(remaining)
+
+            errors = {task_id: self._errors.pop(task_id) for task_id in ids if task_id in self._errors}
+            results = [self._results.pop(task_id, None) for task_id in ids]
+        if errors:
+            first = next(iter(errors.values()))
+            raise RuntimeError(f"{len(errors)} tâche(s) en échec sur {len(ids)} (première erreur : {first})")
+        return results
+
+    def _cancel(self, task_ids):
+        for shard, queue in list(self._pending.items()):
+            self._pending[shard] = deque(task for task in queue if task.task_id not in task_ids)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError: # Listener fermé
+                return
+            except Exception as e: # Clé refusée, poignée de main interrompue
+                print(f"Avertissement: Connexion de worker refusée : {e}")
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _next_task(self, worker):
+        """
+        Prochaine tâche pour `worker` : ses shards, puis un shard libre, puis une tâche volée (bloquant).
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                pending = [shard for shard, queue in self._pending.items() if queue]
+                shard = next((s for s in pending if self._owners.get(s) == worker), None)
+                if shard is None:
+                    shard = next((s for s in pending if s not in self._owners), None)
+                    if shard is not None:
+                        self._owners[shard] = worker
+                if shard is None and pending:
+                    shard = max(pending, key=lambda s: len(self._pending[s])) # Vol : le shard le plus chargé
+                    return self._pending[shard].pop() # Par la fin : le propriétaire garde l'ordre de la tête
+                if shard is not None:
+                    return self._pending[shard].popleft()
+                self._condition.wait()
+
+    def _serve(self, connection):
+        try:
+            _, host, pid = connection.recv()
+        except (EOFError, OSError, ValueError):
+            connection.close()
+            return
+        worker = f"{host}:{pid}"
+        with self._condition:
+            self.workers[worker] = {"host": host, "pid": pid, "alive": True, "completed": 0}
+            self._condition.notify_all()
+        sent, task = set(), None
+        try:
+            while True:
+                task = self._next_task(worker)
+                if task is None:
+                    connection.send(("stop",))
+                    return
+                with self._condition:
+                    forgotten = [snapshot_id for snapshot_id in sent if snapshot_id not in self._snapshots]
+                    blob = self._snapshots.get(task.snapshot_id) if task.snapshot_id not in sent else None
+                for snapshot_id in forgotten:
+                    connection.send(("forget", snapshot_id))
+                    sent.discard(snapshot_id)
+                if blob is not None:
+                    connection.send(("snapshot", task.snapshot_id, blob))
+                    sent.add(task.snapshot_id)
+                    with self._condition:
+                        self.snapshot_bytes_sent += len(blob)
+                task.attempts += 1
+                connection.send(("task", task.task_id, task.name, task.snapshot_id, task.args))
+                if self.task_timeout is not None and not connection.poll(self.task_timeout):
+                    raise TimeoutError(f"pas de réponse en {self.task_timeout}s")
+                _, task_id, ok, value = connection.recv()
+                with self._condition:
+                    (self._results if ok else self._errors)[task_id] = value
+                    self.workers[worker]["completed"] += 1
+                    self._condition.notify_all()
+                task = None
+        except (EOFError, OSError, TimeoutError, pickle.UnpicklingError) as e:
+            print(f"Avertissement: Worker {worker} perdu ({type(e).__name__}: {e}).")
+        finally:
+            connection.close()
+            with self._condition:
+                self.workers[worker]["alive"] = False
+                self._owners = {shard: owner for shard, owner in self._owners.items() if owner != worker}
+                if task is not None: # Tâche en cours : redistribuée en tête de son shard
+                    if task.attempts >= self.max_attempts:
+                        self._errors[task.task_id] = f"worker perdu {task.attempts} fois"
+                    else:
+                        self._pending.setdefault(task.shard, deque()).appendleft(task)
+                        self.redispatched += 1
+                self._condition.notify_all()
+
+    def close(self, timeout=5.0):
+        """
+        Arrête les workers connectés, puis les processus locaux et l'écoute.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            try:
+                process.wait(max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._listener.close()
+
+
+def distributed_price_contracts(coordinator, chain, live_data, historical_volatilities, risk_free_rate,
+                                tree_steps=200, chunk_size=DEFAULT_CONTRACT_CHUNK, default_volatility=0.20):
+    """
+    Version répartie de option_screener.price_contracts : un instantané par sous-jacent (ses contrats
+    compris), des tâches de `chunk_size` contrats.
+
+    Paramètres:
+    chain (pd.DataFrame): Chaîne filtrée (colonnes 'ticker', 'strike', 'T', 'type', 'mid').
+    live_data (dict): Ticker -> {'spot_price', 'dividend_yield'}.
+    historical_volatilities (dict): HV par ticker (default_volatility si absente ou nulle).
+
+    Retourne:
+    tuple: (prix théoriques, volatilités implicites), tableaux alignés sur les lignes de `chain`.
+    """
+    theoretical, implied = np.full(len(chain), np.nan), np.full(len(chain), np.nan)
+    tasks, rows, snapshot_ids = [], [], []
+    for ticker, index in chain.groupby("ticker", sort=False).indices.items():
+        contracts = chain.iloc[index]
+        hv = historical_volatilities.get(ticker)
+        snapshot_id = f"chain:{ticker}:{id(chain)}"
+        coordinator.put_snapshot(snapshot_id, {
+            "ticker": ticker, "spot": live_data[ticker]["spot_price"], "dividend_yield": live_data[ticker]["dividend_yield"],
+            "historical_volatility": hv if hv is not None and hv > 0 else default_volatility, "rate": risk_free_rate,
+            "contracts": {"strike": contracts["strike"].to_numpy(dtype=float), "T": contracts["T"].to_numpy(dtype=float),
+                          "is_call": (contracts["type"] == "call").to_numpy(), "mid": contracts["mid"].to_numpy(dtype=float)},
+        })
+        snapshot_ids.append(snapshot_id)
+        for start in range(0, len(index), chunk_size):
+            stop = min(start + chunk_size, len(index))
+            tasks.append(("price_contracts", (start, stop, tree_steps), ticker, snapshot_id))
+            rows.append(index[start:stop])
+    try:
+        results = coordinator.map(tasks)
+    finally:
+        coordinator.release_snapshots(snapshot_ids)
+    for index, (prices, volatilities) in zip(rows, results):
+        theoretical[index], implied[index] = prices, volatilities
+    return theoretical, implied
+
+
+def distributed_analysis(coordinator, positions, live_prices, risk_free_rate, dividend_yields_by_ticker, live_option_data,
+                         historical_volatilities=None, as_of=None, chunk_size=DEFAULT_POSITION_CHUNK):
+    """
+    Version répartie de analyze_portfolio : positions découpées par sous-jacent, puis en lots.
+    Chaque instantané ne contient que les données du sous-jacent (cotations de ses seuls contrats).
+
+    Retourne:
+    tuple: (DataFrame, résumé, détails de valorisation), comme analyze_portfolio (lignes groupées par ticker).
+    """
+    import pandas as pd
+
+    from portfolio_analyzer import portfolio_totals, summarize_portfolio
+    from records import CONTRACTS
+
+    historical_volatilities = historical_volatilities or {}
+    by_ticker = {}
+    for pos in positions:
+        # Dictionnaire sans contract_id : l'identifiant n'a de sens que dans le registre de ce processus,
+        # chaque worker interne les contrats dans le sien à partir de (ticker, strike, échéance, type)
+        portable = {key: pos[key] for key in pos.keys() if key != "contract_id"}
+        by_ticker.setdefault(pos["ticker"], []).append(portable)
+
+    tasks, snapshot_ids = [], []
+    for ticker, ticker_positions in by_ticker.items():
+        prefix = f"{ticker}-" # Clés des cotations : "TICKER-strike-échéance-type"
+        snapshot_id = f"analysis:{ticker}:{id(positions)}"
+        coordinator.put_snapshot(snapshot_id, {
+            "ticker": ticker, "spot": live_prices.get(ticker), "dividend_yield": dividend_yields_by_ticker.get(ticker, 0.00),
+            "historical_volatility": historical_volatilities.get(ticker, np.nan), "rate": risk_free_rate, "as_of": as_of,
+            "quotes": {key: quote for key, quote in live_option_data.items() if key.startswith(prefix)},
+        })
+        snapshot_ids.append(snapshot_id)
+        for start in range(0, len(ticker_positions), chunk_size):
+            tasks.append(("analyze_positions", (ticker_positions[start:start + chunk_size],), ticker, snapshot_id))
+    try:
+        results = coordinator.map(tasks)
+    finally:
+        coordinator.release_snapshots(snapshot_ids)
+
+    df = pd.concat([chunk_df for chunk_df, _ in results], ignore_index=True) if results else pd.DataFrame()
+    details = [detail for _, chunk_details in results for detail in chunk_details]
+    for detail in details: # Identifiants attribués par le registre de chaque worker : ré-internés ici
+        detail["contract_id"] = CONTRACTS.intern(detail["ticker"], detail["strike"], detail["expiry"], detail["type"])
+    return df, summarize_portfolio(portfolio_totals(df)), details
+
+
+# Benchmark : débit de valorisation de chaînes (arbre à 200 pas + IV) avec 1, 2 et 4 workers locaux,
+# puis perte d'un worker en cours de route (redistribution) ; python work_queue.py
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    import pandas as pd
+
+    from option_screener import price_contracts
+    from synthetic_book import generate_synthetic_book
+    # Même module que celui des fonctions réparties (et non la copie __main__)
+    from work_queue import WorkQueueCoordinator, distributed_analysis, distributed_price_contracts
+
+    print(f"--- Test de work_queue.py ({os.cpu_count()} cœur(s) sur cette machine) ---")
+    if (os.cpu_count() or 1) < 4:
+        print("Avertissement: Moins de 4 cœurs : le débit local ne peut pas croître au-delà du nombre de cœurs "
+              "(sur plusieurs hôtes, chaque worker apporte les siens).")
+    rng = np.random.default_rng(3)
+    tickers = [f"T{i:03d}" for i in range(24)]
+    per_ticker = 1_000
+    test_live_data = {ticker: {"spot_price": float(rng.uniform(20, 400)), "dividend_yield": float(rng.choice([0.0, 0.015]))}
+                      for ticker in tickers}
+    spots = np.repeat([test_live_data[ticker]["spot_price"] for ticker in tickers], per_ticker)
+    test_chain = pd.DataFrame({
+        "ticker": np.repeat(tickers, per_ticker), "strike": np.round(spots * rng.uniform(0.7, 1.3, spots.size), 1),
+        "T": rng.uniform(0.02, 1.5, spots.size), "type": rng.choice(["call", "put"], spots.size),
+    })
+    test_chain["mid"] = np.maximum(spots * 0.1 * np.sqrt(test_chain["T"]) * rng.uniform(0.5, 1.5, spots.size), 0.05)
+    test_hvs = {ticker: float(rng.uniform(0.15, 0.6)) for ticker in tickers}
+
+    start_time = time.perf_counter()
+    reference_theoretical, _ = price_contracts(
+        spots, test_chain["strike"].to_numpy(), test_chain["T"].to_numpy(), np.full(spots.size, 0.04),
+        test_chain["ticker"].map(test_hvs).to_numpy(), test_chain["ticker"].map(
+            {t: d["dividend_yield"] for t, d in test_live_data.items()}).to_numpy(),
+        (test_chain["type"] == "call").to_numpy(), test_chain["mid"].to_numpy(), workers=1)
+    baseline = spots.size / (time.perf_counter() - start_time)
+    print(f"Référence en processus ({spots.size} contrats) : {baseline:,.0f} contrats/s")
+
+    for worker_count in (1, 2, 4):
+        with WorkQueueCoordinator() as coordinator:
+            coordinator.start_local_workers(worker_count)
+            coordinator.wait_for_workers(worker_count)
+            start_time = time.perf_counter()
+            theoretical, _ = distributed_price_contracts(coordinator, test_chain, test_live_data, test_hvs, 0.04)
+            throughput = spots.size / (time.perf_counter() - start_time)
+            snapshot_kb = coordinator.snapshot_bytes_sent / 1024
+        print(f"{worker_count} worker(s) : {throughput:,.0f} contrats/s (x{throughput / baseline:.2f}), "
+              f"{snapshot_kb:,.0f} Ko d'instantanés envoyés, écart max {np.nanmax(np.abs(theoretical - reference_theoretical)):.1e}")
+
+    # Panne : un worker est tué pendant la valorisation, ses tâches sont redistribuées aux autres
+    with WorkQueueCoordinator() as coordinator:
+        processes = coordinator.start_local_workers(3)
+        coordinator.wait_for_workers(3)
+        threading.Timer(0.3, processes[0].kill).start()
+        theoretical, _ = distributed_price_contracts(coordinator, test_chain, test_live_data, test_hvs, 0.04, chunk_size=128)
+        print(f"Panne d'un worker sur 3 : {coordinator.redispatched} tâche(s) redistribuée(s), "
+              f"{coordinator.alive_workers} workers actifs, résultats identiques : "
+              f"{np.allclose(theoretical, reference_theoretical, equal_nan=True)}")
+
+    # Analyse de portefeuille répartie par sous-jacent
+    book = generate_synthetic_book(2_000, seed=5)
+    from portfolio_analyzer import analyze_portfolio
+    from position_loader import normalize_position
+    from records import CONTRACTS
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, local_summary, _ = analyze_portfolio(book["positions"], book["live_prices"], 0.04, book["dividend_yields"],
+                                                book["live_option_data"], historical_volatilities=dict.fromkeys(book["live_prices"], 0.3))
+    with WorkQueueCoordinator() as coordinator:
+        coordinator.start_local_workers(2)
+        coordinator.wait_for_workers(2)
+        start_time = time.perf_counter()
+        _, remote_summary, _ = distributed_analysis(coordinator, book["positions"], book["live_prices"], 0.04,
+                                                    book["dividend_yields"], book["live_option_data"],
+                                                    historical_volatilities=dict.fromkeys(book["live_prices"], 0.3))
+        # Positions chargées par position_loader : contract_id interné côté coordinateur, non transmis
+        loaded_positions = [normalize_position(pos) for pos in book["positions"]]
+        CONTRACTS.intern("ZZZ", 1.0, "2099-01-01", "call") # Décale le registre du coordinateur par rapport aux workers
+        _, loaded_summary, loaded_details = distributed_analysis(
+            coordinator, loaded_positions, book["live_prices"], 0.04, book["dividend_yields"], book["live_option_data"],
+            historical_volatilities=dict.fromkeys(book["live_prices"], 0.3))
+    print(f"Analyse répartie ({len(book['positions'])} positions, 2 workers) : {time.perf_counter() - start_time:.2f}s, "
+          f"résumé identique à l'analyse locale : {remote_summary == local_summary}, "
+          f"positions chargées (contract_id) : {loaded_summary == local_summary}")
+
+    # Aucun worker : échec après le délai de grâce au lieu d'une attente indéfinie
+    with WorkQueueCoordinator(worker_grace=1.0) as coordinator:
+        try:
+            distributed_price_contracts(coordinator, test_chain.head(10), test_live_data, test_hvs, 0.04)
+        except RuntimeError as e:
+            print(f"Sans worker : {e}")
@@ -0,0 +1,194 @@
+# yield_curve.py
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# Tickers Yahoo Finance des rendements du Trésor US (cotés en pourcentage) et leur maturité en années
+TREASURY_TICKERS = {
+    "^IRX": 0.25,  # T-Bill 13 semaines
+    "^FVX": 5.0,   # Note 5 ans
+    "^TNX": 10.0,  # Note 10 ans
+    "^TYX": 30.0,  # Bond 30 ans
+}
+
+# ^IRX est coté en taux d'escompte (base 360 jours, sur 91 jours) ; les autres en rendement
+# équivalent obligataire (composition semestrielle)
+DISCOUNT_BASIS_TICKERS = {"^IRX"}
+TBILL_DAYS = 91
+
+# Cache en mémoire : une seule courbe par jour et par processus
+_CURVE_CACHE = {}
+
+
+class YieldCurve:
+    """
+    Courbe de taux sans risque (taux en composition continue, en décimal).
+
+    Les taux entre deux piliers sont interpolés linéairement ; au-delà des piliers
+    extrêmes, la courbe est prolongée à plat. Toutes les méthodes acceptent un
+    scalaire ou un tableau de maturités et sont vectorisées.
+    """
+
+    def __init__(self, tenors, rates, as_of=None):
+        tenors = np.asarray(tenors, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        if tenors.shape != rates.shape or tenors.size == 0:
+            raise ValueError("La courbe doit contenir au moins un pilier (maturité, taux).")
+        order = np.argsort(tenors)
+        self.tenors = tenors[order]
+        self.rates = rates[order]
+        self.as_of = as_of or date.today()
+
+    @classmethod
+    def flat(cls, rate, as_of=None):
+        """
+        Courbe plate (même taux pour toutes les maturités).
+        """
+        return cls([1.0], [rate], as_of=as_of)
+
+    def rate(self, T):
+        """
+        Taux sans risque annuel pour une ou plusieurs maturités T (en années).
+        """
+        result = np.interp(np.asarray(T, dtype=float), self.tenors, self.rates)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def discount_factor(self, T):
+        """
+        Facteurs d'actualisation exp(-r(T) * T) pour une ou plusieurs maturités.
+        """
+        T = np.asarray(T, dtype=float)
+        result = np.exp(-np.interp(T, self.tenors, self.rates) * np.maximum(T, 0.0))
+        return float(result) if np.ndim(result) == 0 else result
+
+    def to_dict(self):
+        return {"as_of": self.as_of.isoformat(), "tenors": self.tenors.tolist(), "rates": self.rates.tolist()}
+
+    @classmethod
+    def from_dict(cls, payload):
+        return cls(payload["tenors"], payload["rates"], as_of=date.fromisoformat(payload["as_of"]))
+
+    def __repr__(self):
+        points = ", ".join(f"{t:g}a={r:.4%}" for t, r in zip(self.tenors, self.rates))
+        return f"YieldCurve({self.as_of.isoformat()}: {points})"
+
+
+def resolve_rate(risk_free_rate, T):
+    """
+    Retourne le taux sans risque à utiliser pour une maturité T.
+    `risk_free_rate` peut être un taux unique (float) ou une YieldCurve.
+    """
+    if isinstance(risk_free_rate, YieldCurve):
+        return risk_free_rate.rate(T)
+    return risk_free_rate
+
+
+def treasury_quote_to_continuous(ticker, quote):
+    """
+    Convertit la cotation Yahoo d'un rendement du Trésor US en taux à composition continue.
+
+    ^IRX est un taux d'escompte : prix = 1 - d * 91/360, d'où r = -ln(prix) / (91/365).
+    ^FVX, ^TNX et ^TYX sont des rendements équivalents obligataires (semestriels) des titres
+    au pair : r = 2 * ln(1 + y/2). Le rendement au pair est utilisé comme taux zéro-coupon
+    de la même maturité, approximation suffisante faute de courbe complète.
+
+    Paramètres:
+    ticker (str): Ticker Yahoo de la cotation (clé de TREASURY_TICKERS).
+    quote (float): Cotation en pourcentage (ex: 4.30).
+
+    Retourne:
+    float: Taux annuel à composition continue, en décimal.
+    """
+    y = quote / 100 # Convertir en décimal
+    if ticker in DISCOUNT_BASIS_TICKERS:
+        return float(-np.log(1 - y * TBILL_DAYS / 360) / (TBILL_DAYS / 365))
+    return float(2 * np.log1p(y / 2))
+
+
+def fetch_treasury_curve(cache_path=None, force_refresh=False):
+    """
+    Récupère la courbe des taux du Trésor US (^IRX, ^FVX, ^TNX, ^TYX) en un seul
+    téléchargement groupé, convertit les cotations en composition continue
+    (voir treasury_quote_to_continuous) et met la courbe en cache pour la journée.
+
+    Paramètres:
+    cache_path (str): Fichier JSON optionnel pour partager le cache entre exécutions du même jour.
+    force_refresh (bool): Ignore les caches et retélécharge la courbe.
+
+    Retourne:
+    YieldCurve: La courbe du jour, ou None si aucun taux n'a pu être récupéré.
+    """
+    today = date.today()
+    if not force_refresh:
+        if today in _CURVE_CACHE:
+            return _CURVE_CACHE[today]
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    curve = YieldCurve.from_dict(json.load(f))
+                if curve.as_of == today:
+                    _CURVE_CACHE[today] = curve
+                    return curve
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Avertissement: Cache de courbe des taux illisible ({cache_path}) : {e}")
+
+    from market_data_provider import get_provider
+
+    tickers = list(TREASURY_TICKERS)
+    try:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=7) # Quelques jours d'historique pour couvrir les week-ends
+        data = get_provider().history(tickers, start=start_date, end=end_date, auto_adjust=True)
+    except Exception as e:
+        print(f"Erreur lors de la récupération de la courbe des taux US: {e}")
+        return None
+
+    if data is None or data.empty or "Close" not in data.columns.get_level_values(0):
+        print("Avertissement: Aucune donnée trouvée pour la courbe des taux US.")
+        return None
+
+    closes = data["Close"]
+    tenors, rates = [], []
+    for ticker, tenor in TREASURY_TICKERS.items():
+        if ticker not in closes.columns:
+            continue
+        series = closes[ticker].dropna()
+        if series.empty:
+            print(f"Avertissement: Aucune donnée trouvée pour {ticker}.")
+            continue
+        tenors.append(tenor)
+        rates.append(treasury_quote_to_continuous(ticker, float(series.iloc[-1])))
+
+    if not tenors:
+        print("Avertissement: Aucun pilier de la courbe des taux n'a pu être récupéré.")
+        return None
+
+    curve = YieldCurve(tenors, rates, as_of=today)
+    print(f"Courbe des taux US récupérée : {curve}")
+    _CURVE_CACHE[today] = curve
+    if cache_path:
+        try:
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(curve.to_dict(), f)
+        except OSError as e:
+            print(f"Avertissement: Impossible d'écrire le cache de courbe des taux ({cache_path}) : {e}")
+    return curve
+
+
+# Pour tester ce module indépendamment
+if __name__ == "__main__":
+    print("--- Test de yield_curve.py ---")
+    test_curve = YieldCurve([0.25, 5.0, 10.0, 30.0], [0.0430, 0.0395, 0.0420, 0.0460])
+    maturities = np.array([0.1, 0.25, 1.0, 2.5, 7.0, 40.0])
+    print(test_curve)
+    print("Taux :", np.round(test_curve.rate(maturities), 5))
+    print("Facteurs d'actualisation :", np.round(test_curve.discount_factor(maturities), 5))
+    # 4.30 % en taux d'escompte ~ 4.38 % continu ; 4.20 % semestriel ~ 4.16 % continu
+    print("Conversion ^IRX 4.30 :", round(treasury_quote_to_continuous("^IRX", 4.30), 5))
+    print("Conversion ^TNX 4.20 :", round(treasury_quote_to_continuous("^TNX", 4.20), 5))
+
+    live_curve = fetch_treasury_curve()
+    if live_curve is not None:
+        print("Taux live :", np.round(live_curve.rate(maturities), 5))